@@ -1,15 +1,20 @@
 import os
+import re
 import json
+import math
+import hashlib
+import asyncio
 import sqlite3
 import time
 import traceback
-from datetime import date
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, NamedTuple
 from io import BytesIO
 
 from PIL import Image
-from fastapi import FastAPI, File, UploadFile, Query
+from fastapi import FastAPI, File, Header, UploadFile, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
@@ -25,9 +30,24 @@ app = FastAPI()
 #VERSION für codesandbox eingeführt Beschreibung 1-Port-Setup (empfohlen): Frontend + Bilder-Uploads über FastAPI ausliefern
 
 import httpx
-from bs4 import BeautifulSoup
+from cachetools import TTLCache
 
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from taric_blob_store import (
+    KIND_OFFICIAL_HTML,
+    KIND_RAW_RESPONSE,
+    delete_blobs,
+    ensure_blob_schema,
+    get_blob,
+    get_blobs,
+    put_blob,
+)
+from taric_code_index import get_code_index, reload_code_index, reload_code_index_if_changed
+from taric_code_validation import validate_classification
+from taric_official_html import extract_official_description
+from taric_token_budget import TokenBudget
 
 # --------------------------------------------------
 # Basis-Konfiguration
@@ -61,6 +81,12 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 # GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-2.5-flash")
 GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-2.5-flash-lite")
 
+# Retry-After für Quota-/Verfügbarkeitsfehler des Modells (Sekunden), falls Gemini
+# keine Wartezeit mitliefert; nach oben begrenzt
+UPSTREAM_QUOTA_RETRY_AFTER_S = float(os.getenv("TARIC_UPSTREAM_QUOTA_RETRY_AFTER_S", "60"))
+UPSTREAM_UNAVAILABLE_RETRY_AFTER_S = float(os.getenv("TARIC_UPSTREAM_UNAVAILABLE_RETRY_AFTER_S", "10"))
+UPSTREAM_MAX_RETRY_AFTER_S = float(os.getenv("TARIC_UPSTREAM_MAX_RETRY_AFTER_S", "900"))
+
 # Erlaubte Bildformate (inkl. WEBP)
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
 ALLOWED_MIME_TYPES = {
@@ -138,6 +164,13 @@ def init_db() -> None:
     - taric_live existiert
     - taric_evaluation existiert
     - Spalte superviser_bewertung in taric_evaluation existiert
+    - Validierungsspalten (taric_code_snapped, code_valid) in taric_live existieren
+    - source_hash (SHA-256 des Uploads, Idempotenz für Bulk-Wiederholungen) existiert
+    - updated_at in taric_live wird per Trigger bei jedem UPDATE gesetzt
+      (Wasserzeichen für inkrementelle Exporte)
+    - taric_official_cache (EU-Seiten-Cache) existiert
+    - taric_blob (komprimierte Rohantworten / HTML) existiert
+    - Indizes für Lookup und LRU-Eviction von taric_official_cache existieren
     """
     conn = get_conn()
     cur = conn.cursor()
@@ -162,6 +195,39 @@ def init_db() -> None:
             """
         )
 
+    # Validierung gegen die lokale Nomenklatur (Migration für bestehende DBs)
+    cur.execute("PRAGMA table_info(taric_live);")
+    live_cols = [row["name"] for row in cur.fetchall()]
+    if "taric_code_snapped" not in live_cols:
+        cur.execute("ALTER TABLE taric_live ADD COLUMN taric_code_snapped TEXT;")
+    if "code_valid" not in live_cols:
+        cur.execute("ALTER TABLE taric_live ADD COLUMN code_valid INTEGER;")
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_taric_live_code_valid ON taric_live(code_valid);"
+    )
+    if "source_hash" not in live_cols:
+        cur.execute("ALTER TABLE taric_live ADD COLUMN source_hash TEXT;")
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_taric_live_source_hash ON taric_live(source_hash);"
+    )
+    if "updated_at" not in live_cols:
+        cur.execute("ALTER TABLE taric_live ADD COLUMN updated_at TEXT;")
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_taric_live_updated_at ON taric_live(updated_at);"
+    )
+    # Nachträgliche Änderungen (Snapping, Scores, Re-Sync) für Exporte sichtbar machen;
+    # greift nicht, wenn das UPDATE updated_at selbst setzt (keine Rekursion)
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_taric_live_updated_at
+        AFTER UPDATE ON taric_live
+        FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+        BEGIN
+            UPDATE taric_live SET updated_at = datetime('now') WHERE id = NEW.id;
+        END;
+        """
+    )
+
     # taric_evaluation
     cur.execute(
         "SELECT name FROM sqlite_master WHERE type='table' AND name='taric_evaluation';"
@@ -190,6 +256,40 @@ def init_db() -> None:
                 "ALTER TABLE taric_evaluation ADD COLUMN superviser_bewertung INTEGER;"
             )
 
+    # taric_official_cache (Schema wie von fetch_official_taric_description genutzt)
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS taric_official_cache (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            taric_prefix TEXT NOT NULL,
+            digits INTEGER NOT NULL,
+            sim_date TEXT NOT NULL,
+            lang TEXT NOT NULL,
+            official_html TEXT,
+            official_description TEXT,
+            source_url TEXT,
+            created_at TEXT,
+            last_used_at TEXT
+        );
+        """
+    )
+
+    cur.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_official_cache_lookup
+            ON taric_official_cache(taric_prefix, digits, sim_date, lang);
+        """
+    )
+    cur.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_official_cache_last_used
+            ON taric_official_cache(last_used_at);
+        """
+    )
+
+    # Seitentabelle für komprimierte Blobs
+    ensure_blob_schema(conn)
+
     conn.commit()
     conn.close()
     print("DB initialisiert / geprüft.")
@@ -286,14 +386,81 @@ def classify_with_gemini(
     return parsed
 
 
-def store_classification(filename: str, data: dict) -> int:
+# Wartezeit im Fehlertext, z.B. "Please retry in 23.4s." oder "retry_delay { seconds: 23 }"
+_RETRY_DELAY_PATTERNS = (
+    re.compile(r"retry in\s+([\d.]+)\s*s", re.IGNORECASE),
+    re.compile(r"retry_?delay\W+(?:seconds:\s*)?([\d.]+)", re.IGNORECASE),
+)
+
+
+def _upstream_retry_delay(exc: Exception) -> Optional[float]:
+    """Von Gemini vorgegebene Wartezeit (google.rpc.RetryInfo bzw. Fehlertext) oder None."""
+    for detail in getattr(exc, "details", None) or []:
+        if isinstance(detail, dict):
+            value = detail.get("retryDelay") or detail.get("retry_delay")
+            if isinstance(value, str):
+                try:
+                    return float(value.rstrip("s"))
+                except ValueError:
+                    continue
+        else:
+            delay = getattr(detail, "retry_delay", None)
+            if delay is not None and hasattr(delay, "seconds"):
+                return delay.seconds + getattr(delay, "nanos", 0) / 1e9
+    text = str(exc)
+    for pattern in _RETRY_DELAY_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            try:
+                return float(match.group(1))
+            except ValueError:
+                continue
+    return None
+
+
+def _upstream_error_response(exc: Exception) -> Optional[JSONResponse]:
     """
-    Speichert das Klassifikationsergebnis in taric_live und gibt die neue ID zurück.
-    Die komplette Modellantwort (inkl. usage) wird als JSON im Feld raw_response_json abgelegt.
+    Übersetzt vorübergehende Gemini-Fehler in HTTP-Antworten mit Retry-After:
+    - Quota/Rate-Limit (ResourceExhausted, 429)           -> 429
+    - Timeout/Überlastung (DeadlineExceeded, 503, 500, 504) -> 503
+    Andere Fehler -> None (weiter als 500 behandeln).
     """
-    conn = get_conn()
-    cur = conn.cursor()
+    if isinstance(exc, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+        status, error_code, default_delay = 429, "UPSTREAM_QUOTA", UPSTREAM_QUOTA_RETRY_AFTER_S
+    elif isinstance(
+        exc,
+        (
+            google_exceptions.DeadlineExceeded,
+            google_exceptions.GatewayTimeout,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.InternalServerError,
+        ),
+    ):
+        status, error_code, default_delay = 503, "UPSTREAM_UNAVAILABLE", UPSTREAM_UNAVAILABLE_RETRY_AFTER_S
+    else:
+        return None
 
+    delay = _upstream_retry_delay(exc)
+    if delay is None:
+        delay = default_delay
+    retry_after = int(math.ceil(min(max(delay, 1.0), UPSTREAM_MAX_RETRY_AFTER_S)))
+    return JSONResponse(
+        status_code=status,
+        headers={"Retry-After": str(retry_after)},
+        content={
+            "error": f"Modell vorübergehend nicht verfügbar ({type(exc).__name__}): {exc}",
+            "error_code": error_code,
+            "retry_after": retry_after,
+        },
+    )
+
+
+def _insert_classification(cur: sqlite3.Cursor, filename: str, data: dict) -> int:
+    """
+    Fügt eine Klassifikation in taric_live ein (ohne Commit) und gibt die neue ID zurück.
+    Die komplette Modellantwort (inkl. usage) wird komprimiert in taric_blob abgelegt
+    (raw_response_json bleibt leer, damit taric_live klein bleibt).
+    """
     confidence = data.get("confidence")
     try:
         confidence_val = float(confidence) if confidence is not None else None
@@ -311,9 +478,12 @@ def store_classification(filename: str, data: dict) -> int:
             confidence,
             short_reason,
             alternatives_json,
-            raw_response_json
+            raw_response_json,
+            taric_code_snapped,
+            code_valid,
+            source_hash
         )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """,
         (
             time.strftime("%Y-%m-%d %H:%M:%S"),
@@ -324,59 +494,272 @@ def store_classification(filename: str, data: dict) -> int:
             confidence_val,
             data.get("short_reason"),
             json.dumps(data.get("possible_alternatives") or [], ensure_ascii=False),
-            json.dumps(data, ensure_ascii=False),
+            None,
+            data.get("taric_code_snapped"),
+            None if data.get("code_valid") is None else int(bool(data["code_valid"])),
+            data.get("source_hash"),
         ),
     )
     new_id = cur.lastrowid
+    put_blob(
+        cur.connection,
+        "taric_live",
+        new_id,
+        KIND_RAW_RESPONSE,
+        json.dumps(data, ensure_ascii=False),
+    )
+    return new_id
+
+
+def load_raw_response(conn: sqlite3.Connection, taric_live_id: int, inline_json: Optional[str]) -> dict:
+    """
+    Liefert die Modell-Rohantwort einer taric_live-Zeile: aus taric_blob oder,
+    für noch nicht migrierte Altzeilen, aus der Spalte raw_response_json.
+    """
+    raw_json = get_blob(conn, "taric_live", taric_live_id, KIND_RAW_RESPONSE) or inline_json or "{}"
+    try:
+        return json.loads(raw_json)
+    except Exception:
+        return {}
+
+
+def store_classification(filename: str, data: dict) -> int:
+    """
+    Speichert das Klassifikationsergebnis in taric_live und gibt die neue ID zurück
+    (eigene Connection, ein Commit pro Aufruf).
+    """
+    conn = get_conn()
+    cur = conn.cursor()
+    new_id = _insert_classification(cur, filename, data)
     conn.commit()
     conn.close()
     return new_id
 
 
+# --------------------------------------------------
+# Group-Commit-Writer für taric_live
+# --------------------------------------------------
+
+# Maximale Anzahl Klassifikationen pro Commit
+WRITER_MAX_BATCH = int(os.getenv("TARIC_WRITER_MAX_BATCH", "32"))
+
+# Maximale Wartezeit (ms), bis ein angefangener Batch committet wird
+WRITER_MAX_DELAY_MS = float(os.getenv("TARIC_WRITER_MAX_DELAY_MS", "5"))
+
+
+class ClassificationWriter:
+    """
+    Einzelner Hintergrund-Task, der fertige Klassifikationen aus einer Queue
+    sammelt und in kleinen Batches (max. WRITER_MAX_BATCH Zeilen oder
+    WRITER_MAX_DELAY_MS Verzögerung) mit einem Commit in taric_live schreibt.
+
+    Aufrufer erhalten ihre neue ID über ein Future zurück. Läuft der Writer
+    nicht (z.B. in Scripts ohne Event-Loop-Lifespan), wird direkt über
+    store_classification() geschrieben.
+    """
+
+    def __init__(self, max_batch: int, max_delay_ms: float) -> None:
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max(0.0, max_delay_ms) / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="taric-live-writer")
+
+    async def stop(self) -> None:
+        """Verarbeitet noch wartende Einträge und beendet den Writer."""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        self._queue = None
+
+    async def submit(self, filename: str, data: dict) -> int:
+        if not self.running:
+            return await asyncio.to_thread(store_classification, filename, data)
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((filename, data, fut))
+        return await fut
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        conn = get_conn()
+        stopping = False
+        try:
+            while not stopping:
+                item = await self._queue.get()
+                if item is None:
+                    break
+                batch = [item]
+                deadline = loop.time() + self.max_delay
+                while len(batch) < self.max_batch:
+                    timeout = deadline - loop.time()
+                    try:
+                        if timeout > 0:
+                            nxt = await asyncio.wait_for(self._queue.get(), timeout)
+                        else:
+                            nxt = self._queue.get_nowait()
+                    except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                        break
+                    if nxt is None:
+                        stopping = True
+                        break
+                    batch.append(nxt)
+
+                try:
+                    ids = await asyncio.to_thread(self._write_batch, conn, batch)
+                except Exception as e:
+                    traceback.print_exc()
+                    for _, _, fut in batch:
+                        if not fut.done():
+                            fut.set_exception(e)
+                    continue
+
+                for (_, _, fut), new_id in zip(batch, ids):
+                    if not fut.done():
+                        fut.set_result(new_id)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _write_batch(conn: sqlite3.Connection, batch: list) -> List[int]:
+        cur = conn.cursor()
+        try:
+            ids = [_insert_classification(cur, filename, data) for filename, data, _ in batch]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return ids
+
+
+classification_writer = ClassificationWriter(WRITER_MAX_BATCH, WRITER_MAX_DELAY_MS)
+
+
 # --------------------------------------------------
 # Offizielle TARIC-Referenz (EU) – Cache & Fetch
 # --------------------------------------------------
 
+# In-Process-Cache (LRU + TTL) vor taric_official_cache
+OFFICIAL_MEMORY_CACHE_SIZE = int(os.getenv("TARIC_OFFICIAL_MEMORY_CACHE_SIZE", "4096"))
+OFFICIAL_MEMORY_CACHE_TTL_S = float(os.getenv("TARIC_OFFICIAL_MEMORY_CACHE_TTL_S", "3600"))
 
-def _extract_official_description_from_html(html: str, taric_prefix: str, digits: int) -> str | None:
+# Negativ-Cache für "nicht gefunden" und Abruffehler (kurze TTL, damit die EU-Seite
+# nach Störungen wieder gefragt wird)
+OFFICIAL_NEGATIVE_CACHE_TTL_S = float(os.getenv("TARIC_OFFICIAL_NEGATIVE_CACHE_TTL_S", "300"))
+
+# Gemeinsamer HTTP-Client für die EU-TARIC-Seite
+HTTP_MAX_CONNECTIONS = int(os.getenv("TARIC_HTTP_MAX_CONNECTIONS", "10"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("TARIC_HTTP_MAX_KEEPALIVE", "5"))
+HTTP_KEEPALIVE_EXPIRY_S = float(os.getenv("TARIC_HTTP_KEEPALIVE_EXPIRY_S", "30"))
+HTTP_TIMEOUT_S = float(os.getenv("TARIC_HTTP_TIMEOUT_S", "20"))
+
+# Schlüssel jeweils (taric_prefix, digits, sim_date, lang)
+_official_memory_cache: TTLCache = TTLCache(
+    maxsize=OFFICIAL_MEMORY_CACHE_SIZE, ttl=OFFICIAL_MEMORY_CACHE_TTL_S
+)
+_official_negative_cache: TTLCache = TTLCache(
+    maxsize=OFFICIAL_MEMORY_CACHE_SIZE, ttl=OFFICIAL_NEGATIVE_CACHE_TTL_S
+)
+
+
+
+class _FetchErrorEntry(NamedTuple):
     """
-    Extrahiert aus der TARIC-Consultation-HTML den Beschreibungstext
-    für den angegebenen Präfix (z.B. '8517' bei digits=4).
+    Abruffehler im Negativ-Cache: nur die Daten, je Treffer wird eine neue Exception
+    gebaut (eine geteilte Instanz würde Traceback/Kontext über Requests hinweg anhäufen).
+    """
+
+    exc_type: type
+    message: str
+    request: Optional[httpx.Request]
+    status_code: Optional[int]
+
+    @classmethod
+    def from_exception(cls, exc: httpx.HTTPError) -> "_FetchErrorEntry":
+        status_code = exc.response.status_code if isinstance(exc, httpx.HTTPStatusError) else None
+        return cls(type(exc), str(exc), getattr(exc, "_request", None), status_code)
+
+    def to_exception(self) -> httpx.HTTPError:
+        if self.status_code is not None:
+            return httpx.HTTPStatusError(
+                self.message,
+                request=self.request,
+                response=httpx.Response(self.status_code, request=self.request),
+            )
+        if issubclass(self.exc_type, httpx.RequestError):
+            return self.exc_type(self.message, request=self.request)
+        return httpx.HTTPError(self.message)
+
+
+official_cache_stats: Dict[str, int] = {
+    "memory_hits": 0,
+    "negative_hits": 0,
+    "sqlite_hits": 0,
+    "fetches": 0,
+    "fetch_errors": 0,
+    "touch_flushes": 0,
+    "evicted_rows": 0,
+}
+
+_http_client: Optional[httpx.AsyncClient] = None
+
 
-    Strategie:
-    - Anker-ID = Präfix auf 10 Stellen mit Nullen aufgefüllt (z.B. '8517000000')
-    - Passende Zeile / Container um diesen Anker herum suchen.
+def get_http_client() -> httpx.AsyncClient:
     """
-    if not html:
-        return None
+    Liefert den gemeinsamen httpx.AsyncClient (Keep-Alive, Verbindungslimits).
+    Wird im lifespan angelegt/geschlossen; außerhalb der App (Skripte) lazy erzeugt.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT_S,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_S,
+            ),
+            follow_redirects=True,
+        )
+    return _http_client
 
-    soup = BeautifulSoup(html, "html.parser")
 
-    anchor_id = taric_prefix.ljust(10, "0")
-    anchor = soup.find(id=anchor_id) or soup.find("a", attrs={"name": anchor_id})
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
 
-    if anchor:
-        container = anchor.find_parent("tr") or anchor.find_parent("div") or anchor.parent
-        if container:
-            text = " ".join(container.stripped_strings)
-            text = text.replace("\xa0", " ").strip()
-            if text:
-                return text
 
-    texts = soup.find_all(string=lambda s: s and taric_prefix in s)
-    collected = []
-    for t in texts:
-        parent = t.parent
-        if parent:
-            snippet = " ".join(parent.stripped_strings)
-            collected.append(snippet)
+def _extract_official_description_from_html(html: str, taric_prefix: str, digits: int) -> str | None:
+    """
+    Extrahiert aus der TARIC-Consultation-HTML den Beschreibungstext
+    für den angegebenen Präfix (lxml, siehe taric_official_html.py).
+    CPU-lastig – im Event-Loop nur über asyncio.to_thread aufrufen.
+    """
+    return extract_official_description(html, taric_prefix, digits)
 
-    if collected:
-        unique = list(dict.fromkeys(collected))
-        combined = " | ".join(unique)
-        return combined[:4000]
 
-    return None
+def _official_cache_min_sim_date(sim_date: str) -> str:
+    """
+    Ältestes sim_date (YYYYMMDD), dessen Cache-Eintrag für sim_date noch verwendet wird:
+    Einträge jünger als OFFICIAL_CACHE_STALE_DAYS gelten weiter, statt jeden Tag neu
+    von der EU-Seite zu laden.
+    """
+    try:
+        day = datetime.strptime(sim_date, "%Y%m%d")
+    except ValueError:
+        return sim_date
+    return (day - timedelta(days=OFFICIAL_CACHE_STALE_DAYS)).strftime("%Y%m%d")
 
 
 def _get_cached_official_description(
@@ -384,31 +767,33 @@ def _get_cached_official_description(
     digits: int,
     sim_date: str,
     lang: str = "de",
-) -> tuple[str | None, str | None]:
+) -> tuple[str | None, str | None, int | None]:
     """
-    Liest vorhandene Daten aus taric_official_cache.
-    Rückgabe: (official_description, source_url) oder (None, None), wenn nichts gefunden.
+    Liest vorhandene Daten aus taric_official_cache: den jüngsten Eintrag mit
+    sim_date im Fenster [sim_date - OFFICIAL_CACHE_STALE_DAYS, sim_date].
+    Rückgabe: (official_description, source_url, id) oder (None, None, None), wenn nichts gefunden.
     """
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
     cur.execute(
         """
-        SELECT official_description, source_url
+        SELECT official_description, source_url, id
         FROM taric_official_cache
         WHERE taric_prefix = ?
           AND digits = ?
-          AND sim_date = ?
+          AND sim_date BETWEEN ? AND ?
           AND lang = ?
+        ORDER BY official_description IS NULL, sim_date DESC
         LIMIT 1
         """,
-        (taric_prefix, digits, sim_date, lang),
+        (taric_prefix, digits, _official_cache_min_sim_date(sim_date), sim_date, lang),
     )
     row = cur.fetchone()
     conn.close()
 
     if row:
-        return row[0], row[1]
-    return None, None
+        return row[0], row[1], row[2]
+    return None, None, None
 
 
 def _store_official_description_in_cache(
@@ -419,8 +804,8 @@ def _store_official_description_in_cache(
     official_html: str,
     official_description: str | None,
     source_url: str,
-) -> None:
-    """Speichert das Ergebnis im Cache."""
+) -> int:
+    """Speichert das Ergebnis im Cache (HTML komprimiert in taric_blob) und gibt die ID zurück."""
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
     cur.execute(
@@ -429,12 +814,174 @@ def _store_official_description_in_cache(
             taric_prefix, digits, sim_date, lang,
             official_html, official_description, source_url, created_at, last_used_at
         )
-        VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))
+        VALUES (?, ?, ?, ?, NULL, ?, ?, datetime('now'), datetime('now'))
         """,
-        (taric_prefix, digits, sim_date, lang, official_html, official_description, source_url),
+        (taric_prefix, digits, sim_date, lang, official_description, source_url),
     )
+    new_id = cur.lastrowid
+    put_blob(conn, "taric_official_cache", new_id, KIND_OFFICIAL_HTML, official_html)
     conn.commit()
     conn.close()
+    return new_id
+
+
+# --------------------------------------------------
+# taric_official_cache: last_used_at-Touches & Eviction
+# --------------------------------------------------
+
+# Budget für taric_official_cache (Zeilen / Bytes inkl. komprimiertem HTML in taric_blob)
+OFFICIAL_CACHE_MAX_ROWS = int(os.getenv("TARIC_OFFICIAL_CACHE_MAX_ROWS", "20000"))
+OFFICIAL_CACHE_MAX_BYTES = int(os.getenv("TARIC_OFFICIAL_CACHE_MAX_MB", "256")) * 1024 * 1024
+# sim_date älter als N Tage gilt als veraltet (wird zuerst verdrängt bzw. bei
+# fehlender Nutzung im selben Zeitraum ganz entfernt)
+OFFICIAL_CACHE_STALE_DAYS = int(os.getenv("TARIC_OFFICIAL_CACHE_STALE_DAYS", "30"))
+# Intervalle für Touch-Flush und Eviction (Sekunden)
+OFFICIAL_CACHE_FLUSH_S = float(os.getenv("TARIC_OFFICIAL_CACHE_FLUSH_S", "30"))
+OFFICIAL_CACHE_EVICT_S = float(os.getenv("TARIC_OFFICIAL_CACHE_EVICT_S", "600"))
+
+# id -> Zeitpunkt der letzten Nutzung; wird gesammelt statt pro Lesezugriff geschrieben
+_pending_touches: Dict[int, str] = {}
+
+
+def _touch_official_cache(row_id: Optional[int]) -> None:
+    if row_id is not None:
+        _pending_touches[row_id] = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+
+
+def _flush_official_cache_touches(touches: Dict[int, str]) -> int:
+    """Schreibt gesammelte last_used_at-Werte in einer Transaktion."""
+    if not touches:
+        return 0
+    conn = get_conn()
+    try:
+        conn.executemany(
+            "UPDATE taric_official_cache SET last_used_at = ? WHERE id = ? AND (last_used_at IS NULL OR last_used_at < ?)",
+            [(ts, row_id, ts) for row_id, ts in touches.items()],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return len(touches)
+
+
+def _official_cache_size(conn: sqlite3.Connection) -> Dict[str, int]:
+    row = conn.execute(
+        """
+        SELECT COUNT(*) AS rows_,
+               COALESCE(SUM(LENGTH(official_description) + COALESCE(LENGTH(official_html), 0)), 0) AS inline_bytes
+          FROM taric_official_cache
+        """
+    ).fetchone()
+    blob_bytes = conn.execute(
+        "SELECT COALESCE(SUM(LENGTH(data)), 0) FROM taric_blob WHERE owner_table = 'taric_official_cache'"
+    ).fetchone()[0]
+    return {
+        "rows": row["rows_"],
+        "bytes": row["inline_bytes"] + blob_bytes,
+        "blob_bytes": blob_bytes,
+    }
+
+
+def _evict_official_cache(
+    max_rows: int = OFFICIAL_CACHE_MAX_ROWS,
+    max_bytes: int = OFFICIAL_CACHE_MAX_BYTES,
+    stale_days: int = OFFICIAL_CACHE_STALE_DAYS,
+) -> List[int]:
+    """
+    Hält taric_official_cache unter dem Zeilen-/Byte-Budget:
+    1. Einträge mit veraltetem sim_date, die im selben Zeitraum nicht genutzt wurden, entfernen
+    2. Falls noch über Budget: veraltete sim_date zuerst, dann LRU nach last_used_at
+    Gibt die IDs der entfernten Zeilen zurück.
+    """
+    # created_at/last_used_at sind UTC (datetime('now') bzw. gmtime)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=stale_days)
+    stale_sim_date = cutoff.strftime("%Y%m%d")
+    stale_used = cutoff.strftime("%Y-%m-%d %H:%M:%S")
+
+    conn = get_conn()
+    try:
+        victims = [
+            r["id"]
+            for r in conn.execute(
+                """
+                SELECT id FROM taric_official_cache
+                 WHERE sim_date < ?
+                   AND COALESCE(last_used_at, created_at, '') < ?
+                """,
+                (stale_sim_date, stale_used),
+            )
+        ]
+
+        size = _official_cache_size(conn)
+        rows_left = size["rows"] - len(victims)
+        if rows_left > max_rows or size["bytes"] > max_bytes:
+            victim_set = set(victims)
+            bytes_left = size["bytes"]
+            candidates = conn.execute(
+                """
+                SELECT c.id,
+                       COALESCE(LENGTH(c.official_description), 0)
+                         + COALESCE(LENGTH(c.official_html), 0)
+                         + COALESCE((SELECT SUM(LENGTH(b.data)) FROM taric_blob b
+                                      WHERE b.owner_table = 'taric_official_cache'
+                                        AND b.owner_id = c.id), 0) AS bytes
+                  FROM taric_official_cache c
+                 ORDER BY (c.sim_date < ?) DESC, COALESCE(c.last_used_at, c.created_at) ASC, c.id ASC
+                """,
+                (stale_sim_date,),
+            )
+            for r in candidates:
+                if rows_left <= max_rows and bytes_left <= max_bytes:
+                    break
+                bytes_left -= r["bytes"]
+                if r["id"] in victim_set:
+                    continue
+                victims.append(r["id"])
+                rows_left -= 1
+
+        for start in range(0, len(victims), 500):
+            chunk = victims[start : start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            conn.execute(f"DELETE FROM taric_official_cache WHERE id IN ({placeholders})", chunk)
+        delete_blobs(conn, "taric_official_cache", victims)
+        conn.commit()
+    finally:
+        conn.close()
+    return victims
+
+
+def _forget_official_memory_entries(row_ids: List[int]) -> None:
+    """Verdrängte Zeilen auch aus dem In-Process-LRU entfernen (nur im Event-Loop aufrufen)."""
+    evicted = set(row_ids)
+    for key, (_desc, _url, row_id) in list(_official_memory_cache.items()):
+        if row_id in evicted:
+            _official_memory_cache.pop(key, None)
+
+
+async def official_cache_maintenance() -> None:
+    """Hintergrund-Task: Touches periodisch schreiben, Cache periodisch verkleinern."""
+    last_evict = 0.0
+    while True:
+        await asyncio.sleep(OFFICIAL_CACHE_FLUSH_S)
+        try:
+            await flush_official_cache_touches()
+            if time.monotonic() - last_evict >= OFFICIAL_CACHE_EVICT_S:
+                last_evict = time.monotonic()
+                evicted = await asyncio.to_thread(_evict_official_cache)
+                _forget_official_memory_entries(evicted)
+                official_cache_stats["evicted_rows"] += len(evicted)
+                if evicted:
+                    print(f"taric_official_cache: {len(evicted)} Einträge verdrängt.")
+        except Exception:
+            traceback.print_exc()
+
+
+async def flush_official_cache_touches() -> None:
+    global _pending_touches
+    touches, _pending_touches = _pending_touches, {}
+    if touches:
+        await asyncio.to_thread(_flush_official_cache_touches, touches)
+        official_cache_stats["touch_flushes"] += 1
 
 
 async def fetch_official_taric_description(
@@ -467,13 +1014,71 @@ async def fetch_official_taric_description(
     if sim_date is None:
         sim_date = date.today().strftime("%Y%m%d")
 
-    cached_desc, cached_url = _get_cached_official_description(
+    # Lokaler Code-Index (taric_reference im Speicher) – kein DB-/HTTP-Roundtrip
+    index_desc = get_code_index().describe(taric_prefix, lang=lang, on_date=sim_date)
+    if index_desc:
+        return {
+            "input_code": full_code,
+            "used_prefix": taric_prefix,
+            "digits": digits,
+            "sim_date": sim_date,
+            "lang": lang,
+            "official_description": index_desc,
+            "source_url": None,
+            "from_cache": True,
+            "source": "local_reference",
+        }
+
+    cache_key = (taric_prefix, digits, sim_date, lang)
+
+    # Stufe 1: In-Process-LRU
+    hit = _official_memory_cache.get(cache_key)
+    if hit is not None:
+        official_cache_stats["memory_hits"] += 1
+        cached_desc, cached_url, row_id = hit
+        _touch_official_cache(row_id)
+        return {
+            "input_code": full_code,
+            "used_prefix": taric_prefix,
+            "digits": digits,
+            "sim_date": sim_date,
+            "lang": lang,
+            "official_description": cached_desc,
+            "source_url": cached_url,
+            "from_cache": True,
+            "cache_tier": "memory",
+        }
+
+    negative = _official_negative_cache.get(cache_key)
+    if negative is not None:
+        official_cache_stats["negative_hits"] += 1
+        if isinstance(negative, _FetchErrorEntry):
+            # Abruffehler kürzlich aufgetreten – nicht sofort erneut anfragen
+            raise negative.to_exception()
+        return {
+            "input_code": full_code,
+            "used_prefix": taric_prefix,
+            "digits": digits,
+            "sim_date": sim_date,
+            "lang": lang,
+            "official_description": None,
+            "source_url": negative,
+            "from_cache": True,
+            "cache_tier": "negative",
+        }
+
+    # Stufe 2: taric_official_cache (SQLite)
+    cached_desc, cached_url, row_id = await asyncio.to_thread(
+        _get_cached_official_description,
         taric_prefix=taric_prefix,
         digits=digits,
         sim_date=sim_date,
         lang=lang,
     )
     if cached_desc is not None:
+        official_cache_stats["sqlite_hits"] += 1
+        _official_memory_cache[cache_key] = (cached_desc, cached_url, row_id)
+        _touch_official_cache(row_id)
         return {
             "input_code": full_code,
             "used_prefix": taric_prefix,
@@ -483,6 +1088,7 @@ async def fetch_official_taric_description(
             "official_description": cached_desc,
             "source_url": cached_url,
             "from_cache": True,
+            "cache_tier": "sqlite",
         }
 
     base_url = "https://ec.europa.eu/taxation_customs/dds2/taric/taric_consultation.jsp"
@@ -494,16 +1100,24 @@ async def fetch_official_taric_description(
     }
 
     requested_url = None
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        resp = await client.get(base_url, params=params)
+    official_cache_stats["fetches"] += 1
+    try:
+        resp = await get_http_client().get(base_url, params=params)
         requested_url = str(resp.request.url)
         resp.raise_for_status()
-        html = resp.text
-
-    official_description = _extract_official_description_from_html(html, taric_prefix, digits)
+    except httpx.HTTPError as exc:
+        official_cache_stats["fetch_errors"] += 1
+        _official_negative_cache[cache_key] = _FetchErrorEntry.from_exception(exc)
+        raise
+    html = resp.text
+
+    official_description = await asyncio.to_thread(
+        _extract_official_description_from_html, html, taric_prefix, digits
+    )
     final_url = str(resp.url)
 
-    _store_official_description_in_cache(
+    row_id = await asyncio.to_thread(
+        _store_official_description_in_cache,
         taric_prefix=taric_prefix,
         digits=digits,
         sim_date=sim_date,
@@ -513,6 +1127,11 @@ async def fetch_official_taric_description(
         source_url=final_url,
     )
 
+    if official_description is None:
+        _official_negative_cache[cache_key] = final_url
+    else:
+        _official_memory_cache[cache_key] = (official_description, final_url, row_id)
+
     return {
         "input_code": full_code,
         "used_prefix": taric_prefix,
@@ -526,6 +1145,150 @@ async def fetch_official_taric_description(
     }
 
 
+# --------------------------------------------------
+# Cache-Warmer für offizielle Beschreibungen
+# --------------------------------------------------
+
+WARMER_DIGITS = (4, 6, 8, 10)
+# Parallele EU-Abrufe und Pause nach jedem Abruf (Höflichkeit gegenüber der EU-Seite)
+WARMER_CONCURRENCY = int(os.getenv("TARIC_WARMER_CONCURRENCY", "2"))
+WARMER_DELAY_S = float(os.getenv("TARIC_WARMER_DELAY_S", "1.0"))
+
+warmer_status: Dict[str, Any] = {"running": False, "last_run": None}
+_warmer_task: Optional[asyncio.Task] = None
+
+
+def _collect_predicted_codes() -> List[str]:
+    """Alle je vorhergesagten 10-stelligen Codes (taric_code + Alternativen) aus taric_live."""
+    conn = get_conn()
+    try:
+        codes = {
+            r["taric_code"]
+            for r in conn.execute(
+                "SELECT DISTINCT taric_code FROM taric_live WHERE taric_code IS NOT NULL"
+            )
+        }
+        for r in conn.execute(
+            "SELECT alternatives_json FROM taric_live "
+            "WHERE alternatives_json IS NOT NULL AND alternatives_json != '[]'"
+        ):
+            try:
+                alternatives = json.loads(r["alternatives_json"])
+            except Exception:
+                continue
+            for alt in alternatives if isinstance(alternatives, list) else []:
+                if isinstance(alt, dict) and alt.get("taric_code"):
+                    codes.add(str(alt["taric_code"]))
+    finally:
+        conn.close()
+    return sorted(c.strip() for c in codes if c.strip().isdigit() and len(c.strip()) == 10)
+
+
+def _official_cache_coverage(codes: List[str], sim_date: str, lang: str) -> Dict[str, Any]:
+    """
+    Ermittelt je Präfix (4/6/8/10), ob er lokal (taric_reference), im
+    taric_official_cache oder noch gar nicht abgedeckt ist. Als abgedeckt zählen
+    Cache-Einträge innerhalb des Stale-Fensters (wie beim Lookup), nicht nur die
+    mit genau diesem sim_date.
+    """
+    index = get_code_index()
+    conn = get_conn()
+    try:
+        cached = {
+            (r["taric_prefix"], r["digits"])
+            for r in conn.execute(
+                "SELECT DISTINCT taric_prefix, digits FROM taric_official_cache "
+                "WHERE sim_date BETWEEN ? AND ? AND lang = ? AND official_description IS NOT NULL",
+                (_official_cache_min_sim_date(sim_date), sim_date, lang),
+            )
+        }
+    finally:
+        conn.close()
+
+    by_digits: Dict[int, Dict[str, int]] = {}
+    missing: List[Dict[str, Any]] = []
+    for digits in WARMER_DIGITS:
+        counts = {"prefixes": 0, "local_reference": 0, "cached": 0, "missing": 0}
+        representative: Dict[str, str] = {}
+        for code in codes:
+            representative.setdefault(code[:digits], code)
+        for prefix, code in representative.items():
+            counts["prefixes"] += 1
+            if index.describe(prefix, lang=lang, on_date=sim_date):
+                counts["local_reference"] += 1
+            elif (prefix, digits) in cached:
+                counts["cached"] += 1
+            else:
+                counts["missing"] += 1
+                missing.append({"code": code, "prefix": prefix, "digits": digits})
+        by_digits[digits] = counts
+
+    total = sum(c["prefixes"] for c in by_digits.values())
+    covered = sum(c["local_reference"] + c["cached"] for c in by_digits.values())
+    return {
+        "sim_date": sim_date,
+        "lang": lang,
+        "codes": len(codes),
+        "prefixes": total,
+        "covered": covered,
+        "coverage": round(covered / total, 4) if total else None,
+        "by_digits": by_digits,
+        "missing": missing,
+    }
+
+
+async def warm_official_cache(
+    lang: str = "de",
+    sim_date: Optional[str] = None,
+    concurrency: int = WARMER_CONCURRENCY,
+    delay_s: float = WARMER_DELAY_S,
+) -> Dict[str, Any]:
+    """
+    Lädt fehlende taric_official_cache-Einträge für alle je vorhergesagten Codes vor
+    (begrenzte Parallelität, Pause nach jedem Abruf). Gibt die Abdeckung danach zurück.
+    """
+    sim_date = sim_date or date.today().strftime("%Y%m%d")
+    codes = await asyncio.to_thread(_collect_predicted_codes)
+    before = await asyncio.to_thread(_official_cache_coverage, codes, sim_date, lang)
+    todo = before.pop("missing")
+
+    warmer_status.update(
+        {"running": True, "started_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+         "todo": len(todo), "done": 0, "errors": 0}
+    )
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _warm_one(item: Dict[str, Any]) -> None:
+        async with semaphore:
+            try:
+                await fetch_official_taric_description(
+                    item["code"], digits=item["digits"], lang=lang, sim_date=sim_date
+                )
+            except Exception as exc:
+                warmer_status["errors"] += 1
+                print(f"⚠️  Cache-Warmer: {item['prefix']} ({item['digits']}) fehlgeschlagen: {exc}")
+            else:
+                warmer_status["done"] += 1
+            await asyncio.sleep(delay_s)
+
+    try:
+        await asyncio.gather(*(_warm_one(item) for item in todo))
+    finally:
+        warmer_status["running"] = False
+
+    after = await asyncio.to_thread(_official_cache_coverage, codes, sim_date, lang)
+    after.pop("missing")
+    report = {
+        "fetched": warmer_status["done"],
+        "errors": warmer_status["errors"],
+        "before": before,
+        "after": after,
+        "finished_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    warmer_status["last_run"] = report
+    return report
+
+
 # --------------------------------------------------
 # FastAPI-App
 # --------------------------------------------------
@@ -556,7 +1319,71 @@ from fastapi.responses import FileResponse
 
 # ...
 
-app = FastAPI(title="TARIC-Gemini-Backend")
+
+# Token-Ledger der Bulk-Planung (taric_token_budget.py); wird in lifespan geöffnet
+_token_ledger: Optional[TokenBudget] = None
+
+
+def _record_interactive_usage(usage: Optional[Dict[str, Any]], ref: str) -> None:
+    """Bucht den Verbrauch eines interaktiven /classify-Aufrufs (Reserve der Bulk-Läufe)."""
+    if _token_ledger is None:
+        return
+    try:
+        _token_ledger.record(usage, source="interactive", ref=ref)
+    except sqlite3.Error as exc:
+        print(f"⚠️  Token-Ledger nicht beschreibbar: {exc}")
+
+
+# Intervall, in dem die Nomenklatur-Version geprüft wird (0 = nur über /api/taric_code_index/reload)
+CODE_INDEX_CHECK_S = float(os.getenv("TARIC_CODE_INDEX_CHECK_S", "60"))
+
+
+async def code_index_watch() -> None:
+    """Hintergrund-Task: Code-Index neu laden, sobald load_taric_nomenclature.py gelaufen ist."""
+    while True:
+        await asyncio.sleep(CODE_INDEX_CHECK_S)
+        try:
+            if await asyncio.to_thread(reload_code_index_if_changed):
+                print(f"TARIC-Code-Index neu geladen: {len(get_code_index())} Codes.")
+        except Exception:
+            traceback.print_exc()
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """
+    Startet/stoppt Hintergrund-Tasks (Group-Commit-Writer für taric_live,
+    Touch-Flush/Eviction für taric_official_cache, Versionsprüfung des Code-Index),
+    lädt den TARIC-Code-Index vor und verwaltet den gemeinsamen HTTP-Client und das
+    Token-Ledger.
+    """
+    global _token_ledger
+    await asyncio.to_thread(get_code_index)
+    try:
+        _token_ledger = await asyncio.to_thread(TokenBudget)
+    except sqlite3.Error as exc:
+        print(f"⚠️  Token-Ledger nicht verfügbar, interaktiver Verbrauch wird nicht gebucht: {exc}")
+    get_http_client()
+    await classification_writer.start()
+    maintenance_task = asyncio.create_task(official_cache_maintenance())
+    index_task = asyncio.create_task(code_index_watch()) if CODE_INDEX_CHECK_S > 0 else None
+    try:
+        yield
+    finally:
+        if _warmer_task is not None and not _warmer_task.done():
+            _warmer_task.cancel()
+        if index_task is not None:
+            index_task.cancel()
+        maintenance_task.cancel()
+        await flush_official_cache_touches()
+        await classification_writer.stop()
+        await close_http_client()
+        if _token_ledger is not None:
+            _token_ledger.close()
+            _token_ledger = None
+
+
+app = FastAPI(title="TARIC-Gemini-Backend", lifespan=lifespan)
 
 # --- Frontend & Static Files (1-Port-Setup) ---
 # Alle Dateien im Repo-Root als /static verfügbar machen (index.html, evaluation.html, auswertung.html, ...)
@@ -581,14 +1408,74 @@ async def frontend_auswertung():
 #VERSION für codesandbox eingeführt Beschreibung 1-Port-Setup (empfohlen): Frontend + Bilder-Uploads über FastAPI ausliefern ende
 
 
+def _find_classification_by_hash(source_hash: str) -> Optional[Dict[str, Any]]:
+    """
+    Liefert die jüngste Klassifikation mit diesem Upload-Hash im Antwortformat
+    von /classify (ohne usage) oder None.
+    """
+    conn = get_conn()
+    try:
+        row = conn.execute(
+            """
+            SELECT id, filename, taric_code, cn_code, hs_chapter, confidence,
+                   short_reason, alternatives_json, raw_response_json,
+                   taric_code_snapped, code_valid
+              FROM taric_live
+             WHERE source_hash = ?
+             ORDER BY id DESC
+             LIMIT 1
+            """,
+            (source_hash,),
+        ).fetchone()
+        if not row:
+            return None
+        raw_response = load_raw_response(conn, row["id"], row["raw_response_json"])
+    finally:
+        conn.close()
+
+    try:
+        alternatives = json.loads(row["alternatives_json"] or "[]")
+    except Exception:
+        alternatives = []
+
+    return {
+        "id": row["id"],
+        "filename": row["filename"],
+        "taric_code": row["taric_code"],
+        "cn_code": row["cn_code"],
+        "hs_chapter": row["hs_chapter"],
+        "confidence": row["confidence"],
+        "short_reason": row["short_reason"],
+        "possible_alternatives": alternatives,
+        "taric_code_snapped": row["taric_code_snapped"],
+        "code_valid": None if row["code_valid"] is None else bool(row["code_valid"]),
+        "code_validation": raw_response.get("code_validation"),
+        # Kein neuer Modellaufruf -> keine Tokens in diesem Request
+        "usage": None,
+        "duplicate": True,
+    }
+
+
 @app.post("/classify")
-async def classify(file: UploadFile = File(...)):
+async def classify(
+    file: UploadFile = File(...),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    request_source: Optional[str] = Header(None, alias="X-Taric-Source"),
+):
     """
     Nimmt ein Bild entgegen, ruft Gemini auf, speichert das Ergebnis
     in taric_live und gibt das Ergebnis zurück.
 
     Diese Route wird sowohl von der Web-UI (Einzelbild) als auch vom
     bulk-evaluation-Script verwendet.
+
+    Idempotency-Key (SHA-256 des Bildinhalts, vom Bulk-Client gesetzt): stimmt er mit
+    dem Hash des Uploads überein und existiert dazu bereits eine Klassifikation, wird
+    sie ohne neuen Modellaufruf zurückgegeben ("duplicate": true) – z.B. wenn ein Lauf
+    nach dem Speichern, aber vor dem Verschieben der Datei abgebrochen ist.
+
+    Der Token-Verbrauch interaktiver Aufrufe wird ins Token-Ledger gebucht; Bulk-Aufrufe
+    (X-Taric-Source: bulk) bucht bulk-evaluation.py selbst.
     """
     try:
         if not GEMINI_API_KEY:
@@ -615,6 +1502,17 @@ async def classify(file: UploadFile = File(...)):
                 },
             )
 
+        # Nachschlagen immer über den selbst berechneten Hash; ein Schlüssel, der nicht
+        # zum Upload passt (z.B. Datei nach dem Hashen geändert), wird ignoriert
+        source_hash = hashlib.sha256(data).hexdigest()
+        if idempotency_key:
+            if idempotency_key.strip().lower() == source_hash:
+                existing = await asyncio.to_thread(_find_classification_by_hash, source_hash)
+                if existing is not None:
+                    return JSONResponse(content=existing)
+            else:
+                print(f"⚠️  Idempotency-Key passt nicht zum Upload {original_name} – ignoriert.")
+
         # Bild in WebP konvertieren und speichern (zur Speicherersparnis)
         ts = time.strftime("%Y%m%d_%H%M%S")
         filename = f"{ts}_{int(time.time() * 1000)}.webp"
@@ -645,13 +1543,30 @@ async def classify(file: UploadFile = File(...)):
                 data, filename=original_name, content_type=file.content_type
             )
         except Exception as e:
+            upstream_response = _upstream_error_response(e)
+            if upstream_response is not None:
+                print(f"⚠️  Modellaufruf: {type(e).__name__}, Retry-After {upstream_response.headers['Retry-After']}s")
+                return upstream_response
             traceback.print_exc()
             return JSONResponse(
                 status_code=500, content={"error": f"Fehler bei Modellaufruf: {e}"}
             )
 
-        # Ergebnis in DB speichern
-        new_id = store_classification(filename, model_result)
+        # Codes gegen die lokale Nomenklatur prüfen, ungültige auf gültige Blätter snappen
+        # (Originalwerte bleiben erhalten; ohne geladene Referenz keine Validierung)
+        try:
+            validate_classification(
+                model_result, get_code_index(), on_date=date.today().isoformat()
+            )
+        except Exception:
+            traceback.print_exc()
+
+        if (request_source or "").strip().lower() != "bulk" and model_result.get("usage"):
+            await asyncio.to_thread(_record_interactive_usage, model_result["usage"], source_hash)
+
+        # Ergebnis in DB speichern (gebündelt über den Group-Commit-Writer)
+        model_result["source_hash"] = source_hash
+        new_id = await classification_writer.submit(filename, model_result)
 
         response: Dict[str, Any] = {
             "id": new_id,
@@ -662,6 +1577,9 @@ async def classify(file: UploadFile = File(...)):
             "confidence": model_result.get("confidence"),
             "short_reason": model_result.get("short_reason"),
             "possible_alternatives": model_result.get("possible_alternatives"),
+            "taric_code_snapped": model_result.get("taric_code_snapped"),
+            "code_valid": model_result.get("code_valid"),
+            "code_validation": model_result.get("code_validation"),
             "usage": model_result.get("usage"),
         }
         return JSONResponse(content=response)
@@ -678,6 +1596,8 @@ async def get_evaluation_items(
     limit: int = 100,
     only_unreviewed: bool = False,
     only_reviewed: bool = False,
+    include_raw: bool = True,
+    code_valid: Optional[bool] = None,
 ):
     """
     Liefert Klassifikationen inklusive (optional vorhandener) Bewertung
@@ -687,6 +1607,10 @@ async def get_evaluation_items(
     - limit: max. Anzahl Datensätze
     - only_unreviewed: nur Fälle ohne Bewertung
     - only_reviewed: nur bereits bewertete Fälle
+    - include_raw: Modell-Rohantwort mitliefern (Standard, wird dafür dekomprimiert);
+      include_raw=false spart das Dekomprimieren, die Rohantwort gibt es dann
+      nur über /api/evaluation/items/{taric_live_id}
+    - code_valid: nur Fälle mit gültigem (true) bzw. ungültigem/gesnapptem (false) Code
     """
     conn = get_conn()
     cur = conn.cursor()
@@ -703,6 +1627,8 @@ async def get_evaluation_items(
             l.short_reason    AS short_reason,
             l.alternatives_json AS alternatives_json,
             l.raw_response_json AS raw_response_json,
+            l.taric_code_snapped AS taric_code_snapped,
+            l.code_valid      AS code_valid,
             e.id              AS evaluation_id,
             e.correct_digits  AS correct_digits,
             e.reviewer        AS reviewer,
@@ -723,6 +1649,10 @@ async def get_evaluation_items(
     elif only_reviewed and not only_unreviewed:
         where.append("e.id IS NOT NULL")
 
+    if code_valid is not None:
+        where.append("l.code_valid = ?")
+        params.append(int(code_valid))
+
     if where:
         base_sql += " WHERE " + " AND ".join(where)
 
@@ -731,23 +1661,23 @@ async def get_evaluation_items(
 
     cur.execute(base_sql, params)
     rows = cur.fetchall()
+
+    raw_blobs: Dict[int, str] = {}
+    if include_raw:
+        raw_blobs = get_blobs(
+            conn, "taric_live", [r["taric_live_id"] for r in rows], KIND_RAW_RESPONSE
+        )
     conn.close()
 
     items: List[dict] = []
     for r in rows:
         alternatives_json = r["alternatives_json"] or "[]"
-        raw_response_json = r["raw_response_json"] or "{}"
 
         try:
             alternatives = json.loads(alternatives_json)
         except Exception:
             alternatives = []
 
-        try:
-            raw_response = json.loads(raw_response_json)
-        except Exception:
-            raw_response = {}
-
         eval_block = None
         if r["evaluation_id"] is not None:
             eval_block = {
@@ -770,14 +1700,80 @@ async def get_evaluation_items(
                 "confidence": r["confidence"],
                 "short_reason": r["short_reason"],
                 "alternatives": alternatives,
-                "raw_response": raw_response,
+                "taric_code_snapped": r["taric_code_snapped"],
+                "code_valid": None if r["code_valid"] is None else bool(r["code_valid"]),
                 "evaluation": eval_block,
             }
         )
 
+        if include_raw:
+            raw_json = raw_blobs.get(r["taric_live_id"]) or r["raw_response_json"] or "{}"
+            try:
+                items[-1]["raw_response"] = json.loads(raw_json)
+            except Exception:
+                items[-1]["raw_response"] = {}
+
     return JSONResponse(content=items)
 
 
+@app.get("/api/evaluation/items/{taric_live_id}")
+async def get_evaluation_item(taric_live_id: int):
+    """
+    Detailansicht eines Falls inkl. dekomprimierter Modell-Rohantwort.
+    """
+    conn = get_conn()
+    try:
+        row = conn.execute(
+            """
+            SELECT id, filename, created_at, taric_code, cn_code, hs_chapter,
+                   confidence, short_reason, alternatives_json, raw_response_json,
+                   taric_code_snapped, code_valid
+              FROM taric_live
+             WHERE id = ?
+            """,
+            (taric_live_id,),
+        ).fetchone()
+        if not row:
+            return JSONResponse(
+                status_code=404, content={"error": f"Fall {taric_live_id} nicht gefunden."}
+            )
+        raw_response = load_raw_response(conn, row["id"], row["raw_response_json"])
+        eval_row = conn.execute(
+            """
+            SELECT id, correct_digits, reviewer, comment, superviser_bewertung, reviewed_at
+              FROM taric_evaluation
+             WHERE taric_live_id = ?
+            """,
+            (taric_live_id,),
+        ).fetchone()
+    finally:
+        conn.close()
+
+    try:
+        alternatives = json.loads(row["alternatives_json"] or "[]")
+    except Exception:
+        alternatives = []
+
+    return JSONResponse(
+        content={
+            "taric_live_id": row["id"],
+            "filename": row["filename"],
+            "created_at": row["created_at"],
+            "taric_code": row["taric_code"],
+            "cn_code": row["cn_code"],
+            "hs_chapter": row["hs_chapter"],
+            "confidence": row["confidence"],
+            "short_reason": row["short_reason"],
+            "alternatives": alternatives,
+            "taric_code_snapped": row["taric_code_snapped"],
+            "code_valid": None if row["code_valid"] is None else bool(row["code_valid"]),
+            "code_validation": raw_response.get("code_validation"),
+            "raw_response": raw_response,
+            "evaluation": dict(eval_row) if eval_row else None,
+        }
+    )
+
+
 @app.post("/api/evaluation/save")
 async def save_evaluation(payload: EvaluationIn):
     """
@@ -846,6 +1842,90 @@ async def save_evaluation(payload: EvaluationIn):
     return JSONResponse(content={"status": "ok", "evaluation_id": eval_id})
 
 
+@app.post("/api/evaluation/save_batch")
+async def save_evaluation_batch(payload: List[EvaluationIn]):
+    """
+    Batch-Upsert in taric_evaluation:
+    - alle Bewertungen in einer Transaktion (ein Commit statt einem pro Fall)
+    - INSERT … ON CONFLICT(taric_live_id) DO UPDATE statt SELECT + UPDATE/INSERT
+    - Rückgabe pro Eintrag (gleiche Reihenfolge wie im Request)
+    """
+    conn = get_conn()
+    cur = conn.cursor()
+
+    now = time.strftime("%Y-%m-%d %H:%M:%S")
+    results: List[dict] = []
+    ok_count = 0
+
+    try:
+        for item in payload:
+            try:
+                cur.execute(
+                    """
+                    INSERT INTO taric_evaluation (
+                        taric_live_id,
+                        correct_digits,
+                        reviewer,
+                        comment,
+                        superviser_bewertung,
+                        reviewed_at
+                    ) VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(taric_live_id) DO UPDATE SET
+                        correct_digits = excluded.correct_digits,
+                        reviewer = excluded.reviewer,
+                        comment = excluded.comment,
+                        superviser_bewertung = excluded.superviser_bewertung,
+                        reviewed_at = excluded.reviewed_at
+                    RETURNING id
+                    """,
+                    (
+                        item.taric_live_id,
+                        item.correct_digits,
+                        item.reviewer,
+                        item.comment,
+                        item.superviser_bewertung,
+                        now,
+                    ),
+                )
+                row = cur.fetchone()
+                results.append(
+                    {
+                        "taric_live_id": item.taric_live_id,
+                        "status": "ok",
+                        "evaluation_id": row["id"] if row else None,
+                    }
+                )
+                ok_count += 1
+            except sqlite3.Error as e:
+                results.append(
+                    {
+                        "taric_live_id": item.taric_live_id,
+                        "status": "error",
+                        "error": str(e),
+                    }
+                )
+
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        traceback.print_exc()
+        return JSONResponse(
+            status_code=500,
+            content={"error": f"Fehler beim Batch-Speichern: {e}"},
+        )
+    finally:
+        conn.close()
+
+    return JSONResponse(
+        content={
+            "status": "ok" if ok_count == len(payload) else "partial",
+            "saved": ok_count,
+            "failed": len(payload) - ok_count,
+            "results": results,
+        }
+    )
+
+
 @app.get("/api/taric_official_description/{taric_code}")
 async def get_official_description(taric_code: str):
     """
@@ -866,11 +1946,32 @@ async def get_official_description(taric_code: str):
             content={"error": "Ungültiger TARIC-Code. Muss 10-stellig sein."},
         )
 
+    # 2) Lookup im In-Memory-Index (ohne DB-Roundtrip), falls taric_reference geladen ist
+    index = get_code_index()
+    if len(index):
+        entry = index.get(taric_code)
+        if entry:
+            print(f"LOG: [EU-API-TEST] SUCCESS - Beschreibung für {taric_code} im Code-Index gefunden.")
+            return JSONResponse(
+                content={
+                    "taricCode": taric_code,
+                    "officialDescription": entry.description_de,
+                    "source": "Local TARIC Reference Index (EU Data)",
+                    "validFrom": entry.valid_from,
+                    "validTo": entry.valid_to,
+                    "isLeaf": entry.is_leaf,
+                    "ancestors": [
+                        {"taricCode": a.code, "description": a.description_de}
+                        for a in index.ancestors(taric_code)
+                    ],
+                }
+            )
+
     conn = get_conn()
     cur = conn.cursor()
 
     try:
-        # 2) Lookup in lokaler Referenz-DB
+        # 3) Fallback: Lookup in lokaler Referenz-DB
         cur.execute(
             """
             SELECT description_de
@@ -973,6 +2074,86 @@ async def health():
     return {"status": "ok"}
 
 
+@app.post("/api/taric_code_index/reload")
+async def taric_code_index_reload():
+    """Baut den In-Memory-Code-Index sofort neu (z.B. direkt nach load_taric_nomenclature.py)."""
+    index = await asyncio.to_thread(reload_code_index)
+    return {"status": "reloaded", "codes": len(index), "version": index.version}
+
+
+@app.post("/api/taric_official_cache/warm")
+async def taric_official_cache_warm(
+    lang: str = Query("de", description="Sprachcode, z.B. 'de' oder 'en'"),
+    sim_date: str | None = Query(None, description="Simulationsdatum YYYYMMDD (Standard: heute)"),
+    concurrency: int = Query(WARMER_CONCURRENCY, ge=1, le=8),
+    delay_s: float = Query(WARMER_DELAY_S, ge=0.0),
+):
+    """
+    Startet den Cache-Warmer im Hintergrund (z.B. nach einem Bulk-Lauf).
+    Läuft bereits einer, wird kein zweiter gestartet.
+    """
+    global _warmer_task
+    if _warmer_task is not None and not _warmer_task.done():
+        return JSONResponse(status_code=202, content={"status": "already_running", **warmer_status})
+
+    _warmer_task = asyncio.create_task(
+        warm_official_cache(lang=lang, sim_date=sim_date, concurrency=concurrency, delay_s=delay_s)
+    )
+    return JSONResponse(status_code=202, content={"status": "started"})
+
+
+@app.get("/api/taric_official_cache/coverage")
+async def taric_official_cache_coverage(
+    lang: str = Query("de", description="Sprachcode, z.B. 'de' oder 'en'"),
+    sim_date: str | None = Query(None, description="Simulationsdatum YYYYMMDD (Standard: heute)"),
+    include_missing: bool = False,
+):
+    """Abdeckung der je vorhergesagten Präfixe durch Referenz/Cache + Status des Warmers."""
+    sim_date = sim_date or date.today().strftime("%Y%m%d")
+    codes = await asyncio.to_thread(_collect_predicted_codes)
+    coverage = await asyncio.to_thread(_official_cache_coverage, codes, sim_date, lang)
+    if not include_missing:
+        coverage["missing"] = len(coverage["missing"])
+    coverage["warmer"] = dict(warmer_status)
+    return JSONResponse(content=coverage)
+
+
+@app.get("/api/taric_official_cache/stats")
+async def taric_official_cache_stats():
+    """
+    Größe von taric_official_cache (Zeilen, Bytes inkl. komprimiertem HTML in taric_blob),
+    Budget sowie Trefferzähler/Hit-Rate des zweistufigen Caches.
+    """
+
+    def _size() -> Dict[str, int]:
+        conn = get_conn()
+        try:
+            return _official_cache_size(conn)
+        finally:
+            conn.close()
+
+    size = await asyncio.to_thread(_size)
+    lookups = sum(
+        official_cache_stats[k] for k in ("memory_hits", "negative_hits", "sqlite_hits", "fetches")
+    )
+    memory_hits = official_cache_stats["memory_hits"] + official_cache_stats["negative_hits"]
+    cache_hits = memory_hits + official_cache_stats["sqlite_hits"]
+    return {
+        **official_cache_stats,
+        "memory_entries": len(_official_memory_cache),
+        "negative_entries": len(_official_negative_cache),
+        "pending_touches": len(_pending_touches),
+        "memory_hit_rate": round(memory_hits / lookups, 4) if lookups else None,
+        "hit_rate": round(cache_hits / lookups, 4) if lookups else None,
+        "table": {
+            **size,
+            "max_rows": OFFICIAL_CACHE_MAX_ROWS,
+            "max_bytes": OFFICIAL_CACHE_MAX_BYTES,
+            "stale_days": OFFICIAL_CACHE_STALE_DAYS,
+        },
+    }
+
+
 @app.get("/api/taric_official_compare")
 async def taric_official_compare(
     code: str = Query(..., description="10-stelliger TARIC-Code, z.B. 8517120000"),
@@ -1001,31 +2182,103 @@ async def taric_official_compare(
 
         return JSONResponse(content=result)
 
-    except httpx.HTTPStatusError as e:
-        requested_url = str(e.request.url) if e.request else None
-        return JSONResponse(
-            content={
-                "error": f"HTTP-Fehler beim Abruf der EU-TARIC-Seite: {e.response.status_code} {e.response.reason_phrase}",
-                "input_code": code,
-                "requested_url": requested_url,
-            },
-            status_code=502,
-        )
-    except httpx.HTTPError as e:
-        requested_url = str(e.request.url) if getattr(e, "request", None) else None
-        return JSONResponse(
-            content={
-                "error": f"Netzwerkfehler beim Abruf der EU-TARIC-Seite: {str(e)}",
-                "input_code": code,
-                "requested_url": requested_url,
-            },
-            status_code=502,
-        )
     except Exception as e:
+        status_code, content = _official_compare_error(e, code)
+        return JSONResponse(content=content, status_code=status_code)
+
+
+def _official_compare_error(exc: Exception, code: str) -> tuple[int, dict]:
+    """Fehler beim EU-Abruf -> (HTTP-Status, Fehler-Payload) wie bei /api/taric_official_compare."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        requested_url = str(exc.request.url) if exc.request else None
+        return 502, {
+            "error": f"HTTP-Fehler beim Abruf der EU-TARIC-Seite: {exc.response.status_code} {exc.response.reason_phrase}",
+            "input_code": code,
+            "requested_url": requested_url,
+        }
+    if isinstance(exc, httpx.HTTPError):
+        requested_url = str(exc.request.url) if getattr(exc, "_request", None) else None
+        return 502, {
+            "error": f"Netzwerkfehler beim Abruf der EU-TARIC-Seite: {str(exc)}",
+            "input_code": code,
+            "requested_url": requested_url,
+        }
+    return 500, {
+        "error": f"Interner Fehler beim TARIC-Vergleich: {str(exc)}",
+        "input_code": code,
+    }
+
+
+# Max. parallele Auflösungen je Batch-Anfrage
+COMPARE_BATCH_CONCURRENCY = int(os.getenv("TARIC_COMPARE_BATCH_CONCURRENCY", "4"))
+COMPARE_BATCH_MAX_ITEMS = 200
+
+
+class OfficialCompareItem(BaseModel):
+    code: str
+    digits: int = 4
+
+
+class OfficialCompareBatchIn(BaseModel):
+    items: List[OfficialCompareItem]
+    lang: str = "de"
+    sim_date: Optional[str] = None
+
+
+@app.post("/api/taric_official_compare/batch")
+async def taric_official_compare_batch(payload: OfficialCompareBatchIn):
+    """
+    Wie /api/taric_official_compare, aber für viele (code, digits)-Paare in einer Anfrage.
+
+    - gleiche Präfixe (z.B. 8517 aus mehreren Codes) werden nur einmal aufgelöst
+    - Auflösung parallel über Speicher-/SQLite-Cache und EU-Abruf
+      (max. TARIC_COMPARE_BATCH_CONCURRENCY gleichzeitig)
+    - Ergebnisse in Eingabereihenfolge, je Eintrag mit eigenem "status"
+    """
+    if len(payload.items) > COMPARE_BATCH_MAX_ITEMS:
         return JSONResponse(
-            content={
-                "error": f"Interner Fehler beim TARIC-Vergleich: {str(e)}",
-                "input_code": code,
-            },
-            status_code=500,
+            status_code=400,
+            content={"error": f"Maximal {COMPARE_BATCH_MAX_ITEMS} Einträge pro Anfrage."},
         )
+
+    sim_date = payload.sim_date or date.today().strftime("%Y%m%d")
+    semaphore = asyncio.Semaphore(max(1, COMPARE_BATCH_CONCURRENCY))
+
+    async def _resolve(code: str, digits: int) -> tuple[int, dict]:
+        async with semaphore:
+            try:
+                result = await fetch_official_taric_description(
+                    full_code=code, digits=digits, lang=payload.lang, sim_date=sim_date
+                )
+            except Exception as e:
+                return _official_compare_error(e, code)
+        return (400 if "error" in result else 200), result
+
+    # Dedupe: ein Task je (Präfix, digits); ungültige Eingaben laufen einzeln durch
+    tasks: Dict[tuple, asyncio.Task] = {}
+    keys: List[tuple] = []
+    for item in payload.items:
+        code = item.code.strip()
+        digits = item.digits if item.digits in (4, 6, 8, 10) else 4
+        valid = code.isdigit() and len(code) == 10
+        key = (code[:digits], digits) if valid else ("invalid", code)
+        if key not in tasks:
+            tasks[key] = asyncio.create_task(_resolve(code, digits))
+        keys.append(key)
+
+    await asyncio.gather(*tasks.values())
+
+    results: List[dict] = []
+    for item, key in zip(payload.items, keys):
+        status_code, content = tasks[key].result()
+        results.append({**content, "input_code": item.code, "status": status_code})
+
+    return JSONResponse(
+        content={
+            "lang": payload.lang,
+            "sim_date": sim_date,
+            "requested": len(payload.items),
+            "resolved": len(tasks),
+            "results": results,
+        }
+    )
@@ -3,26 +3,66 @@
 TARIC Bulk Evaluation
 
 Funktion:
-- Nimmt Bilder aus data/taric_bulk_input
+- Nimmt Bilder aus data/taric_bulk_input in die Arbeits-Queue auf
+  (taric_bulk_queue.py, SQLite) und least sie von dort
 - Schickt sie sequenziell an das FastAPI-Backend (/classify)
 - Wartet nach jedem Bild eine konfigurierbare Pause
 - Verschiebt erfolgreiche Bilder nach data/taric_bulk_done
-- Verschiebt dauerhafte Fehler nach data/taric_bulk_error
+- Vorübergehende Fehler (Timeouts, Verbindungsfehler, 5xx) werden mit
+  exponentiellem Backoff + Jitter erneut eingeplant (Datei bleibt im INPUT);
+  nach TARIC_BULK_MAX_ATTEMPTS Versuchen landet der Eintrag als Dead Letter in
+  data/taric_bulk_error
+- Verschiebt dauerhafte Fehler (z.B. 4xx, ungültiges Bild) sofort nach data/taric_bulk_error
 - Beobachtet optional Token-Nutzung aus der Backend-Antwort
 
+Wiederaufnahme nach Abbrüchen:
+- Zustand je Datei (pending/leased/done/error, Versuche, letzter Fehler) steht in
+  der Queue; Leases eines abgestürzten Laufs laufen ab (TARIC_BULK_LEASE_S) und die
+  Einträge werden erneut vergeben
+- Der Inhaltshash geht als Idempotency-Key an /classify: ein bereits gespeichertes
+  Ergebnis wird zurückgegeben statt erneut klassifiziert
+- Dateien, die laut Queue fertig sind, aber noch im INPUT liegen, werden beim
+  nächsten Lauf nur noch verschoben
+
 Das Script ist bewusst defensiv:
-- Kein Parallelismus
-- Bricht bei Rate-Limits oder Backend-Ausfällen sauber ab
+- Standard: kein Parallelismus
+- Liefert das Backend bei 429/503 ein Retry-After, wird genau so lange pausiert
+  und das Bild erneut gesendet (höchstens TARIC_BULK_REQUEUE_LIMIT-mal,
+  höchstens TARIC_BULK_MAX_RETRY_AFTER_S Sekunden)
+- Bricht bei 429/503 ohne (oder mit zu langem) Retry-After bzw. nach
+  TARIC_BULK_REQUEUE_LIMIT Wiederholungen sauber ab; die Datei bleibt im INPUT und
+  der Queue-Eintrag wird ohne gezählten Versuch freigegeben (frühestens nach Retry-After)
+- Token-Verbrauch wird laufübergreifend gebucht (taric_token_budget.py); bei
+  konfiguriertem Tages-/Minutenbudget (TARIC_TOKEN_BUDGET_PER_DAY/_PER_MINUTE)
+  wartet der Lauf, bis wieder Budget frei ist, und lässt eine Reserve für
+  interaktive Klassifikationen
+
+Dead Letters (und mit --include-permanent auch dauerhafte Fehler) zurück in den INPUT:
+    python3 bulk-evaluation.py retry-errors
+
+Optionaler Parallelbetrieb (--concurrent bzw. TARIC_BULK_CONCURRENT=1):
+- Worker-Pool statt fester Pause; die Parallelität passt sich per AIMD an
+  (+1 pro erfolgreichem "Fenster", Halbierung bei 429/5xx/Latenzspitzen)
+- optionales Durchsatzziel (Bilder/Minute) begrenzt Starts und Wachstum
+- Log-Einträge und Verschiebungen erfolgen in Eingabereihenfolge; der Log-Eintrag
+  wird vor dem Verschieben geschrieben und per fsync gesichert
 """
 
+import argparse
 import csv
+import email.utils
 import os
+import random
 import sys
 import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Deque, Dict, List, Optional, Any, Tuple
 
-import requests
+from taric_bulk_http import format_stats, get_transport
+from taric_bulk_queue import LEASE_SECONDS, STATE_DONE, BulkQueue, QueueItem, default_owner
+from taric_token_budget import TokenBudget, format_wait
 
 
 # ---------------------------------------------------------------------------
@@ -46,11 +86,34 @@ MAX_PER_RUN = int(os.getenv("TARIC_BULK_MAX_PER_RUN", "40"))
 # Pause nach jedem Bild (Sekunden)
 SLEEP_SECONDS = float(os.getenv("TARIC_BULK_SLEEP_SECONDS", "10"))
 
-# Optionales Soft-Limit für Tokens pro Run (0 = deaktiviert)
+# Optionales Soft-Limit für Tokens pro Run (0 = deaktiviert);
+# laufübergreifende Budgets siehe taric_token_budget.py
 MAX_TOTAL_TOKENS_PER_RUN = int(os.getenv("TARIC_BULK_MAX_TOKENS", "0"))
 
-# Erlaubte Dateiendungen (inkl. WEBP)
-ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+# Parallelbetrieb (AIMD) – Standard bleibt sequenziell
+CONCURRENT_MODE = os.getenv("TARIC_BULK_CONCURRENT", "0") in ("1", "true", "yes")
+# Obergrenze für gleichzeitige Requests
+MAX_CONCURRENCY = int(os.getenv("TARIC_BULK_MAX_CONCURRENCY", "8"))
+# Durchsatzziel in Bildern pro Minute (0 = so schnell, wie AIMD es zulässt)
+TARGET_PER_MINUTE = float(os.getenv("TARIC_BULK_TARGET_PER_MIN", "0"))
+# Latenzspitze: Antwortzeit > Faktor × gleitender Mittelwert
+LATENCY_SPIKE_FACTOR = float(os.getenv("TARIC_BULK_LATENCY_SPIKE_FACTOR", "3.0"))
+# Wie oft eine Datei nach 429/503 im selben Lauf erneut eingeplant wird
+REQUEUE_LIMIT = int(os.getenv("TARIC_BULK_REQUEUE_LIMIT", "3"))
+# Längstes Retry-After, das innerhalb eines Laufs abgewartet wird (sonst Abbruch)
+MAX_RETRY_AFTER_WAIT_S = float(os.getenv("TARIC_BULK_MAX_RETRY_AFTER_S", "900"))
+
+# Retry-Policy für vorübergehende Fehler: Versuche insgesamt, Backoff-Basis/-Obergrenze
+MAX_ATTEMPTS = int(os.getenv("TARIC_BULK_MAX_ATTEMPTS", "5"))
+RETRY_BASE_SECONDS = float(os.getenv("TARIC_BULK_RETRY_BASE_S", "30"))
+RETRY_MAX_SECONDS = float(os.getenv("TARIC_BULK_RETRY_MAX_S", "1800"))
+
+# Nach einem Lauf mit Erfolgen den Cache-Warmer für offizielle Beschreibungen anstoßen
+WARM_CACHE_AFTER_RUN = os.getenv("TARIC_BULK_WARM_CACHE", "1") not in ("0", "false", "no")
+WARM_CACHE_URL = os.getenv(
+    "TARIC_WARM_CACHE_URL",
+    BACKEND_URL.rsplit("/classify", 1)[0] + "/api/taric_official_cache/warm",
+)
 
 # Mapping von Endung → MIME-Type für den Upload
 EXT_TO_MIME: Dict[str, str] = {
@@ -72,25 +135,32 @@ def ensure_dirs() -> None:
         d.mkdir(parents=True, exist_ok=True)
 
 
-def iter_input_files(limit: int) -> List[Path]:
+def lease_input_files(
+    queue: BulkQueue, owner: str, limit: int, ready_paths: Optional[List[Path]] = None
+) -> List[QueueItem]:
     """
-    Liefert bis zu `limit` Dateien aus INPUT_DIR mit erlaubter Endung,
-    alphabetisch sortiert.
+    Nimmt neue Dateien aus INPUT_DIR in die Queue auf und least bis zu `limit`
+    Einträge (älteste zuerst, inkl. abgelaufener Leases früherer Läufe).
+    Mit `ready_paths` (Watcher) werden nur diese fertig geschriebenen Dateien neu
+    aufgenommen, statt das ganze Verzeichnis zu scannen; geleast wird dann nur,
+    was bereits in der Queue steht.
+
+    Bereits abgeschlossene Einträge, deren Datei noch im INPUT liegt (Abbruch
+    zwischen Abschluss und Verschieben), werden nur noch verschoben.
     """
-    files: List[Path] = []
-    if not INPUT_DIR.exists():
-        return files
-
-    for p in sorted(INPUT_DIR.iterdir()):
-        if not p.is_file():
-            continue
-        if p.suffix.lower() not in ALLOWED_EXTENSIONS:
-            # Unbekannte Endung ignorieren – bleibt im Ordner liegen
+    found = queue.scan(INPUT_DIR, paths=ready_paths)
+    for path, state in found["finished"]:
+        move_file(path, DONE_DIR if state == STATE_DONE else ERROR_DIR)
+        print(f"{path.name}: bereits verarbeitet ({state}), verschoben.")
+
+    items: List[QueueItem] = []
+    for item in queue.lease(owner, limit=limit):
+        if not item.file_path.exists():
+            # Datei wurde außerhalb der Pipeline entfernt
+            queue.fail(item.id, owner, "FILE_MISSING")
             continue
-        files.append(p)
-        if len(files) >= limit:
-            break
-    return files
+        items.append(item)
+    return items
 
 
 def open_log_writer():
@@ -129,9 +199,12 @@ def open_log_writer():
             self.file = file_obj
             self.writer = csv_writer
 
-        def write(self, row: List[Any]) -> None:
+        def write(self, row: List[Any], sync: bool = False) -> None:
             self.writer.writerow(row)
             self.file.flush()
+            if sync:
+                # Eintrag muss auf der Platte sein, bevor die Datei verschoben wird
+                os.fsync(self.file.fileno())
 
         def close(self) -> None:
             self.file.close()
@@ -146,9 +219,11 @@ def log_result(
     response_json: Optional[dict],
     error_code: Optional[str],
     error_message: Optional[str],
+    sync: bool = False,
 ) -> int:
     """
     Schreibt einen Log-Eintrag und gibt total_tokens (falls vorhanden) zurück.
+    sync=True: Eintrag zusätzlich per fsync sichern.
     """
     ts = time.strftime("%Y-%m-%d %H:%M:%S")
 
@@ -184,17 +259,60 @@ def log_result(
             prompt_tokens,
             completion_tokens,
             total_tokens,
-        ]
+        ],
+        sync=sync,
     )
 
     return int(total_tokens or 0)
 
 
-def classify_file(path: Path) -> Tuple[str, Optional[dict], Optional[str], Optional[str]]:
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After-Header (Sekunden oder HTTP-Datum) -> Sekunden ab jetzt."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(when.timestamp() - time.time(), 0.0)
+
+
+def retry_after_of(data: Optional[dict]) -> Optional[float]:
+    """Vom Backend vorgegebene Wartezeit aus einer 429/503-Antwort (siehe classify_file)."""
+    if isinstance(data, dict) and data.get("retry_after") is not None:
+        try:
+            return float(data["retry_after"])
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def _error_json(resp: Any) -> Optional[dict]:
+    """Fehler-JSON der Antwort; bei 429/503 ergänzt um retry_after aus dem Header."""
+    try:
+        data = resp.json()
+    except Exception:
+        data = None
+    if resp.status_code in (429, 503):
+        retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+        if retry_after is not None:
+            data = dict(data) if isinstance(data, dict) else {}
+            data["retry_after"] = retry_after
+    return data
+
+
+def classify_file(
+    path: Path, idempotency_key: Optional[str] = None
+) -> Tuple[str, Optional[dict], Optional[str], Optional[str]]:
     """
-    Schickt eine Datei an das Backend und gibt zurück:
+    Schickt eine Datei an das Backend (optional mit Idempotency-Key) und gibt zurück:
     - status: "done" / "rate_limited" / "http_error" / "backend_error"
-    - response_json (bei Erfolg oder fachlichem Fehler)
+    - response_json (bei Erfolg oder fachlichem Fehler; bei 429/503 inkl. retry_after)
     - error_code / error_message (falls vorhanden)
     """
     ext = path.suffix.lower()
@@ -203,25 +321,23 @@ def classify_file(path: Path) -> Tuple[str, Optional[dict], Optional[str], Optio
     try:
         with path.open("rb") as f:
             files = {"file": (path.name, f, mime)}
-            resp = requests.post(BACKEND_URL, files=files, timeout=60)
+            # Als Bulk kennzeichnen: das Backend bucht nur interaktive Aufrufe ins Token-Ledger
+            headers = {"X-Taric-Source": "bulk"}
+            if idempotency_key:
+                headers["Idempotency-Key"] = idempotency_key
+            resp = get_transport().post(BACKEND_URL, files=files, headers=headers, timeout=60)
     except Exception as e:
         return "backend_error", None, "REQUEST_FAILED", str(e)
 
     # Rate-Limit oder Server-Überlastung
     if resp.status_code == 429:
-        try:
-            data = resp.json()
-        except Exception:
-            data = None
+        data = _error_json(resp)
         msg = data.get("error") if isinstance(data, dict) else resp.text
         return "rate_limited", data, "RATE_LIMIT", msg
 
     # Generischer HTTP-Fehler
-    if not resp.ok:
-        try:
-            data = resp.json()
-        except Exception:
-            data = None
+    if resp.status_code >= 400:
+        data = _error_json(resp)
         msg = None
         if isinstance(data, dict):
             msg = data.get("error") or data.get("detail")
@@ -238,6 +354,18 @@ def classify_file(path: Path) -> Tuple[str, Optional[dict], Optional[str], Optio
     return "done", data, None, None
 
 
+def trigger_cache_warmer() -> None:
+    """Stößt den Cache-Warmer im Backend an (läuft dort im Hintergrund)."""
+    try:
+        resp = get_transport().post(WARM_CACHE_URL, timeout=10)
+        if resp.status_code < 400:
+            print(f"Cache-Warmer angestoßen ({resp.json().get('status')}).")
+        else:
+            print(f"Cache-Warmer konnte nicht gestartet werden: HTTP {resp.status_code}")
+    except Exception as e:
+        print(f"Cache-Warmer konnte nicht gestartet werden: {e}")
+
+
 def move_file(src: Path, dst_dir: Path) -> None:
     """Verschiebt eine Datei in das Zielverzeichnis (Zielverzeichnis wird angelegt)."""
     dst_dir.mkdir(parents=True, exist_ok=True)
@@ -245,35 +373,492 @@ def move_file(src: Path, dst_dir: Path) -> None:
     src.replace(dst)
 
 
+# Fehler, bei denen ein späterer Versuch voraussichtlich gelingt
+# (Netzwerk, Timeouts, Überlastung/Ausfall des Backends oder des Modells)
+TRANSIENT_ERROR_CODES = {
+    "REQUEST_FAILED",
+    "INVALID_JSON",
+    "RATE_LIMIT",
+    "HTTP_408",
+    "HTTP_425",
+    "HTTP_429",
+    "HTTP_500",
+    "HTTP_502",
+    "HTTP_503",
+    "HTTP_504",
+}
+
+
+def is_transient_error(err_code: Optional[str]) -> bool:
+    """Vorübergehend (erneut versuchen) oder dauerhaft (sofort nach ERROR)?"""
+    return err_code in TRANSIENT_ERROR_CODES
+
+
+def retry_delay(attempt: int) -> float:
+    """Exponentielles Backoff mit vollem Jitter: zufällig in [0, min(max, base·2^(n-1))]."""
+    ceiling = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * (2 ** max(attempt - 1, 0)))
+    return random.uniform(0.0, ceiling)
+
+
+def finish_item(
+    queue: BulkQueue,
+    owner: str,
+    item: QueueItem,
+    status: str,
+    data: Optional[dict],
+    err_code: Optional[str],
+    err_msg: Optional[str],
+) -> str:
+    """
+    Schreibt das Ergebnis in die Queue und verschiebt danach die Datei.
+    Reihenfolge: Log (fsync) -> Queue -> Verschieben; bricht der Lauf dazwischen ab,
+    holt der nächste Scan das Verschieben nach.
+
+    Rückgabe: "done", "retry" (Datei bleibt im INPUT), "dead" oder "error".
+    """
+    if status == "done":
+        queue.complete(item.id, owner, result_id=(data or {}).get("id"))
+        move_file(item.file_path, DONE_DIR)
+        return "done"
+
+    error = f"{err_code}: {err_msg}" if err_msg else err_code
+    if not is_transient_error(err_code):
+        queue.fail(item.id, owner, error)
+        move_file(item.file_path, ERROR_DIR)
+        return "error"
+    if item.attempts >= MAX_ATTEMPTS:
+        queue.dead(item.id, owner, error)
+        move_file(item.file_path, ERROR_DIR)
+        return "dead"
+    # Nie früher als vom Backend per Retry-After verlangt
+    delay = max(retry_delay(item.attempts), retry_after_of(data) or 0.0)
+    queue.retry_later(item.id, owner, error, delay)
+    return "retry"
+
+
+def describe_outcome(outcome: str, item: QueueItem) -> str:
+    if outcome == "retry":
+        return f"erneuter Versuch später ({item.attempts}/{MAX_ATTEMPTS})"
+    if outcome == "dead":
+        return f"Dead Letter nach {item.attempts} Versuchen, verschoben nach {ERROR_DIR.name}"
+    return f"verschoben nach {ERROR_DIR.name}"
+
+
+def wait_for_budget(budget: TokenBudget, queue: BulkQueue, owner: str) -> None:
+    """Blockiert bis zur nächsten Budget-Freigabe; Leases bleiben dabei gültig."""
+    last_reason: List[str] = []
+
+    def _on_wait(wait: float, reason: str) -> None:
+        queue.renew(owner, lease_s=min(wait, 60.0) + LEASE_SECONDS)
+        if last_reason != [reason]:
+            print(f"  Token-Budget: {reason}, Pause ca. {format_wait(wait)} ...", flush=True)
+            last_reason[:] = [reason]
+
+    waited = budget.acquire(on_wait=_on_wait)
+    if waited:
+        print(f"  Token-Budget wieder verfügbar nach {format_wait(waited)}.", flush=True)
+
+
+def retry_errors(include_permanent: bool = False, limit: int = -1) -> int:
+    """
+    Holt Dead Letters (optional auch dauerhafte Fehler) samt Datei aus ERROR_DIR
+    zurück in den INPUT und setzt sie mit frischem Versuchszähler auf pending.
+    Reihenfolge: erst Datei, dann Queue – ein Abbruch dazwischen wird beim
+    nächsten Scan korrigiert (Datei wandert zurück nach ERROR).
+    """
+    queue = BulkQueue()
+    requeued = 0
+    try:
+        for row in queue.dead_letters(include_errors=include_permanent, limit=limit):
+            target = Path(row["file_path"])
+            source = ERROR_DIR / target.name
+            if not source.exists():
+                print(f"{target.name}: nicht in {ERROR_DIR.name} gefunden, übersprungen.")
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            source.replace(target)
+            if queue.requeue(row["id"]):
+                requeued += 1
+                print(f"{target.name}: zurück in die Queue ({row['state']}, {row['last_error'] or '-'})")
+    finally:
+        queue.close()
+    print(f"{requeued} Einträge erneut eingeplant.")
+    return requeued
+
+
+# ---------------------------------------------------------------------------
+# Parallelbetrieb (AIMD)
+# ---------------------------------------------------------------------------
+
+# Status, bei denen die Datei im INPUT bleibt und im selben Lauf erneut eingeplant wird
+REQUEUE_ERROR_CODES = {"RATE_LIMIT", "HTTP_503"}
+
+
+class AimdController:
+    """
+    Additive Increase / Multiplicative Decrease für die Anzahl paralleler Requests.
+
+    - Erfolg: limit += 1/limit (≈ +1 pro vollem Fenster erfolgreicher Requests),
+      solange das Durchsatzziel noch nicht erreicht ist
+    - 429/5xx/Latenzspitze: limit halbieren (höchstens einmal pro Fenster, damit
+      gleichzeitig laufende Requests nicht mehrfach halbieren)
+    """
+
+    def __init__(self, max_limit: int, target_per_minute: float = 0.0) -> None:
+        self.max_limit = max(1, max_limit)
+        self.limit = 1.0
+        self.target_per_minute = target_per_minute
+        self.latency_ewma: Optional[float] = None
+        self.completed = 0
+        self.decreases = 0
+        self.started_at = time.monotonic()
+        self._last_decrease = 0.0
+        self._last_start = 0.0
+        self._paused_until = 0.0
+
+    @property
+    def window(self) -> int:
+        return max(1, int(self.limit))
+
+    def throughput_per_minute(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return self.completed * 60.0 / elapsed if elapsed > 0 else 0.0
+
+    def may_start(self, inflight: int) -> bool:
+        """Neuer Request erlaubt? (Pause, Fenster + Abstand gemäß Durchsatzziel)"""
+        if time.monotonic() < self._paused_until:
+            return False
+        if inflight >= self.window:
+            return False
+        if self.target_per_minute > 0:
+            if time.monotonic() - self._last_start < 60.0 / self.target_per_minute:
+                return False
+        return True
+
+    def on_start(self) -> None:
+        self._last_start = time.monotonic()
+
+    def on_success(self, latency: float) -> None:
+        self.completed += 1
+        spike = (
+            self.latency_ewma is not None
+            and self.completed > self.window
+            and latency > LATENCY_SPIKE_FACTOR * self.latency_ewma
+        )
+        self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+        if spike:
+            self.on_overload()
+            return
+        if self.target_per_minute > 0 and self.throughput_per_minute() >= self.target_per_minute:
+            return
+        self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+    def pause_remaining(self) -> float:
+        return max(self._paused_until - time.monotonic(), 0.0)
+
+    def pause(self, seconds: float) -> None:
+        """Keine neuen Requests für `seconds` Sekunden (Retry-After des Backends)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def on_overload(self) -> None:
+        now = time.monotonic()
+        # Höchstens eine Halbierung pro Latenz-Fenster
+        if now - self._last_decrease < (self.latency_ewma or 1.0):
+            return
+        self._last_decrease = now
+        self.decreases += 1
+        self.limit = max(1.0, self.limit / 2.0)
+
+
+def _timed_classify(item: QueueItem) -> Tuple[Tuple[str, Optional[dict], Optional[str], Optional[str]], float]:
+    started = time.monotonic()
+    result = classify_file(item.file_path, idempotency_key=item.content_hash)
+    return result, time.monotonic() - started
+
+
+def run_concurrent(
+    queue_db: BulkQueue,
+    owner: str,
+    budget: TokenBudget,
+    items: List[QueueItem],
+    max_concurrency: int,
+    target_per_minute: float,
+) -> None:
+    """
+    Verarbeitet die geleasten `items` mit einem Worker-Pool; Parallelität per AIMD.
+
+    Ergebnisse werden in einem Reorder-Puffer gesammelt und strikt in
+    Eingabereihenfolge geloggt (fsync), in der Queue abgeschlossen und
+    anschließend verschoben. Queue und Token-Ledger werden nur aus dem
+    Hauptthread benutzt; ist das Token-Budget erschöpft, pausieren neue Starts.
+    """
+    controller = AimdController(max_concurrency, target_per_minute)
+    writer = open_log_writer()
+    total_tokens_used = 0
+    done_count = 0
+
+    queue: Deque[Tuple[int, QueueItem]] = deque(enumerate(items))
+    attempts: Dict[int, int] = {}
+    inflight: Dict[Future, Tuple[int, QueueItem]] = {}
+    # Reorder-Puffer: Sequenznummer -> (Eintrag, Ergebnis) bzw. None (zurück in die Queue)
+    finished: Dict[int, Optional[Tuple[QueueItem, Tuple[str, Optional[dict], Optional[str], Optional[str]]]]] = {}
+    next_seq = 0
+    stop_submitting = False
+    budget_reason: Optional[str] = None
+
+    def _drain_in_order() -> None:
+        nonlocal next_seq, total_tokens_used, done_count, stop_submitting
+        while next_seq in finished:
+            entry = finished.pop(next_seq)
+            next_seq += 1
+            if entry is None:
+                continue
+            item, (status, data, err_code, err_msg) = entry
+            total_tokens_used += log_result(
+                writer, item.file_path.name, status, data, err_code, err_msg, sync=True
+            )
+            if err_code in REQUEUE_ERROR_CODES:
+                # bleibt im INPUT, Eintrag wieder pending (frühestens nach Retry-After),
+                # zählt nicht als Versuch – Überlast/Ausfall ist kein Fehler des Bildes
+                queue_db.release(item.id, owner, err_code, delay_s=retry_after_of(data) or 0.0)
+            else:
+                outcome = finish_item(queue_db, owner, item, status, data, err_code, err_msg)
+                done_count += outcome == "done"
+                if outcome != "done":
+                    print(f"  {item.file_path.name}: {describe_outcome(outcome, item)}", flush=True)
+            queue_db.renew(owner)
+            if MAX_TOTAL_TOKENS_PER_RUN > 0 and total_tokens_used > MAX_TOTAL_TOKENS_PER_RUN:
+                if not stop_submitting:
+                    print(
+                        f"Token-Softlimit erreicht ({total_tokens_used} > "
+                        f"{MAX_TOTAL_TOKENS_PER_RUN}). Keine neuen Requests mehr."
+                    )
+                stop_submitting = True
+
+    try:
+        with ThreadPoolExecutor(max_workers=controller.max_limit, thread_name_prefix="bulk") as pool:
+            while inflight or (queue and not stop_submitting):
+                while queue and not stop_submitting and controller.may_start(len(inflight)):
+                    budget_wait, reason = budget.wait_time(in_flight=len(inflight))
+                    if budget_wait > 0:
+                        controller.pause(min(budget_wait, 60.0))
+                        queue_db.renew(owner, lease_s=min(budget_wait, 60.0) + LEASE_SECONDS)
+                        if reason != budget_reason:
+                            print(f"Token-Budget: {reason}, Pause ca. {format_wait(budget_wait)} ...", flush=True)
+                        budget_reason = reason
+                        break
+                    if budget_reason is not None:
+                        print("Token-Budget wieder verfügbar.", flush=True)
+                        budget_reason = None
+                    seq, item = queue.popleft()
+                    controller.on_start()
+                    inflight[pool.submit(_timed_classify, item)] = (seq, item)
+
+                if not inflight:
+                    # Nur durch Durchsatzziel, Retry-After oder Token-Budget gebremst
+                    time.sleep(min(max(controller.pause_remaining(), 0.05), 1.0))
+                    continue
+
+                done, _ = wait(list(inflight), timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    seq, item = inflight.pop(future)
+                    path = item.file_path
+                    (status, data, err_code, err_msg), latency = future.result()
+                    budget.record((data or {}).get("usage"), ref=item.content_hash)
+
+                    if status == "done":
+                        controller.on_success(latency)
+                        print(
+                            f"[{seq + 1}/{len(items)}] {path.name} -> OK "
+                            f"({latency:.1f}s, Parallelität {controller.window})",
+                            flush=True,
+                        )
+                    elif err_code == "RATE_LIMIT" or (err_code or "").startswith("HTTP_5"):
+                        controller.on_overload()
+                        retry_after = retry_after_of(data)
+                        note = ""
+                        if retry_after is not None and retry_after > MAX_RETRY_AFTER_WAIT_S:
+                            # Zu lange für diesen Lauf: keine neuen Requests mehr
+                            stop_submitting = True
+                            note = f", Retry-After {retry_after:.0f}s – Lauf wird beendet"
+                        elif retry_after is not None:
+                            controller.pause(retry_after)
+                            note = f", Pause {retry_after:.0f}s (Retry-After)"
+                        print(
+                            f"[{seq + 1}/{len(items)}] {path.name} -> {err_code}, "
+                            f"Parallelität {controller.window}{note}",
+                            flush=True,
+                        )
+                    else:
+                        print(f"[{seq + 1}/{len(items)}] {path.name} -> Fehler ({err_code})", flush=True)
+
+                    if (
+                        err_code in REQUEUE_ERROR_CODES
+                        and attempts.get(seq, 0) < REQUEUE_LIMIT
+                        and not stop_submitting
+                    ):
+                        # Gleiche Sequenznummer -> Reihenfolge im Log bleibt erhalten
+                        attempts[seq] = attempts.get(seq, 0) + 1
+                        queue.appendleft((seq, item))
+                        continue
+                    if err_code in REQUEUE_ERROR_CODES and not stop_submitting:
+                        # Wiederholungen ausgeschöpft: Backend bleibt überlastet -> Lauf beenden
+                        print(f"  {err_code} hält an, keine neuen Requests mehr.", flush=True)
+                        stop_submitting = True
+
+                    finished[seq] = (item, (status, data, err_code, err_msg))
+
+                if stop_submitting:
+                    # Nicht mehr gestartete Einträge gehen am Ende zurück in die Queue
+                    for seq, _path in queue:
+                        finished[seq] = None
+                    queue.clear()
+                _drain_in_order()
+    finally:
+        writer.close()
+        queue_db.release_owner(owner)
+        print(
+            f"Fertig. {done_count}/{len(items)} erfolgreich, "
+            f"{controller.throughput_per_minute():.1f} Bilder/min, "
+            f"{controller.decreases} Drosselungen, Tokens: {total_tokens_used}"
+        )
+        print(format_stats(get_transport().stats()))
+
+    if WARM_CACHE_AFTER_RUN and done_count:
+        trigger_cache_warmer()
+
+
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
 
 
-def main() -> None:
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="TARIC Bulk-Evaluation")
+    parser.add_argument(
+        "--concurrent", action="store_true", default=CONCURRENT_MODE,
+        help="Parallelbetrieb mit adaptiver (AIMD) Parallelität statt fester Pause",
+    )
+    parser.add_argument("--max-per-run", type=int, default=MAX_PER_RUN)
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument(
+        "--target-per-min", type=float, default=TARGET_PER_MINUTE,
+        help="Durchsatzziel in Bildern/Minute (0 = unbegrenzt)",
+    )
+
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("run", help="Bulk-Lauf (Standard)")
+    retry = commands.add_parser(
+        "retry-errors", help="Dead Letters aus data/taric_bulk_error erneut einplanen"
+    )
+    retry.add_argument(
+        "--include-permanent", action="store_true",
+        help="auch dauerhafte Fehler (z.B. 4xx) erneut einplanen",
+    )
+    retry.add_argument("--limit", type=int, default=-1, help="höchstens so viele Einträge (-1 = alle)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None, ready_paths: Optional[List[Path]] = None) -> None:
+    """
+    Einstieg für CLI und Watcher. `ready_paths`: nur diese Dateien neu in die Queue
+    aufnehmen (siehe lease_input_files); None = ganzes INPUT-Verzeichnis scannen.
+    """
+    args = parse_args(argv)
     ensure_dirs()
 
-    files = iter_input_files(MAX_PER_RUN)
-    if not files:
-        print("Keine passenden Dateien in data/taric_bulk_input gefunden.")
+    if args.command == "retry-errors":
+        retry_errors(include_permanent=args.include_permanent, limit=args.limit)
         return
 
-    print(f"Starte Bulk-Evaluation mit {len(files)} Datei(en).")
-    print(f"Backend: {BACKEND_URL}")
+    queue = BulkQueue()
+    budget = TokenBudget()
+    owner = default_owner()
+    try:
+        items = lease_input_files(queue, owner, args.max_per_run, ready_paths)
+        if not items:
+            print("Keine offenen Dateien in data/taric_bulk_input bzw. der Queue gefunden.")
+            return
+
+        print(f"Starte Bulk-Evaluation mit {len(items)} Datei(en).")
+        print(f"Backend: {BACKEND_URL}")
+        if budget.enabled:
+            status = budget.status()
+            print(
+                f"Token-Budget: heute {status['used_today']}/{budget.per_day or '∞'}, "
+                f"Minute {status['used_last_minute']}/{budget.per_minute or '∞'}, "
+                f"Reserve interaktiv {budget.reserve:.0%}"
+            )
+
+        if args.concurrent:
+            print(
+                f"Parallelbetrieb: max. {args.max_concurrency} gleichzeitig, "
+                f"Ziel {args.target_per_min or 'unbegrenzt'} Bilder/min"
+            )
+            run_concurrent(queue, owner, budget, items, args.max_concurrency, args.target_per_min)
+            return
+
+        run_sequential(queue, owner, budget, items)
+    finally:
+        # Nicht verarbeitete Leases sofort freigeben statt auf den Ablauf zu warten
+        queue.release_owner(owner)
+        queue.close()
+        budget.close()
+
+
+def run_sequential(
+    queue: BulkQueue, owner: str, budget: TokenBudget, items: List[QueueItem]
+) -> None:
+    """Verarbeitet die geleasten `items` nacheinander mit fester Pause."""
     print(f"Pause zwischen Bildern: {SLEEP_SECONDS} Sekunden")
 
     writer = open_log_writer()
     total_tokens_used = 0
+    done_count = 0
 
     try:
-        for idx, path in enumerate(files, start=1):
-            print(f"[{idx}/{len(files)}] Sende {path.name} ...", flush=True)
-
-            status, data, err_code, err_msg = classify_file(path)
-
-            # Logging
-            tokens = log_result(writer, path.name, status, data, err_code, err_msg)
+        for idx, item in enumerate(items, start=1):
+            path = item.file_path
+            wait_for_budget(budget, queue, owner)
+            print(f"[{idx}/{len(items)}] Sende {path.name} ...", flush=True)
+
+            waits = 0
+            while True:
+                status, data, err_code, err_msg = classify_file(path, idempotency_key=item.content_hash)
+                retry_after = retry_after_of(data)
+                if (
+                    err_code not in REQUEUE_ERROR_CODES
+                    or retry_after is None
+                    or retry_after > MAX_RETRY_AFTER_WAIT_S
+                    or waits >= REQUEUE_LIMIT
+                ):
+                    break
+                # Backend nennt die Wartezeit -> genau so lange pausieren, dann erneut senden
+                print(f"  -> {err_code}, warte {retry_after:.0f}s (Retry-After) ...", flush=True)
+                queue.renew(owner, lease_s=retry_after + LEASE_SECONDS)
+                time.sleep(retry_after)
+                waits += 1
+
+            # Logging (fsync, bevor Queue und Verzeichnisse geändert werden)
+            tokens = log_result(writer, path.name, status, data, err_code, err_msg, sync=True)
             total_tokens_used += tokens
+            budget.record((data or {}).get("usage"), ref=item.content_hash)
+
+            # Reaktion auf Status: 429/503, die nicht abgewartet werden konnten
+            # (kein/zu langes Retry-After oder REQUEUE_LIMIT erreicht) beenden den Lauf
+            if err_code in REQUEUE_ERROR_CODES:
+                print(f"  -> {err_code} (Rate-Limit/Überlastung), breche Bulk-Run ab.")
+                # Datei im INPUT lassen, Eintrag ohne gezählten Versuch wieder pending
+                queue.release(item.id, owner, err_code, delay_s=retry_after or 0.0)
+                break
+
+            outcome = finish_item(queue, owner, item, status, data, err_code, err_msg)
+            if outcome == "done":
+                done_count += 1
+                suffix = " (bereits klassifiziert)" if (data or {}).get("duplicate") else ""
+                print(f"  -> OK{suffix}, verschoben nach {DONE_DIR.name}")
+            else:
+                print(f"  -> Fehler ({err_code}), {describe_outcome(outcome, item)}")
 
             # Token-Softlimit prüfen
             if MAX_TOTAL_TOKENS_PER_RUN > 0 and total_tokens_used > MAX_TOTAL_TOKENS_PER_RUN:
@@ -281,32 +866,22 @@ def main() -> None:
                     f"Token-Softlimit erreicht ({total_tokens_used} > "
                     f"{MAX_TOTAL_TOKENS_PER_RUN}). Breche ab."
                 )
-                # Datei noch nicht verschieben, damit sie beim nächsten Lauf erneut drankommt
+                # Restliche Leases gehen zurück in die Queue
                 break
 
-            # Reaktion auf Status
-            if status == "done":
-                move_file(path, DONE_DIR)
-                print(f"  -> OK, verschoben nach {DONE_DIR.name}")
-            elif status == "rate_limited":
-                print("  -> Rate-Limit erkannt, breche Bulk-Run ab.")
-                # Datei im INPUT lassen, damit sie beim nächsten Run dran kommt
-                break
-            elif status in ("http_error", "backend_error"):
-                move_file(path, ERROR_DIR)
-                print(f"  -> Fehler ({err_code}), verschoben nach {ERROR_DIR.name}")
-            else:
-                # Unbekannter Status – sicherheitshalber in ERROR
-                move_file(path, ERROR_DIR)
-                print(f"  -> Unbekannter Status '{status}', verschoben nach {ERROR_DIR.name}")
+            queue.renew(owner)
 
             # Pause zwischen den Bildern
-            if idx < len(files):
+            if idx < len(items):
                 time.sleep(SLEEP_SECONDS)
 
     finally:
         writer.close()
         print(f"Fertig. Insgesamt geschätzte Tokens in diesem Lauf: {total_tokens_used}")
+        print(format_stats(get_transport().stats()))
+
+    if WARM_CACHE_AFTER_RUN and done_count:
+        trigger_cache_warmer()
 
 
 if __name__ == "__main__":
@@ -4,12 +4,30 @@ Automatischer Watcher für TARIC Bulk-Evaluation.
 
 Funktion:
 - Beobachtet den Ordner data/taric_bulk_input
-- Wenn neue Bilddateien auftauchen, wird automatisch bulk-evaluation.py gestartet
+- Wenn neue Bilddateien auftauchen, wird automatisch ein Bulk-Run gestartet
 - Achtet darauf, dass nicht mehrere Bulk-Runs parallel laufen
 - Prüft vor jedem Run den Health-Status des FastAPI-Backends (/health)
 
+Ablauf:
+- Der Event-Handler blockiert nie: er merkt sich nur den Pfad
+- Dateien gehen erst weiter, wenn sie fertig geschrieben sind (taric_file_readiness:
+  Close-/Umbenennungs-Ereignisse, sonst stabile Größe/mtime; .part/.tmp/Punkt-Dateien
+  werden ignoriert), und zwar gebündelt (TARIC_READY_BATCH_S Ruhe, höchstens
+  TARIC_READY_MAX_BATCH_WAIT_S nach der ersten Datei) – ein Kopiervorgang mit
+  1.000 Dateien löst einen Run aus, nicht 1.000
+- Ein langlebiger Runner-Thread führt bulk-evaluation.py im selben Prozess aus
+  (einmal per importlib geladen, kein Interpreterstart pro Run); Batches laufen über
+  eine begrenzte Queue, überzählige Trigger werden zusammengefasst
+- Ein Run nimmt nur die gemeldeten fertigen Dateien neu in die Arbeits-Queue auf
+  (kein Scan des ganzen Ordners) – eine hängende Übertragung unter finalem Namen
+  wird so nicht halb geschrieben mitgenommen; beim Start vorhandene Dateien gehen
+  ebenfalls durch die Bereitschaftsprüfung
+- Zusätzlich alle TARIC_WATCHER_RESUME_INTERVAL_S ein Run, damit zurückgestellte
+  Einträge (Backoff, Retry-After, Token-Budget) ohne neue Dateien weiterlaufen
+
 Voraussetzungen:
     pip install watchdog requests
+    (optional HTTP/2 über httpx: pip install "httpx[http2]", TARIC_BULK_HTTP_TRANSPORT=httpx)
 
 Start:
     cd ~/projects/taric-gemini
@@ -17,18 +35,20 @@ Start:
     ./bulk_evaluation_watcher.py      # oder: python3 bulk_evaluation_watcher.py
 """
 
+import importlib.util
 import logging
 import os
-import subprocess
+import queue
 import sys
+import threading
 import time
-from dataclasses import dataclass
 from pathlib import Path
-from typing import Set
+from types import ModuleType
+from typing import List, Optional, Set
 from urllib.parse import urlparse, urlunparse
 
-import requests
-from watchdog.events import FileSystemEventHandler, FileCreatedEvent, FileMovedEvent
+from taric_bulk_http import format_stats, get_transport
+from taric_file_readiness import ReadinessWatcher, observer_emits_close_events
 from watchdog.observers import Observer
 
 
@@ -52,6 +72,11 @@ BACKEND_CLASSIFY_URL = os.getenv("TARIC_BACKEND_URL", "http://127.0.0.1:8000/cla
 # Erlaubte Dateiendungen – identisch zu bulk-evaluation.py
 ALLOWED_EXTENSIONS: Set[str] = {".jpg", ".jpeg", ".png", ".webp"}
 
+# Kapazität der Runner-Queue (Batches); weitere Trigger werden zusammengefasst
+RUNNER_QUEUE_SIZE = int(os.getenv("TARIC_WATCHER_QUEUE_SIZE", "4"))
+# Periodischer Run für zurückgestellte Queue-Einträge (0 = aus)
+RESUME_INTERVAL_SECONDS = float(os.getenv("TARIC_WATCHER_RESUME_INTERVAL_S", "300"))
+
 
 # ---------------------------------------------------------------------------
 # LOGGING
@@ -93,8 +118,8 @@ def check_backend_health(timeout: float = 3.0) -> bool:
     """Prüft, ob das FastAPI-Backend über /health erreichbar ist."""
     url = build_health_url()
     try:
-        resp = requests.get(url, timeout=timeout)
-        if resp.ok:
+        resp = get_transport().get(url, timeout=timeout)
+        if resp.status_code < 400:
             data = resp.json()
             status = str(data.get("status", "")).lower()
             if status == "ok":
@@ -109,85 +134,116 @@ def check_backend_health(timeout: float = 3.0) -> bool:
         return False
 
 
-@dataclass
-class BulkRunnerState:
-    """Einfache Statusverwaltung, um parallele Runs zu verhindern."""
-    is_running: bool = False
-    pending: bool = False
-
-
-state = BulkRunnerState()
-
-
-def trigger_bulk_run(reason: str) -> None:
-    """
-    Löst einen Bulk-Run aus, sofern nicht bereits einer läuft.
-    Wenn aktuell ein Run läuft, wird lediglich ein 'pending'-Flag gesetzt.
-    """
-    global state
-    logger.info("Trigger Bulk-Evaluation (%s)", reason)
-
-    if state.is_running:
-        logger.info("Bulk-Evaluation läuft bereits – merke pending Run.")
-        state.pending = True
-        return
-
-    state.is_running = True
-    state.pending = False
-
-    # Backend-Health prüfen
-    if not check_backend_health():
-        logger.warning("Backend nicht gesund/erreichbar – überspringe diesen Run.")
-        state.is_running = False
-        return
+def load_bulk_module() -> ModuleType:
+    """Lädt bulk-evaluation.py einmalig als Modul (Dateiname mit Bindestrich)."""
+    spec = importlib.util.spec_from_file_location("bulk_evaluation", BULK_SCRIPT)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"bulk-evaluation.py kann nicht geladen werden: {BULK_SCRIPT}")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
 
-    # Subprozess für bulk-evaluation.py starten
-    cmd = [sys.executable, str(BULK_SCRIPT)]
-    logger.info("Starte bulk-evaluation: %s", " ".join(cmd))
 
-    try:
-        proc = subprocess.run(cmd, cwd=str(BASE_DIR))
-        if proc.returncode == 0:
-            logger.info("bulk-evaluation erfolgreich beendet (Exit-Code 0).")
-        else:
-            logger.warning("bulk-evaluation beendet mit Exit-Code %s.", proc.returncode)
-    except FileNotFoundError:
-        logger.error("bulk-evaluation.py nicht gefunden unter: %s", BULK_SCRIPT)
-    except Exception as e:
-        logger.error("Fehler beim Start von bulk-evaluation.py: %s", e)
-
-    # Run ist beendet
-    state.is_running = False
-
-    # Falls in der Zwischenzeit neue Dateien eingetroffen sind, direkt neuen Run starten
-    if state.pending:
-        logger.info("Pending Run erkannt – starte weiteren Bulk-Evaluation-Run.")
-        trigger_bulk_run("pending")
-
-
-class NewInputHandler(FileSystemEventHandler):
+class BulkRunner:
     """
-    Handler für neue oder verschobene Dateien in INPUT_DIR.
-    Reagiert nur auf Dateien mit erlaubter Endung.
+    Langlebiger Runner-Thread: nimmt Batches aus einer begrenzten Queue und führt
+    jeweils einen Bulk-Run im selben Prozess aus. Wartende Batches werden zu einem
+    Run zusammengefasst; ein leerer Batch verarbeitet nur bereits eingereihte Einträge.
     """
 
-    def _handle_path(self, path: Path) -> None:
-        if not path.is_file():
-            return
-        if path.suffix.lower() not in ALLOWED_EXTENSIONS:
-            logger.debug("Ignoriere %s (nicht unterstützte Endung)", path.name)
+    def __init__(self, bulk_module: ModuleType) -> None:
+        self.bulk = bulk_module
+        self.batches: "queue.Queue[Optional[List[Path]]]" = queue.Queue(maxsize=RUNNER_QUEUE_SIZE)
+        # Pfade aus zusammengefassten Triggern bzw. übersprungenen Runs (gehen in den nächsten Run)
+        self._carry: Set[Path] = set()
+        self._carry_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="bulk-runner", daemon=True)
+        self.runs = 0
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def submit(self, paths: List[Path], reason: str) -> None:
+        """Nicht blockierend; bei voller Queue übernimmt der bereits wartende Trigger die Pfade."""
+        try:
+            self.batches.put_nowait(paths)
+            logger.info("Trigger Bulk-Evaluation (%s)", reason)
+        except queue.Full:
+            self._keep(paths)
+            logger.debug("Runner-Queue voll – Trigger (%s) wird mit wartendem Run zusammengefasst", reason)
+
+    def _keep(self, paths: List[Path]) -> None:
+        with self._carry_lock:
+            self._carry.update(paths)
+
+    def _take_carry(self) -> List[Path]:
+        with self._carry_lock:
+            carry, self._carry = list(self._carry), set()
+        return carry
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        try:
+            self.batches.put_nowait(None)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(
+                "Bulk-Run läuft noch – Watcher beendet sich trotzdem; "
+                "offene Leases laufen in der Queue ab und werden beim nächsten Start fortgesetzt."
+            )
+
+    def _next_batch(self) -> Optional[List[Path]]:
+        timeout = RESUME_INTERVAL_SECONDS if RESUME_INTERVAL_SECONDS > 0 else None
+        try:
+            batch = self.batches.get(timeout=timeout)
+        except queue.Empty:
+            return self._take_carry()  # periodischer Run
+        if batch is None:
+            return None
+        batch = batch + self._take_carry()
+        # Weitere wartende Batches in denselben Run übernehmen
+        while True:
+            try:
+                more = self.batches.get_nowait()
+            except queue.Empty:
+                return batch
+            if more is None:
+                self._stop.set()
+                return batch
+            batch.extend(more)
+            batch.extend(self._take_carry())
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if batch is None or self._stop.is_set():
+                break
+            self._run(batch)
+
+    def _run(self, batch: List[Path]) -> None:
+        # Backend-Health prüfen
+        if not check_backend_health():
+            logger.warning("Backend nicht gesund/erreichbar – überspringe diesen Run.")
+            self._keep(batch)  # gemeldete Dateien beim nächsten Run aufnehmen
             return
 
-        logger.info("Neue Input-Datei erkannt: %s", path.name)
-        # Kleines Delay, damit Datei-Write sicher abgeschlossen ist
-        time.sleep(0.2)
-        trigger_bulk_run(f"neue Datei: {path.name}")
-
-    def on_created(self, event: FileCreatedEvent) -> None:
-        self._handle_path(Path(event.src_path))
-
-    def on_moved(self, event: FileMovedEvent) -> None:
-        self._handle_path(Path(event.dest_path))
+        self.runs += 1
+        logger.info(
+            "Starte Bulk-Run #%d (%s)",
+            self.runs,
+            f"{len(batch)} neue Datei(en)" if batch else "ohne neue Ereignisse",
+        )
+        started = time.monotonic()
+        try:
+            self.bulk.main([], ready_paths=sorted(set(batch)))
+            logger.info("Bulk-Run #%d beendet (%.1fs).", self.runs, time.monotonic() - started)
+        except SystemExit as e:
+            logger.warning("Bulk-Run #%d beendet mit Exit-Code %s.", self.runs, e.code)
+        except Exception:
+            logger.exception("Bulk-Run #%d fehlgeschlagen.", self.runs)
 
 
 def main() -> None:
@@ -201,14 +257,26 @@ def main() -> None:
     logger.info("Health-Check URL     : %s", build_health_url())
     logger.info("Starte Bulk-Evaluation-Watcher auf Ordner: %s", INPUT_DIR)
 
-    event_handler = NewInputHandler()
+    runner = BulkRunner(load_bulk_module())
+    runner.start()
+
     observer = Observer()
+    event_handler = ReadinessWatcher(
+        on_batch=lambda batch: runner.submit(
+            batch, f"{len(batch)} neue Datei(en), z.B. {batch[0].name}"
+        ),
+        accept=lambda path: path.suffix.lower() in ALLOWED_EXTENSIONS,
+        close_events=observer_emits_close_events(observer),
+    )
+    event_handler.start()
     observer.schedule(event_handler, str(INPUT_DIR), recursive=False)
     observer.start()
 
     try:
-        # Initialer Run: falls schon Dateien im Ordner liegen
-        trigger_bulk_run("Initialstart")
+        # Initialer Run für offene Queue-Einträge; bereits vorhandene Dateien
+        # durchlaufen die Stabilitätsprüfung und kommen als eigener Batch
+        runner.submit([], "Initialstart")
+        event_handler.add_existing(sorted(p for p in INPUT_DIR.iterdir() if p.is_file()))
 
         while True:
             time.sleep(1.0)
@@ -217,6 +285,9 @@ def main() -> None:
         observer.stop()
 
     observer.join()
+    event_handler.stop()
+    runner.stop()
+    logger.info("Health-Checks: %s", format_stats(get_transport().stats()))
     logger.info("Watcher sauber beendet.")
 
 
@@ -27,7 +27,25 @@ def create_taric_reference_table():
                 hs_chapter     TEXT,
                 description_de TEXT,
                 description_en TEXT,
-                legal_base     TEXT
+                legal_base     TEXT,
+                product_line_suffix TEXT,
+                indent         INTEGER,
+                code_level     INTEGER,
+                parent_code    TEXT,
+                is_leaf        INTEGER,
+                valid_from     TEXT,
+                valid_to       TEXT
+            )
+            """
+        )
+        # Beschreibungen in allen Sprachen (description_de/_en bleiben für Altcode erhalten)
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS taric_reference_text (
+                taric_code  TEXT NOT NULL,
+                lang        TEXT NOT NULL,
+                description TEXT,
+                PRIMARY KEY (taric_code, lang)
             )
             """
         )
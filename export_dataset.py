@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Exportiert die TARIC-Live-Datenbank + zugehörige Bilder in ein ZIP-Archiv.
+
+Ersetzt die Logik aus export_dataset.sh:
+- Konsistenter DB-Snapshot über die sqlite3-Backup-API in kleinen Seiten-Schritten
+  (kein `cp` während das Backend schreibt, Schreiber werden nicht blockiert); bei
+  ständigem Schreiben größere Schritte, zuletzt ein einziger Schritt (siehe backup_database)
+- Bilder werden direkt ins ZIP gestreamt; bereits komprimierte Formate
+  (WEBP/JPG/PNG/AVIF/GIF) mit ZIP_STORED statt erneutem Deflate
+- manifest.json mit SHA-256-Prüfsummen aller Dateien im Archiv
+- Inkrementeller Modus: nur neue/geänderte Bilder und neue/geänderte Zeilen
+  (als JSONL) seit dem letzten Export (Zustand in export/export_state.json);
+  geänderte taric_live-Zeilen über updated_at, Bewertungen über reviewed_at
+
+Verwendung:
+    python3 export_dataset.py                 # Vollexport
+    python3 export_dataset.py --incremental   # nur Änderungen seit letztem Export
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+from taric_blob_store import KIND_RAW_RESPONSE, get_blobs
+
+BASE_DIR = Path(__file__).resolve().parent
+DB_FILE = Path(os.getenv("TARIC_DB_PATH", str(BASE_DIR / "taric_live.db")))
+IMG_DIR = BASE_DIR / "bilder_uploads"
+EXPORT_BASE_DIR = Path(os.getenv("TARIC_EXPORT_DIR", str(BASE_DIR / "export")))
+STATE_FILE = EXPORT_BASE_DIR / "export_state.json"
+
+# Seiten pro Backup-Schritt und Pause dazwischen (Schreiber kommen dazwischen zum Zug)
+BACKUP_PAGES_PER_STEP = int(os.getenv("TARIC_EXPORT_BACKUP_PAGES", "256"))
+BACKUP_SLEEP_SECONDS = float(os.getenv("TARIC_EXPORT_BACKUP_SLEEP", "0.01"))
+# Neustarts (Quelle während des Backups geändert), danach ein einziger Schritt
+BACKUP_MAX_RESTARTS = int(os.getenv("TARIC_EXPORT_BACKUP_MAX_RESTARTS", "3"))
+
+# Formate, die bereits komprimiert sind -> ZIP_STORED
+STORED_EXTENSIONS = {".webp", ".jpg", ".jpeg", ".png", ".avif", ".gif", ".zip", ".gz"}
+
+CHUNK_SIZE = 1024 * 1024
+
+
+# ---------------------------------------------------------------------------
+# Hilfsfunktionen
+# ---------------------------------------------------------------------------
+
+
+def load_state() -> Dict[str, Any]:
+    if not STATE_FILE.exists():
+        return {}
+    try:
+        return json.loads(STATE_FILE.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def save_state(state: Dict[str, Any]) -> None:
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = STATE_FILE.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    tmp.replace(STATE_FILE)
+
+
+class _BackupRestarted(Exception):
+    """Die Quelle wurde während des schrittweisen Backups geändert."""
+
+
+def _backup_once(src_path: Path, dst_path: Path, pages: int, abort_on_restart: bool) -> None:
+    src = sqlite3.connect(str(src_path))
+    dst = sqlite3.connect(str(dst_path))
+    last_remaining = [None]
+    try:
+
+        def progress(status: int, remaining: int, total: int) -> None:
+            # SQLite beginnt von vorn, wenn eine andere Verbindung geschrieben hat
+            if abort_on_restart and last_remaining[0] is not None and remaining > last_remaining[0]:
+                raise _BackupRestarted()
+            last_remaining[0] = remaining
+            print(f"\r  DB-Backup: {total - remaining}/{total} Seiten", end="", flush=True)
+
+        src.backup(dst, pages=pages, progress=progress, sleep=BACKUP_SLEEP_SECONDS)
+        print()
+    finally:
+        dst.close()
+        src.close()
+
+
+def backup_database(src_path: Path, dst_path: Path) -> None:
+    """
+    Konsistenter Snapshot über die sqlite3-Backup-API.
+
+    Kopiert BACKUP_PAGES_PER_STEP Seiten pro Schritt und gibt dazwischen die Sperre frei.
+    Schreibt eine andere Verbindung in die Quelle, startet SQLite das Backup neu – bei
+    stetigem Schreiben (Group-Commit-Writer) womöglich endlos. Daher wird bei einem
+    Neustart abgebrochen und mit vierfacher Schrittgröße neu begonnen; nach
+    BACKUP_MAX_RESTARTS Neustarts folgt ein einziger Schritt über die ganze DB. Dieser
+    hält die Lesesperre bis zum Ende: taric_live.db läuft im Rollback-Journal-Modus,
+    Schreiber warten so lange (bis zu ihrem Busy-Timeout).
+    """
+    pages = BACKUP_PAGES_PER_STEP
+    for attempt in range(BACKUP_MAX_RESTARTS + 1):
+        final = attempt == BACKUP_MAX_RESTARTS or pages <= 0
+        try:
+            _backup_once(src_path, dst_path, -1 if final else pages, abort_on_restart=not final)
+            return
+        except _BackupRestarted:
+            pages *= 4
+            if attempt + 1 < BACKUP_MAX_RESTARTS:
+                print(f"\n  DB-Backup: Quelle geändert, neuer Versuch mit {pages} Seiten pro Schritt")
+            else:
+                print("\n  DB-Backup: Quelle geändert, Backup in einem Schritt")
+
+
+def add_file_streamed(zf: zipfile.ZipFile, src: Path, arcname: str) -> Dict[str, Any]:
+    """
+    Streamt eine Datei ins Archiv und berechnet dabei die SHA-256-Prüfsumme
+    (die Datei wird nur einmal gelesen).
+    """
+    compress_type = (
+        zipfile.ZIP_STORED if src.suffix.lower() in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+    )
+    info = zipfile.ZipInfo.from_file(src, arcname)
+    info.compress_type = compress_type
+
+    h = hashlib.sha256()
+    size = 0
+    with src.open("rb") as fin, zf.open(info, "w") as fout:
+        for chunk in iter(lambda: fin.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+            fout.write(chunk)
+            size += len(chunk)
+
+    return {
+        "path": arcname,
+        "size": size,
+        "sha256": h.hexdigest(),
+        "stored": compress_type == zipfile.ZIP_STORED,
+    }
+
+
+def add_bytes(zf: zipfile.ZipFile, data: bytes, arcname: str) -> Dict[str, Any]:
+    zf.writestr(arcname, data, compress_type=zipfile.ZIP_DEFLATED)
+    return {
+        "path": arcname,
+        "size": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "stored": False,
+    }
+
+
+def scan_images(img_dir: Path) -> Dict[str, Tuple[int, int]]:
+    """{relativer Pfad: (Größe, mtime_ns)} aller Dateien in img_dir."""
+    result: Dict[str, Tuple[int, int]] = {}
+    if not img_dir.exists():
+        return result
+    for p in sorted(img_dir.rglob("*")):
+        if p.is_file():
+            st = p.stat()
+            result[p.relative_to(img_dir).as_posix()] = (st.st_size, st.st_mtime_ns)
+    return result
+
+
+def count_or_zero(conn: sqlite3.Connection, table: str) -> int:
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+
+
+def select_since(
+    snapshot: sqlite3.Connection,
+    table: str,
+    ts_column: str,
+    watermark: str,
+    seen_ids: List[int],
+) -> Tuple[List[sqlite3.Row], str, List[int]]:
+    """
+    Zeilen mit ts_column >= watermark. Die Zeitstempel haben nur Sekundenauflösung,
+    daher >= statt > und Deduplizierung über die IDs, die beim letzten Export mit
+    genau diesem Zeitstempel schon dabei waren.
+    Liefert (neue Zeilen, neues Wasserzeichen, IDs mit dem neuen Wasserzeichen).
+    """
+    try:
+        rows = snapshot.execute(
+            f"SELECT * FROM {table} WHERE {ts_column} >= ? ORDER BY {ts_column}, id",
+            (watermark,),
+        ).fetchall()
+    except sqlite3.OperationalError:  # Tabelle/Spalte fehlt (ältere DB)
+        return [], watermark, seen_ids
+    if not rows:
+        return [], watermark, seen_ids
+
+    seen = set(seen_ids)
+    fresh = [r for r in rows if r[ts_column] != watermark or r["id"] not in seen]
+    new_watermark = rows[-1][ts_column]
+    new_seen = [r["id"] for r in rows if r[ts_column] == new_watermark]
+    return fresh, new_watermark, new_seen
+
+
+def current_watermark(snapshot: sqlite3.Connection, table: str, ts_column: str) -> Tuple[str, List[int]]:
+    """Wasserzeichen nach einem Vollexport: größter Zeitstempel + IDs mit diesem Wert."""
+    try:
+        rows = snapshot.execute(
+            f"""
+            SELECT id, {ts_column} FROM {table}
+             WHERE {ts_column} = (SELECT MAX({ts_column}) FROM {table})
+            """
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return "", []
+    if not rows:
+        return "", []
+    return rows[0][1], [r[0] for r in rows]
+
+
+def export_changed_rows(snapshot: sqlite3.Connection, state: Dict[str, Any]) -> Tuple[bytes, bytes, Dict[str, Any]]:
+    """
+    Liefert als JSONL:
+    - neue taric_live-Zeilen (id > last_taric_live_id) und nachträglich geänderte
+      (updated_at-Wasserzeichen), jeweils inkl. Rohantwort
+    - neue/geänderte Bewertungen (reviewed_at-Wasserzeichen)
+    sowie die fortgeschriebenen Wasserzeichen für export_state.json.
+    Konsumenten übernehmen Zeilen per id (spätere Exporte überschreiben frühere).
+    """
+    snapshot.row_factory = sqlite3.Row
+    last_live_id = int(state.get("last_taric_live_id", 0))
+
+    live_by_id: Dict[int, sqlite3.Row] = {
+        r["id"]: r
+        for r in snapshot.execute(
+            "SELECT * FROM taric_live WHERE id > ? ORDER BY id", (last_live_id,)
+        ).fetchall()
+    }
+    updated_rows, updated_at, updated_ids = select_since(
+        snapshot,
+        "taric_live",
+        "updated_at",
+        state.get("last_taric_live_updated_at", ""),
+        state.get("last_taric_live_updated_ids", []),
+    )
+    for r in updated_rows:
+        live_by_id[r["id"]] = r
+    live_rows = [live_by_id[i] for i in sorted(live_by_id)]
+
+    try:
+        raw_blobs = get_blobs(snapshot, "taric_live", [r["id"] for r in live_rows], KIND_RAW_RESPONSE)
+    except sqlite3.OperationalError:
+        raw_blobs = {}
+
+    live_lines: List[str] = []
+    max_live_id = last_live_id
+    for r in live_rows:
+        row = dict(r)
+        raw = raw_blobs.get(row["id"])
+        if raw is not None:
+            row["raw_response_json"] = raw
+        live_lines.append(json.dumps(row, ensure_ascii=False))
+        max_live_id = max(max_live_id, row["id"])
+
+    eval_rows, reviewed_at, reviewed_ids = select_since(
+        snapshot,
+        "taric_evaluation",
+        "reviewed_at",
+        state.get("last_reviewed_at", ""),
+        state.get("last_reviewed_ids", []),
+    )
+    eval_lines = [json.dumps(dict(r), ensure_ascii=False) for r in eval_rows]
+
+    def to_bytes(lines: List[str]) -> bytes:
+        return ("\n".join(lines) + ("\n" if lines else "")).encode("utf-8")
+
+    watermarks = {
+        "last_taric_live_id": max_live_id,
+        "last_taric_live_updated_at": updated_at,
+        "last_taric_live_updated_ids": updated_ids,
+        "last_reviewed_at": reviewed_at,
+        "last_reviewed_ids": reviewed_ids,
+    }
+    return to_bytes(live_lines), to_bytes(eval_lines), watermarks
+
+
+def build_readme(ts_human: str, mode: str, live_count: int, eval_count: int, img_count: int) -> str:
+    return f"""TARIC-Live Export
+=================
+
+Zeitpunkt des Exports: {ts_human}
+Projektverzeichnis    : {BASE_DIR}
+Modus                 : {mode}
+
+Inhalte
+-------
+
+1) Datenbank:
+   - Vollexport  : taric_live.db (konsistenter Snapshot über die SQLite-Backup-API)
+   - Inkrementell: taric_live.jsonl / taric_evaluation.jsonl (nur neue/geänderte Zeilen)
+   - Tabelle taric_live        : {live_count} Datensätze
+   - Tabelle taric_evaluation  : {eval_count} Datensätze
+
+2) Bilder:
+   - Verzeichnis: bilder_uploads/
+   - Anzahl Dateien in diesem Export: {img_count}
+
+3) manifest.json:
+   - Größe und SHA-256-Prüfsumme jeder Datei im Archiv
+
+Hinweise
+--------
+
+- Die Spalte 'filename' in der Tabelle 'taric_live' verweist direkt
+  auf Dateien im Verzeichnis 'bilder_uploads/'.
+- Evaluationsdaten sind über 'taric_evaluation.taric_live_id'
+  mit 'taric_live.id' verknüpft.
+- Modell-Rohantworten liegen komprimiert in 'taric_blob' (siehe taric_blob_store.py).
+"""
+
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+
+
+def run_export(incremental: bool) -> Path:
+    if not DB_FILE.exists():
+        raise SystemExit(f"FEHLER: Datenbank '{DB_FILE}' wurde nicht gefunden.")
+
+    state = load_state() if incremental else {}
+    if incremental and not state:
+        print("Kein vorheriger Export gefunden – führe Vollexport durch.")
+        incremental = False
+    mode = "incremental" if incremental else "full"
+
+    ts = time.strftime("%Y%m%d_%H%M%S")
+    ts_human = time.strftime("%Y-%m-%d %H:%M:%S")
+    root = f"taric_export_{ts}"
+    EXPORT_BASE_DIR.mkdir(parents=True, exist_ok=True)
+    archive_file = EXPORT_BASE_DIR / f"{root}{'_incr' if incremental else ''}.zip"
+    tmp_archive = archive_file.with_suffix(".zip.part")
+
+    files: List[Dict[str, Any]] = []
+
+    with tempfile.TemporaryDirectory(dir=str(EXPORT_BASE_DIR)) as tmpdir:
+        snapshot_path = Path(tmpdir) / "taric_live.db"
+        print("Erzeuge konsistenten DB-Snapshot ...")
+        backup_database(DB_FILE, snapshot_path)
+
+        snapshot = sqlite3.connect(str(snapshot_path))
+        live_count = count_or_zero(snapshot, "taric_live")
+        eval_count = count_or_zero(snapshot, "taric_evaluation")
+
+        current_images = scan_images(IMG_DIR)
+        if incremental:
+            previous = {k: tuple(v) for k, v in state.get("images", {}).items()}
+            image_names = [k for k, v in current_images.items() if previous.get(k) != v]
+        else:
+            image_names = list(current_images)
+
+        with zipfile.ZipFile(tmp_archive, "w", zipfile.ZIP_DEFLATED) as zf:
+            if incremental:
+                live_jsonl, eval_jsonl, watermarks = export_changed_rows(snapshot, state)
+                files.append(add_bytes(zf, live_jsonl, f"{root}/taric_live.jsonl"))
+                files.append(add_bytes(zf, eval_jsonl, f"{root}/taric_evaluation.jsonl"))
+            else:
+                print("Schreibe DB-Snapshot ins Archiv ...")
+                files.append(add_file_streamed(zf, snapshot_path, f"{root}/taric_live.db"))
+                try:
+                    max_live_id = snapshot.execute(
+                        "SELECT COALESCE(MAX(id), 0) FROM taric_live"
+                    ).fetchone()[0]
+                except sqlite3.OperationalError:
+                    max_live_id = 0
+                updated_at, updated_ids = current_watermark(snapshot, "taric_live", "updated_at")
+                reviewed_at, reviewed_ids = current_watermark(snapshot, "taric_evaluation", "reviewed_at")
+                watermarks = {
+                    "last_taric_live_id": max_live_id,
+                    "last_taric_live_updated_at": updated_at,
+                    "last_taric_live_updated_ids": updated_ids,
+                    "last_reviewed_at": reviewed_at,
+                    "last_reviewed_ids": reviewed_ids,
+                }
+            snapshot.close()
+
+            print(f"Streame {len(image_names)} Bild(er) ins Archiv ...")
+            for idx, name in enumerate(image_names, start=1):
+                files.append(add_file_streamed(zf, IMG_DIR / name, f"{root}/bilder_uploads/{name}"))
+                if idx % 200 == 0:
+                    print(f"  {idx}/{len(image_names)}", flush=True)
+
+            readme = build_readme(ts_human, mode, live_count, eval_count, len(image_names))
+            files.append(add_bytes(zf, readme.encode("utf-8"), f"{root}/README_taric_export_{ts}.txt"))
+
+            manifest = {
+                "exported_at": ts_human,
+                "mode": mode,
+                "base_export": state.get("last_archive") if incremental else None,
+                "taric_live_count": live_count,
+                "taric_evaluation_count": eval_count,
+                "image_count": len(image_names),
+                "files": files,
+            }
+            zf.writestr(
+                f"{root}/manifest.json",
+                json.dumps(manifest, ensure_ascii=False, indent=2) + "\n",
+                compress_type=zipfile.ZIP_DEFLATED,
+            )
+
+    tmp_archive.replace(archive_file)
+
+    save_state(
+        {
+            "last_export_at": ts_human,
+            "last_archive": archive_file.name,
+            **watermarks,
+            "images": {k: list(v) for k, v in current_images.items()},
+        }
+    )
+
+    stored = sum(1 for f in files if f["stored"])
+    print()
+    print("FERTIG.")
+    print(f"Modus      : {mode}")
+    print(f"ZIP-Archiv : {archive_file}")
+    print(f"Dateien    : {len(files)} (davon {stored} unkomprimiert gespeichert)")
+    return archive_file
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="TARIC-Live-Datenbank + Bilder exportieren.")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Nur Änderungen seit dem letzten Export (Bilder + Zeilen als JSONL)",
+    )
+    args = parser.parse_args()
+
+    print("== TARIC Export ==")
+    run_export(incremental=args.incremental)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nAbgebrochen durch Benutzer.")
+        sys.exit(1)
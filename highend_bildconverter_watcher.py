@@ -3,7 +3,10 @@
 
 Beobachtet das SOURCE_DIR aus highend_bildconverter_taric und
 konvertiert neue AVIF/JPG/PNG-Dateien automatisch nach WEBP, sobald
-sie im Quellordner erscheinen.
+sie im Quellordner fertig geschrieben sind (taric_file_readiness:
+Close-/Umbenennungs-Ereignisse, sonst stabile Größe/mtime; .part/.tmp und
+Punkt-Dateien werden ignoriert). Viele Dateien auf einmal werden als ein
+Batch konvertiert.
 
 Voraussetzungen:
     pip install watchdog pillow tqdm
@@ -15,8 +18,8 @@ Start:
 import logging
 import time
 from pathlib import Path
+from typing import List
 
-from watchdog.events import FileSystemEventHandler, FileCreatedEvent, FileMovedEvent
 from watchdog.observers import Observer
 
 from highend_bildconverter_taric import (
@@ -25,6 +28,7 @@ from highend_bildconverter_taric import (
     ensure_directories,
     convert_single_image,
 )
+from taric_file_readiness import ReadinessWatcher, observer_emits_close_events
 
 LOG_LEVEL = "INFO"
 
@@ -36,17 +40,10 @@ logging.basicConfig(
 logger = logging.getLogger("bildkonverter_watcher")
 
 
-class NewImageHandler(FileSystemEventHandler):
-    """Reagiert auf neu angelegte oder verschobene Dateien im SOURCE_DIR."""
-
-    def _handle_path(self, path: Path) -> None:
-        if not path.is_file():
-            return
-        if path.suffix.lower() not in ALLOWED_EXTENSIONS:
-            logger.debug("Ignoriere %s (nicht unterstützte Endung)", path.name)
-            return
-
-        logger.info("Neue Bilddatei erkannt: %s", path.name)
+def convert_batch(paths: List[Path]) -> None:
+    """Konvertiert einen Batch fertig geschriebener Dateien (läuft im Readiness-Thread)."""
+    logger.info("%d neue Bilddatei(en) bereit", len(paths))
+    for path in paths:
         result = convert_single_image(path)
 
         if result.status == "converted":
@@ -60,12 +57,6 @@ class NewImageHandler(FileSystemEventHandler):
         else:
             logger.info("Status %s für %s", result.status, result.src_path.name)
 
-    def on_created(self, event: FileCreatedEvent) -> None:
-        self._handle_path(Path(event.src_path))
-
-    def on_moved(self, event: FileMovedEvent) -> None:
-        self._handle_path(Path(event.dest_path))
-
 
 def main() -> None:
     ensure_directories()
@@ -76,8 +67,13 @@ def main() -> None:
 
     logger.info("Starte Watcher auf Ordner: %s", SOURCE_DIR)
 
-    event_handler = NewImageHandler()
     observer = Observer()
+    event_handler = ReadinessWatcher(
+        on_batch=convert_batch,
+        accept=lambda path: path.suffix.lower() in ALLOWED_EXTENSIONS,
+        close_events=observer_emits_close_events(observer),
+    )
+    event_handler.start()
     observer.schedule(event_handler, str(SOURCE_DIR), recursive=False)
     observer.start()
 
@@ -89,6 +85,7 @@ def main() -> None:
         observer.stop()
 
     observer.join()
+    event_handler.stop()
     logger.info("Watcher sauber beendet.")
 
 
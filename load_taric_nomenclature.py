@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+"""
+Offline-Loader: komplette TARIC-Nomenklatur in taric_reference laden
+
+Quellen (Datei auf der Platte):
+- TARIC3-XML-Dump (Datensätze goods.nomenclature, goods.nomenclature.indents,
+  goods.nomenclature.description.period, goods.nomenclature.description),
+  gestreamt mit lxml.etree.iterparse
+- CSV-Export der Nomenklatur (Spalten z.B. "Goods code", "Start date", "End date",
+  "Language", "Indent", "Description"; Trennzeichen wird erkannt)
+
+Ergebnis:
+- taric_reference: eine Zeile pro Code (Produktlinien-Suffix 80 bevorzugt) mit
+  Gültigkeit, Einrückung (indent), Stellenebene (code_level), parent_code, is_leaf
+- taric_reference_text: Beschreibungen in allen Sprachen
+- Inserts batchweise per executemany in einer Transaktion
+
+Verwendung:
+    python3 load_taric_nomenclature.py nomenclature.xml [--date 2026-01-01] [--truncate]
+    python3 load_taric_nomenclature.py nomenclature_de.csv nomenclature_en.csv
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+import argparse
+import csv
+import datetime
+import os
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+DB_PATH = Path(os.getenv("TARIC_DB_PATH", str(BASE_DIR / "taric_live.db")))
+
+BATCH_SIZE = 1000
+
+# Produktlinien-Suffix der "eigentlichen" (deklarierbaren) Zeile
+DEFAULT_SUFFIX = "80"
+
+REFERENCE_COLUMNS = {
+    "product_line_suffix": "TEXT",
+    "indent": "INTEGER",
+    "code_level": "INTEGER",
+    "parent_code": "TEXT",
+    "is_leaf": "INTEGER",
+    "valid_from": "TEXT",
+    "valid_to": "TEXT",
+}
+
+
+# ---------------------------------------------------------------------------
+# Datenstrukturen
+# ---------------------------------------------------------------------------
+
+@dataclass
+class NomenclatureLine:
+    code: str
+    suffix: str = DEFAULT_SUFFIX
+    valid_from: Optional[str] = None
+    valid_to: Optional[str] = None
+    indent: Optional[int] = None
+    descriptions: Dict[str, str] = field(default_factory=dict)
+    # wird in compute_hierarchy() gesetzt
+    depth: int = 0
+    parent_code: Optional[str] = None
+    is_leaf: bool = True
+
+
+# ---------------------------------------------------------------------------
+# Hilfsfunktionen
+# ---------------------------------------------------------------------------
+
+def parse_date(value: Optional[str]) -> Optional[str]:
+    """Akzeptiert YYYY-MM-DD, DD-MM-YYYY, DD/MM/YYYY, DD.MM.YYYY, YYYYMMDD -> ISO-Datum."""
+    if not value:
+        return None
+    value = value.strip()[:10]
+    for fmt in ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%d.%m.%Y", "%Y%m%d"):
+        try:
+            return datetime.datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def is_valid_on(valid_from: Optional[str], valid_to: Optional[str], ref_date: str) -> bool:
+    if valid_from and valid_from > ref_date:
+        return False
+    if valid_to and valid_to < ref_date:
+        return False
+    return True
+
+
+def normalize_code(raw: str) -> Tuple[Optional[str], Optional[str]]:
+    """'0101 21 00 00 80' / '0101210000-80' / '01012100' -> ('0101210000', '80' | None)."""
+    digits = re.sub(r"\D", "", raw or "")
+    if len(digits) == 12:
+        return digits[:10], digits[10:]
+    if len(digits) in (2, 4, 6, 8, 10):
+        return digits.ljust(10, "0"), None
+    return None, None
+
+
+def code_level(code: str) -> int:
+    """Anzahl signifikanter Stellen (2, 4, 6, 8 oder 10)."""
+    stripped = code.rstrip("0")
+    for level in (2, 4, 6, 8, 10):
+        if len(stripped) <= level:
+            return level
+    return 10
+
+
+def parse_indent(raw: Optional[str]) -> Optional[int]:
+    """Einrückung als Zahl oder als Strich-Notation ('- - -' -> 3)."""
+    if raw is None:
+        return None
+    raw = raw.strip()
+    if not raw:
+        return None
+    if raw.isdigit():
+        return int(raw)
+    dashes = raw.count("-")
+    return dashes if dashes else None
+
+
+# ---------------------------------------------------------------------------
+# XML (TARIC3) – Streaming mit lxml.iterparse
+# ---------------------------------------------------------------------------
+
+def _child_text(elem, name: str) -> Optional[str]:
+    for child in elem:
+        if isinstance(child.tag, str) and child.tag.rsplit("}", 1)[-1] == name:
+            return (child.text or "").strip() or None
+    return None
+
+
+def iter_xml_lines(path: Path, ref_date: str) -> Iterator[NomenclatureLine]:
+    """
+    Streamt einen TARIC3-XML-Dump. Jeder <record> wird nach der Verarbeitung
+    freigegeben, damit der Speicher auch bei großen Dumps konstant bleibt.
+    """
+    from lxml import etree
+
+    goods: Dict[str, NomenclatureLine] = {}            # goods.nomenclature.sid -> Zeile
+    indents: Dict[str, Tuple[str, int]] = {}            # sid -> (start, indents)
+    periods: Dict[str, Tuple[str, str]] = {}            # period.sid -> (goods sid, start)
+    descriptions: List[Tuple[str, str, str]] = []       # (period.sid, lang, text)
+
+    context = etree.iterparse(str(path), events=("end",), tag="{*}record", huge_tree=True)
+    for _, record in context:
+        update_type = _child_text(record, "update.type")
+        for entity in record:
+            if not isinstance(entity.tag, str):
+                continue
+            kind = entity.tag.rsplit("}", 1)[-1]
+
+            if kind == "goods.nomenclature":
+                sid = _child_text(entity, "goods.nomenclature.sid")
+                if update_type == "2":
+                    goods.pop(sid, None)
+                    continue
+                code, _ = normalize_code(_child_text(entity, "goods.nomenclature.item.id") or "")
+                if not sid or not code:
+                    continue
+                valid_from = parse_date(_child_text(entity, "validity.start.date"))
+                valid_to = parse_date(_child_text(entity, "validity.end.date"))
+                if not is_valid_on(valid_from, valid_to, ref_date):
+                    goods.pop(sid, None)
+                    continue
+                goods[sid] = NomenclatureLine(
+                    code=code,
+                    suffix=_child_text(entity, "producline.suffix") or DEFAULT_SUFFIX,
+                    valid_from=valid_from,
+                    valid_to=valid_to,
+                )
+
+            elif kind == "goods.nomenclature.indents":
+                sid = _child_text(entity, "goods.nomenclature.sid")
+                start = parse_date(_child_text(entity, "validity.start.date")) or ""
+                number = parse_indent(_child_text(entity, "number.indents"))
+                if sid and number is not None and start <= ref_date:
+                    if sid not in indents or indents[sid][0] <= start:
+                        indents[sid] = (start, number)
+
+            elif kind == "goods.nomenclature.description.period":
+                period_sid = _child_text(entity, "goods.nomenclature.description.period.sid")
+                sid = _child_text(entity, "goods.nomenclature.sid")
+                start = parse_date(_child_text(entity, "validity.start.date")) or ""
+                if period_sid and sid and start <= ref_date:
+                    periods[period_sid] = (sid, start)
+
+            elif kind == "goods.nomenclature.description":
+                period_sid = _child_text(entity, "goods.nomenclature.description.period.sid")
+                lang = (_child_text(entity, "language.id") or "").lower()
+                text = _child_text(entity, "description")
+                if period_sid and lang and text:
+                    descriptions.append((period_sid, lang, text))
+
+        # Speicher freigeben: Record leeren und bereits verarbeitete Geschwister entfernen
+        record.clear()
+        parent = record.getparent()
+        while parent is not None and record.getprevious() is not None:
+            del parent[0]
+    del context
+
+    # Beschreibung mit der jüngsten gültigen Periode je (sid, Sprache) gewinnt
+    best: Dict[Tuple[str, str], Tuple[str, str]] = {}
+    for period_sid, lang, text in descriptions:
+        period = periods.get(period_sid)
+        if not period:
+            continue
+        sid, start = period
+        key = (sid, lang)
+        if key not in best or best[key][0] <= start:
+            best[key] = (start, text)
+
+    for (sid, lang), (_, text) in best.items():
+        line = goods.get(sid)
+        if line:
+            line.descriptions[lang] = text
+    for sid, (_, number) in indents.items():
+        line = goods.get(sid)
+        if line:
+            line.indent = number
+
+    yield from goods.values()
+
+
+# ---------------------------------------------------------------------------
+# CSV
+# ---------------------------------------------------------------------------
+
+CSV_ALIASES = {
+    "code": {"goods code", "goods_code", "goodscode", "taric_code", "taric code", "code", "cn code"},
+    "suffix": {"suffix", "product line suffix", "productline_suffix", "pls", "prod. line", "producline.suffix"},
+    "valid_from": {"start date", "start_date", "valid_from", "validity start date", "validity.start.date"},
+    "valid_to": {"end date", "end_date", "valid_to", "validity end date", "validity.end.date"},
+    "lang": {"language", "lang", "language.id", "language id"},
+    "indent": {"indent", "indents", "number.indents", "number_indents"},
+    "description": {"description", "text", "goods description"},
+}
+
+
+def iter_csv_lines(path: Path, ref_date: str, default_lang: str) -> Iterator[NomenclatureLine]:
+    """Streamt eine CSV-Datei zeilenweise (eine Zeile pro Code/Suffix/Sprache)."""
+    with path.open("r", encoding="utf-8-sig", newline="") as fh:
+        sample = fh.read(8192)
+        fh.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=";,\t|")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.DictReader(fh, dialect=dialect)
+
+        mapping: Dict[str, str] = {}
+        for header in reader.fieldnames or []:
+            key = header.strip().lower()
+            for target, aliases in CSV_ALIASES.items():
+                if key in aliases and target not in mapping:
+                    mapping[target] = header
+        if "code" not in mapping:
+            raise SystemExit(f"{path}: keine Code-Spalte gefunden (Header: {reader.fieldnames})")
+
+        def get(row: Dict[str, str], target: str) -> Optional[str]:
+            col = mapping.get(target)
+            value = row.get(col) if col else None
+            return value.strip() if value else None
+
+        for row in reader:
+            code, suffix_in_code = normalize_code(get(row, "code") or "")
+            if not code:
+                continue
+            valid_from = parse_date(get(row, "valid_from"))
+            valid_to = parse_date(get(row, "valid_to"))
+            if not is_valid_on(valid_from, valid_to, ref_date):
+                continue
+            line = NomenclatureLine(
+                code=code,
+                suffix=get(row, "suffix") or suffix_in_code or DEFAULT_SUFFIX,
+                valid_from=valid_from,
+                valid_to=valid_to,
+                indent=parse_indent(get(row, "indent")),
+            )
+            text = get(row, "description")
+            if text:
+                line.descriptions[(get(row, "lang") or default_lang).lower()] = text
+            yield line
+
+
+# ---------------------------------------------------------------------------
+# Hierarchie & DB
+# ---------------------------------------------------------------------------
+
+def merge_lines(lines: Iterator[NomenclatureLine], merged: Dict[Tuple[str, str], NomenclatureLine]) -> None:
+    """Führt Zeilen gleicher (Code, Suffix) zusammen (z.B. eine CSV-Zeile je Sprache)."""
+    for line in lines:
+        key = (line.code, line.suffix)
+        existing = merged.get(key)
+        if existing is None:
+            merged[key] = line
+            continue
+        existing.descriptions.update(line.descriptions)
+        if existing.indent is None:
+            existing.indent = line.indent
+        existing.valid_from = existing.valid_from or line.valid_from
+        existing.valid_to = existing.valid_to or line.valid_to
+
+
+def compute_hierarchy(lines: List[NomenclatureLine]) -> None:
+    """
+    Tiefe, parent_code und is_leaf aus der sortierten Nomenklatur ableiten.
+    Kapitel = Tiefe 0, Positionen (Einrückung 0) = Tiefe 1, sonst Einrückung + 1.
+    """
+    stack: List[NomenclatureLine] = []
+    for line in lines:
+        if line.code[2:] == "00000000":
+            line.depth = 0
+        elif line.indent is not None:
+            line.depth = line.indent + 1
+        else:
+            line.depth = {2: 0, 4: 1}.get(code_level(line.code), 2)
+
+        while stack and stack[-1].depth >= line.depth:
+            stack.pop()
+        if stack:
+            parent = stack[-1]
+            parent.is_leaf = False
+            line.parent_code = parent.code if parent.code != line.code else parent.parent_code
+        stack.append(line)
+
+
+def ensure_reference_schema(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS taric_reference (
+            taric_code     TEXT PRIMARY KEY NOT NULL,
+            cn_code        TEXT,
+            hs_chapter     TEXT,
+            description_de TEXT,
+            description_en TEXT,
+            legal_base     TEXT
+        )
+        """
+    )
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(taric_reference)")}
+    for name, col_type in REFERENCE_COLUMNS.items():
+        if name not in cols:
+            conn.execute(f"ALTER TABLE taric_reference ADD COLUMN {name} {col_type}")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS taric_reference_text (
+            taric_code  TEXT NOT NULL,
+            lang        TEXT NOT NULL,
+            description TEXT,
+            PRIMARY KEY (taric_code, lang)
+        )
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_taric_reference_parent ON taric_reference(parent_code)"
+    )
+    # Versionsstempel je Ladevorgang: laufende Backends laden ihren Code-Index daran neu
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS taric_reference_meta (
+            key   TEXT PRIMARY KEY NOT NULL,
+            value TEXT
+        )
+        """
+    )
+
+
+def select_stored_lines(lines: List[NomenclatureLine]) -> List[NomenclatureLine]:
+    """Eine Zeile pro Code: Suffix 80 bevorzugt, sonst die erste Zeile des Codes."""
+    by_code: Dict[str, NomenclatureLine] = {}
+    for line in lines:
+        current = by_code.get(line.code)
+        if current is None or (line.suffix == DEFAULT_SUFFIX and current.suffix != DEFAULT_SUFFIX):
+            by_code[line.code] = line
+    return [by_code[c] for c in sorted(by_code)]
+
+
+def write_lines(conn: sqlite3.Connection, lines: List[NomenclatureLine], legal_base: str, truncate: bool) -> int:
+    ref_rows = []
+    text_rows = []
+    for line in lines:
+        ref_rows.append(
+            (
+                line.code,
+                line.code[:8],
+                line.code[:2],
+                line.descriptions.get("de"),
+                line.descriptions.get("en"),
+                legal_base,
+                line.suffix,
+                line.indent,
+                code_level(line.code),
+                line.parent_code,
+                1 if line.is_leaf else 0,
+                line.valid_from,
+                line.valid_to,
+            )
+        )
+        for lang, text in line.descriptions.items():
+            text_rows.append((line.code, lang, text))
+
+    with conn:
+        if truncate:
+            conn.execute("DELETE FROM taric_reference")
+            conn.execute("DELETE FROM taric_reference_text")
+        for start in range(0, len(ref_rows), BATCH_SIZE):
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO taric_reference (
+                    taric_code, cn_code, hs_chapter, description_de, description_en, legal_base,
+                    product_line_suffix, indent, code_level, parent_code, is_leaf, valid_from, valid_to
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                ref_rows[start : start + BATCH_SIZE],
+            )
+        for start in range(0, len(text_rows), BATCH_SIZE):
+            conn.executemany(
+                "INSERT OR REPLACE INTO taric_reference_text (taric_code, lang, description) VALUES (?, ?, ?)",
+                text_rows[start : start + BATCH_SIZE],
+            )
+        conn.execute(
+            "INSERT OR REPLACE INTO taric_reference_meta (key, value) VALUES ('version', ?)",
+            (datetime.datetime.now(datetime.timezone.utc).isoformat(),),
+        )
+    return len(ref_rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="TARIC-Nomenklatur (XML/CSV) nach taric_reference laden.")
+    parser.add_argument("files", nargs="+", type=Path, help="XML- oder CSV-Dateien")
+    parser.add_argument("--date", default=datetime.date.today().isoformat(), help="Stichtag für Gültigkeit (YYYY-MM-DD)")
+    parser.add_argument("--lang", default="de", help="Sprache für CSV-Dateien ohne Sprachspalte")
+    parser.add_argument("--legal-base", default="TARIC", help="Wert für Spalte legal_base")
+    parser.add_argument("--truncate", action="store_true", help="taric_reference vorher leeren")
+    args = parser.parse_args()
+
+    ref_date = parse_date(args.date)
+    if not ref_date:
+        raise SystemExit(f"Ungültiges Datum: {args.date}")
+
+    started = time.perf_counter()
+    merged: Dict[Tuple[str, str], NomenclatureLine] = {}
+    for path in args.files:
+        if not path.exists():
+            raise SystemExit(f"Datei nicht gefunden: {path}")
+        print(f"[INFO] Lese {path} ...")
+        if path.suffix.lower() == ".xml":
+            merge_lines(iter_xml_lines(path, ref_date), merged)
+        else:
+            merge_lines(iter_csv_lines(path, ref_date, args.lang), merged)
+
+    lines = [merged[k] for k in sorted(merged)]
+    compute_hierarchy(lines)
+    stored = select_stored_lines(lines)
+
+    conn = sqlite3.connect(str(DB_PATH))
+    try:
+        ensure_reference_schema(conn)
+        count = write_lines(conn, stored, args.legal_base, args.truncate)
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"[INFO] {count} Codes (Stichtag {ref_date}) in {elapsed:.1f}s nach taric_reference geladen: {DB_PATH}")
+
+
+if __name__ == "__main__":
+    main()
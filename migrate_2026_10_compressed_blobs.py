@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Migration: große Text-Blobs in komprimierte Seitentabelle taric_blob verschieben
+
+- taric_live.raw_response_json          -> taric_blob (kind=raw_response)
+- taric_official_cache.official_html    -> taric_blob (kind=official_html)
+- Quellspalten werden danach auf NULL gesetzt, damit die heißen Tabellen klein bleiben
+- Optional: VACUUM, um den freigewordenen Platz an das Dateisystem zurückzugeben
+
+Einmalig ausführen (idempotent – bereits migrierte Zeilen haben NULL in der Quellspalte):
+    python3 migrate_2026_10_compressed_blobs.py [--vacuum]
+"""
+
+import argparse
+import os
+import sqlite3
+
+from taric_blob_store import (
+    DEFAULT_CODEC,
+    KIND_OFFICIAL_HTML,
+    KIND_RAW_RESPONSE,
+    ensure_blob_schema,
+    put_blob,
+)
+
+DB_PATH = os.getenv("TARIC_DB_PATH", "taric_live.db")
+
+
+def column_exists(conn: sqlite3.Connection, table_name: str, column_name: str) -> bool:
+    cols = [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")]
+    return column_name in cols
+
+
+def move_column_to_blobs(
+    conn: sqlite3.Connection,
+    table_name: str,
+    column_name: str,
+    kind: str,
+    batch_size: int,
+) -> int:
+    """Verschiebt alle nicht-leeren Werte einer Spalte batchweise nach taric_blob."""
+    if not column_exists(conn, table_name, column_name):
+        print(f"[INFO] {table_name}.{column_name} existiert nicht – übersprungen.")
+        return 0
+
+    moved = 0
+    while True:
+        rows = conn.execute(
+            f"""
+            SELECT rowid, {column_name}
+              FROM {table_name}
+             WHERE {column_name} IS NOT NULL
+             LIMIT ?
+            """,
+            (batch_size,),
+        ).fetchall()
+        if not rows:
+            break
+
+        with conn:
+            for rowid, text in rows:
+                put_blob(conn, table_name, rowid, kind, text)
+            conn.executemany(
+                f"UPDATE {table_name} SET {column_name} = NULL WHERE rowid = ?",
+                [(rowid,) for rowid, _ in rows],
+            )
+        moved += len(rows)
+        print(f"[INFO] {table_name}.{column_name}: {moved} Zeilen verschoben ...")
+
+    return moved
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Blobs komprimiert nach taric_blob verschieben.")
+    parser.add_argument("--batch-size", type=int, default=500, help="Zeilen pro Transaktion")
+    parser.add_argument("--vacuum", action="store_true", help="Nach der Migration VACUUM ausführen")
+    args = parser.parse_args()
+
+    if not os.path.exists(DB_PATH):
+        raise SystemExit(f"DB '{DB_PATH}' nicht gefunden – bitte Pfad prüfen.")
+
+    print(f"[INFO] Verbinde mit DB: {DB_PATH} (Codec: {DEFAULT_CODEC})")
+    conn = sqlite3.connect(DB_PATH)
+
+    try:
+        ensure_blob_schema(conn)
+        conn.commit()
+
+        live = move_column_to_blobs(
+            conn, "taric_live", "raw_response_json", KIND_RAW_RESPONSE, args.batch_size
+        )
+        cache = move_column_to_blobs(
+            conn, "taric_official_cache", "official_html", KIND_OFFICIAL_HTML, args.batch_size
+        )
+
+        raw_size, stored_size = conn.execute(
+            "SELECT COALESCE(SUM(raw_size), 0), COALESCE(SUM(length(data)), 0) FROM taric_blob"
+        ).fetchone()
+        print(
+            f"[INFO] Migration erfolgreich: taric_live={live}, taric_official_cache={cache}; "
+            f"taric_blob gesamt {raw_size} -> {stored_size} Bytes"
+        )
+
+        if args.vacuum:
+            print("[INFO] VACUUM ...")
+            conn.execute("VACUUM")
+            print("[INFO] VACUUM abgeschlossen.")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
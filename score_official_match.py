@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Batch-Scoring: Modellbegründung (short_reason) vs. offizielle Beschreibung
+
+Füllt taric_live.official_match_score / official_match_label:
+- Modell: TF-IDF über Zeichen-n-Gramme (Wortgrenzen), Vokabular und IDF einmal
+  über alle Beschreibungen aus taric_reference gebaut
+- Offizieller Text je Code = Beschreibungen der Vorfahren + eigene Beschreibung
+  (aus dem TARIC-Code-Index; verwendet taric_code_snapped, falls vorhanden)
+- Vektoren als scipy.sparse-CSR, Score = Kosinus-Ähnlichkeit, zeilenweise in
+  großen Chunks berechnet und per executemany geschrieben
+- Inkrementell: nur Zeilen ohne official_match_label (neue Zeilen); --full bewertet alles neu
+
+Labels: match / partial / mismatch, no_reason (leere Begründung),
+        no_reference (Code nicht in taric_reference – mit --retry-missing erneut prüfen)
+
+Verwendung:
+    python3 score_official_match.py                 # neue Zeilen
+    python3 score_official_match.py --full          # alles neu
+    python3 score_official_match.py --interval 300  # alle 5 Minuten neue Zeilen
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+import argparse
+import os
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+from migrate_2025_12_taric_official import ensure_taric_live_review_columns
+from taric_code_index import TaricCodeIndex
+
+BASE_DIR = Path(__file__).resolve().parent
+DB_PATH = Path(os.getenv("TARIC_DB_PATH", str(BASE_DIR / "taric_live.db")))
+
+CHUNK_SIZE = 50_000
+NGRAM_RANGE = (3, 5)
+
+# Schwellwerte für official_match_label
+MATCH_THRESHOLD = float(os.getenv("TARIC_MATCH_THRESHOLD", "0.35"))
+PARTIAL_THRESHOLD = float(os.getenv("TARIC_PARTIAL_THRESHOLD", "0.15"))
+
+LABEL_NO_REASON = "no_reason"
+LABEL_NO_REFERENCE = "no_reference"
+
+_NON_WORD = re.compile(r"[^\w]+", re.UNICODE)
+
+
+# ---------------------------------------------------------------------------
+# TF-IDF über Zeichen-n-Gramme
+# ---------------------------------------------------------------------------
+
+
+def _ngrams(text: str, ngram_range: Tuple[int, int] = NGRAM_RANGE) -> List[str]:
+    """Zeichen-n-Gramme je Wort (mit Leerzeichen als Wortgrenze, wie char_wb)."""
+    grams: List[str] = []
+    lo, hi = ngram_range
+    for word in _NON_WORD.sub(" ", (text or "").lower()).split():
+        padded = f" {word} "
+        length = len(padded)
+        for n in range(lo, hi + 1):
+            if n > length:
+                break
+            grams.extend(padded[i : i + n] for i in range(length - n + 1))
+    return grams
+
+
+class CharNgramTfidf:
+    """Minimaler TF-IDF-Vektorisierer (sublineares TF, glatte IDF, L2-normiert)."""
+
+    def __init__(self, ngram_range: Tuple[int, int] = NGRAM_RANGE) -> None:
+        self.ngram_range = ngram_range
+        self.vocabulary: Dict[str, int] = {}
+        self.idf: Optional[np.ndarray] = None
+
+    def fit(self, documents: Iterable[str]) -> "CharNgramTfidf":
+        doc_freq: Dict[str, int] = {}
+        n_docs = 0
+        for doc in documents:
+            n_docs += 1
+            for gram in set(_ngrams(doc, self.ngram_range)):
+                doc_freq[gram] = doc_freq.get(gram, 0) + 1
+        self.vocabulary = {gram: i for i, gram in enumerate(sorted(doc_freq))}
+        df = np.fromiter((doc_freq[g] for g in sorted(doc_freq)), dtype=np.float64, count=len(doc_freq))
+        self.idf = np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+        return self
+
+    def transform(self, documents: List[str]) -> sparse.csr_matrix:
+        vocab = self.vocabulary
+        indptr = [0]
+        indices: List[int] = []
+        for doc in documents:
+            ids = [vocab[g] for g in _ngrams(doc, self.ngram_range) if g in vocab]
+            indices.extend(ids)
+            indptr.append(len(indices))
+
+        data = np.ones(len(indices), dtype=np.float64)
+        matrix = sparse.csr_matrix(
+            (data, np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(documents), len(vocab)),
+        )
+        matrix.sum_duplicates()  # Roh-Häufigkeiten je n-Gramm
+        matrix.data = 1.0 + np.log(matrix.data)
+        matrix = matrix.multiply(self.idf).tocsr()
+
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0.0] = 1.0
+        return sparse.diags(1.0 / norms).dot(matrix).tocsr()
+
+
+def rowwise_cosine(a: sparse.csr_matrix, b: sparse.csr_matrix) -> np.ndarray:
+    """Kosinus je Zeilenpaar (beide Matrizen L2-normiert)."""
+    return np.asarray(a.multiply(b).sum(axis=1)).ravel()
+
+
+def label_for(score: float) -> str:
+    if score >= MATCH_THRESHOLD:
+        return "match"
+    if score >= PARTIAL_THRESHOLD:
+        return "partial"
+    return "mismatch"
+
+
+# ---------------------------------------------------------------------------
+# Scoring-Job
+# ---------------------------------------------------------------------------
+
+
+def official_text(index: TaricCodeIndex, code: str, lang: str) -> Optional[str]:
+    entry = index.get(code)
+    if entry is None:
+        return None
+    parts = [a.description(lang) for a in index.ancestors(code)]
+    parts.append(entry.description(lang))
+    text = " ".join(p for p in parts if p)
+    return text or None
+
+
+def ensure_scoring_schema(conn: sqlite3.Connection) -> None:
+    ensure_taric_live_review_columns(conn)
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_taric_live_match_pending
+            ON taric_live(id) WHERE official_match_label IS NULL
+        """
+    )
+    conn.commit()
+
+
+def score_rows(
+    conn: sqlite3.Connection,
+    index: TaricCodeIndex,
+    model: CharNgramTfidf,
+    lang: str = "de",
+    full: bool = False,
+    retry_missing: bool = False,
+    chunk_size: int = CHUNK_SIZE,
+) -> Dict[str, int]:
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(taric_live)")}
+    code_expr = "COALESCE(taric_code_snapped, taric_code)" if "taric_code_snapped" in cols else "taric_code"
+
+    where = "1 = 1"
+    if not full:
+        where = "official_match_label IS NULL"
+        if retry_missing:
+            where += f" OR official_match_label = '{LABEL_NO_REFERENCE}'"
+
+    # Offizielle Vektoren je Code nur einmal berechnen
+    official_rows: Dict[str, int] = {}
+    official_blocks: List[sparse.csr_matrix] = []
+    official_count = 0
+
+    stats = {"rows": 0, "scored": 0, LABEL_NO_REASON: 0, LABEL_NO_REFERENCE: 0}
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            f"""
+            SELECT id, {code_expr} AS code, short_reason
+              FROM taric_live
+             WHERE ({where}) AND id > ?
+             ORDER BY id
+             LIMIT ?
+            """,
+            (last_id, chunk_size),
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        updates: List[Tuple[Optional[float], str, int]] = []
+        scored_ids: List[int] = []
+        reasons: List[str] = []
+        codes: List[str] = []
+        new_codes: List[str] = []
+        new_texts: List[str] = []
+
+        for row_id, code, reason in rows:
+            code = (code or "").strip()
+            if not (reason or "").strip():
+                updates.append((None, LABEL_NO_REASON, row_id))
+                stats[LABEL_NO_REASON] += 1
+                continue
+            if code not in official_rows:
+                text = official_text(index, code, lang) if code else None
+                if text is None:
+                    updates.append((None, LABEL_NO_REFERENCE, row_id))
+                    stats[LABEL_NO_REFERENCE] += 1
+                    continue
+                official_rows[code] = official_count + len(new_codes)
+                new_codes.append(code)
+                new_texts.append(text)
+            scored_ids.append(row_id)
+            reasons.append(reason)
+            codes.append(code)
+
+        if new_texts:
+            official_blocks.append(model.transform(new_texts))
+            official_count += len(new_texts)
+
+        if scored_ids:
+            official = sparse.vstack(official_blocks).tocsr() if len(official_blocks) > 1 else official_blocks[0]
+            official_blocks = [official]
+            reason_matrix = model.transform(reasons)
+            aligned = official[np.fromiter((official_rows[c] for c in codes), dtype=np.int64, count=len(codes))]
+            scores = rowwise_cosine(reason_matrix, aligned)
+            updates.extend(
+                (round(float(s), 4), label_for(float(s)), row_id)
+                for s, row_id in zip(scores, scored_ids)
+            )
+            stats["scored"] += len(scored_ids)
+
+        conn.executemany(
+            "UPDATE taric_live SET official_match_score = ?, official_match_label = ? WHERE id = ?",
+            updates,
+        )
+        conn.commit()
+        stats["rows"] += len(rows)
+
+    return stats
+
+
+def build_model(index_db: Path) -> Tuple[TaricCodeIndex, CharNgramTfidf]:
+    index = TaricCodeIndex.from_db(index_db)
+    conn = sqlite3.connect(f"file:{index_db}?mode=ro", uri=True)
+    try:
+        documents = [
+            " ".join(filter(None, row))
+            for row in conn.execute("SELECT description_de, description_en FROM taric_reference")
+        ]
+    finally:
+        conn.close()
+    return index, CharNgramTfidf().fit(documents)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="official_match_score/label in taric_live berechnen.")
+    parser.add_argument("--full", action="store_true", help="Alle Zeilen neu bewerten")
+    parser.add_argument("--retry-missing", action="store_true", help="Zeilen mit no_reference erneut prüfen")
+    parser.add_argument("--lang", default="de", help="Sprache der offiziellen Beschreibung (de/en)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument(
+        "--interval", type=float, default=0.0,
+        help="Sekunden zwischen inkrementellen Läufen (0 = einmalig)",
+    )
+    args = parser.parse_args()
+
+    if not DB_PATH.exists():
+        raise SystemExit(f"DB '{DB_PATH}' nicht gefunden – bitte Pfad prüfen.")
+
+    started = time.perf_counter()
+    index, model = build_model(DB_PATH)
+    print(
+        f"[INFO] Modell: {len(model.vocabulary)} n-Gramme über {len(index)} Codes "
+        f"({time.perf_counter() - started:.1f}s)"
+    )
+    if not len(index):
+        raise SystemExit("taric_reference ist leer – zuerst load_taric_nomenclature.py ausführen.")
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        ensure_scoring_schema(conn)
+        full = args.full
+        while True:
+            t0 = time.perf_counter()
+            stats = score_rows(
+                conn, index, model,
+                lang=args.lang, full=full, retry_missing=args.retry_missing,
+                chunk_size=args.chunk_size,
+            )
+            print(f"[INFO] {stats} in {time.perf_counter() - t0:.1f}s")
+            if args.interval <= 0:
+                break
+            full = False
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
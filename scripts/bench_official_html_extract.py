@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Benchmark: lxml vs. BeautifulSoup extraction of official TARIC descriptions.
+
+Sample pages come from a directory of saved consultation pages or from the
+compressed HTML stored for taric_official_cache rows:
+
+    python3 scripts/bench_official_html_extract.py --pages samples/ --prefix 8517
+    python3 scripts/bench_official_html_extract.py --from-cache --limit 200
+
+For saved pages the prefix is taken from the leading digits of the file name
+(e.g. 8517_de.html) unless --prefix is given.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import sqlite3
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from taric_blob_store import KIND_OFFICIAL_HTML, get_blobs  # noqa: E402
+from taric_official_html import (  # noqa: E402
+    extract_official_description,
+    extract_official_description_bs4,
+)
+
+DEFAULT_DB_PATH = str(ROOT / "taric_live.db")
+
+Sample = tuple[str, str, str, int]  # (name, html, prefix, digits)
+
+
+def load_pages(directory: Path, prefix: str | None) -> list[Sample]:
+    samples: list[Sample] = []
+    for path in sorted(directory.glob("*.htm*")):
+        page_prefix = prefix
+        if page_prefix is None:
+            match = re.match(r"(\d{4,10})", path.name)
+            if not match:
+                print(f"skip {path.name}: no prefix in file name (use --prefix)")
+                continue
+            page_prefix = match.group(1)
+        html = path.read_text(encoding="utf-8", errors="replace")
+        samples.append((path.name, html, page_prefix, len(page_prefix)))
+    return samples
+
+
+def load_from_cache(db_path: Path, limit: int) -> list[Sample]:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT id, taric_prefix, digits, official_html FROM taric_official_cache "
+            "ORDER BY id DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        blobs = get_blobs(conn, "taric_official_cache", [r[0] for r in rows], KIND_OFFICIAL_HTML)
+    finally:
+        conn.close()
+
+    samples: list[Sample] = []
+    for row_id, prefix, digits, inline_html in rows:
+        html = blobs.get(row_id) or inline_html
+        if html:
+            samples.append((f"cache#{row_id}", html, prefix, digits))
+    return samples
+
+
+def bench(fn: Callable[[str, str, int], str | None], samples: list[Sample], repeat: int):
+    timings: list[float] = []
+    results: dict[str, str | None] = {}
+    for name, html, prefix, digits in samples:
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            results[name] = fn(html, prefix, digits)
+            best = min(best, time.perf_counter() - started)
+        timings.append(best)
+    return timings, results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare official HTML extractors.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--pages", type=Path, help="Directory with saved consultation pages.")
+    source.add_argument("--from-cache", action="store_true", help="Use HTML from taric_official_cache.")
+    parser.add_argument("--prefix", help="Prefix for all saved pages (default: from file name).")
+    parser.add_argument("--limit", type=int, default=100, help="Max. cache rows (--from-cache).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per page (best time counts).")
+    args = parser.parse_args()
+
+    if args.from_cache:
+        samples = load_from_cache(Path(os.getenv("TARIC_DB_PATH", DEFAULT_DB_PATH)), args.limit)
+    else:
+        samples = load_pages(args.pages, args.prefix)
+    if not samples:
+        print("No sample pages found.")
+        return 1
+
+    total_kb = sum(len(s[1]) for s in samples) / 1024
+    print(f"{len(samples)} pages, {total_kb:.0f} KiB HTML, best of {args.repeat} runs\n")
+
+    lxml_times, lxml_results = bench(extract_official_description, samples, args.repeat)
+    bs4_times, bs4_results = bench(extract_official_description_bs4, samples, args.repeat)
+
+    for label, timings in (("bs4/html.parser", bs4_times), ("lxml", lxml_times)):
+        print(
+            f"{label:<16} total {sum(timings) * 1000:8.1f} ms   "
+            f"median {statistics.median(timings) * 1000:7.2f} ms   "
+            f"max {max(timings) * 1000:7.2f} ms"
+        )
+    if sum(lxml_times):
+        print(f"\nspeedup: {sum(bs4_times) / sum(lxml_times):.1f}x")
+
+    differing = [name for name in lxml_results if lxml_results[name] != bs4_results[name]]
+    print(f"identical results: {len(samples) - len(differing)}/{len(samples)}")
+    for name in differing[:10]:
+        print(f"  differs: {name}")
+        print(f"    bs4 : {(bs4_results[name] or '')[:120]!r}")
+        print(f"    lxml: {(lxml_results[name] or '')[:120]!r}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
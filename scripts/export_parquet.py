@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""Inkrementeller spaltenorientierter Export (Parquet) von Klassifikationen und Bewertungen.
+
+Hängt Zeilen, die seit dem gespeicherten Wasserzeichen neu oder geändert sind, an
+partitionierte Parquet-Dateien an:
+
+    <RESULTS_DIR>/parquet/<tabelle>/hs_chapter=<XX>/part-<zeitstempel>.parquet
+
+Tabellen:
+- taric_live        (taric_live.db, Wasserzeichen: id für neue Zeilen und updated_at für
+                     nachträglich geänderte – Review-Felder, official_match_*, Validierung)
+- taric_evaluation  (taric_live.db, Wasserzeichen: reviewed_at)
+- classifications   (taric_dataset.db, Wasserzeichen: updated_at)
+
+Geänderte Zeilen werden erneut angehängt – beim Lesen je id die Zeile aus der
+jüngsten part-Datei verwenden (Dateinamen sind nach Zeitstempel sortierbar).
+
+Zeitstempel haben nur Sekundenauflösung: Vergleich mit >=, die beim letzten Lauf mit
+genau diesem Zeitstempel exportierten IDs werden mitgespeichert und übersprungen.
+
+--full baut die Tabellen in einem temporären Verzeichnis neu auf und tauscht es erst
+nach erfolgreichem Export gegen das bestehende aus (keine doppelten Zeilen).
+
+Zurücklesen mit Spaltenauswahl:
+
+    pd.read_parquet(".../parquet/taric_live", columns=["taric_code", "confidence"])
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+
+DEFAULT_DB_PATH = "/project/workspace/db/taric_dataset.db"
+DEFAULT_LIVE_DB_PATH = "/project/workspace/taric_live.db"
+DEFAULT_RESULTS_DIR = "/project/workspace/results"
+
+UNKNOWN_CHAPTER = "unknown"
+
+# Spaltentypen je Tabelle (pandas-Nullable-Dtypes -> typisierte Parquet-Spalten).
+# raw_response_json wird bewusst nicht exportiert (groß, steckt in den typisierten Spalten).
+# "optional": Spalten aus späteren Migrationen; fehlen sie in einer älteren DB, wird NULL exportiert.
+TABLE_SPECS: dict[str, dict[str, Any]] = {
+    "taric_live": {
+        "db": "live",
+        "watermark": "id+updated_at",
+        "sql": """
+            SELECT id, created_at, updated_at, filename, taric_code, cn_code, hs_chapter,
+                   confidence, short_reason, alternatives_json, {optional}
+              FROM taric_live
+             WHERE id > ? OR updated_at >= ?
+             ORDER BY id
+        """,
+        "optional": [
+            "taric_code_snapped",
+            "code_valid",
+            "official_match_score",
+            "official_match_label",
+        ],
+        "dtypes": {
+            "id": "Int64",
+            "filename": "string",
+            "taric_code": "string",
+            "cn_code": "string",
+            "hs_chapter": "string",
+            "confidence": "Float64",
+            "short_reason": "string",
+            "alternatives_json": "string",
+            "taric_code_snapped": "string",
+            "code_valid": "boolean",
+            "official_match_score": "Float64",
+            "official_match_label": "string",
+        },
+        "timestamps": ["created_at", "updated_at"],
+    },
+    "taric_evaluation": {
+        "db": "live",
+        "watermark": "reviewed_at",
+        "sql": """
+            SELECT e.id, e.taric_live_id, e.correct_digits, e.reviewer, e.comment,
+                   e.superviser_bewertung, e.reviewed_at,
+                   l.taric_code, l.hs_chapter
+              FROM taric_evaluation e
+              LEFT JOIN taric_live l ON l.id = e.taric_live_id
+             WHERE e.reviewed_at >= ?
+             ORDER BY e.reviewed_at, e.id
+        """,
+        "dtypes": {
+            "id": "Int64",
+            "taric_live_id": "Int64",
+            "correct_digits": "Int64",
+            "reviewer": "string",
+            "comment": "string",
+            "superviser_bewertung": "Int64",
+            "taric_code": "string",
+            "hs_chapter": "string",
+        },
+        "timestamps": ["reviewed_at"],
+    },
+    "classifications": {
+        "db": "dataset",
+        "watermark": "updated_at",
+        "sql": """
+            SELECT id, filename, file_path, file_hash, taric_code, cn_code, hs_chapter,
+                   confidence, short_reason, alternatives_json, status, error_message,
+                   created_at, updated_at
+              FROM classifications
+             WHERE updated_at >= ?
+             ORDER BY updated_at, id
+        """,
+        "dtypes": {
+            "id": "Int64",
+            "filename": "string",
+            "file_path": "string",
+            "file_hash": "string",
+            "taric_code": "string",
+            "cn_code": "string",
+            "hs_chapter": "string",
+            "confidence": "Float64",
+            "short_reason": "string",
+            "alternatives_json": "string",
+            "status": "string",
+            "error_message": "string",
+        },
+        "timestamps": ["created_at", "updated_at"],
+    },
+}
+
+
+def load_watermarks(path: Path) -> dict[str, Any]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_watermarks(path: Path, watermarks: dict[str, Any]) -> None:
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(watermarks, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    tmp.replace(path)
+
+
+def normalize_chapter(df: pd.DataFrame) -> pd.Series:
+    """Zweistelliges HS-Kapitel; sonst die ersten zwei Ziffern von taric_code."""
+    chapter = df["hs_chapter"].astype("string").str.strip().str[:2]
+    from_code = df["taric_code"].astype("string").str.strip().str[:2]
+    chapter = chapter.where(chapter.str.fullmatch(r"\d{2}").fillna(False), from_code)
+    chapter = chapter.where(chapter.str.fullmatch(r"\d{2}").fillna(False), UNKNOWN_CHAPTER)
+    return chapter.fillna(UNKNOWN_CHAPTER)
+
+
+def to_typed_frame(rows: list[sqlite3.Row], spec: dict[str, Any]) -> pd.DataFrame:
+    df = pd.DataFrame([dict(r) for r in rows])
+    for col, dtype in spec["dtypes"].items():
+        if col in df.columns:
+            if dtype in ("Int64", "Float64", "boolean"):
+                df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
+            else:
+                df[col] = df[col].astype(dtype)
+    for col in spec["timestamps"]:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors="coerce", utc=True, format="mixed")
+    df["hs_chapter"] = normalize_chapter(df)
+    return df
+
+
+def split_watermark(stored: Any) -> tuple[Any, list[int]]:
+    """Gespeichertes Wasserzeichen -> (Wert, IDs mit genau diesem Wert); akzeptiert die alte Skalarform."""
+    if isinstance(stored, dict):
+        return stored.get("value"), list(stored.get("ids") or [])
+    return stored, []
+
+
+def build_sql(name: str, conn: sqlite3.Connection) -> str:
+    """SQL der Tabelle; fehlende optionale Spalten werden als NULL selektiert."""
+    spec = TABLE_SPECS[name]
+    optional = spec.get("optional")
+    if not optional:
+        return spec["sql"]
+    cols = {row[1] for row in conn.execute(f"PRAGMA table_info({name})")}
+    return spec["sql"].format(optional=", ".join(c if c in cols else f"NULL AS {c}" for c in optional))
+
+
+def query_params(name: str, watermark: Any) -> tuple[tuple, Any, list[int], int]:
+    """(SQL-Parameter, Zeitstempel-Wasserzeichen, IDs daran, letzte id) aus dem gespeicherten Wert."""
+    wm_col = TABLE_SPECS[name]["watermark"]
+    if wm_col == "id":
+        last_id = int(watermark or 0)
+        return (last_id,), None, [], last_id
+    if wm_col == "id+updated_at":
+        # Alte Form: nur die id als Zahl
+        stored = watermark if isinstance(watermark, dict) else {"id": watermark}
+        last_id = int(stored.get("id") or 0)
+        value, seen_ids = split_watermark(stored.get("updated_at"))
+        value = value or ""
+        return (last_id, value), value, seen_ids, last_id
+    value, seen_ids = split_watermark(watermark)
+    value = value or ""
+    return (value,), value, seen_ids, 0
+
+
+def export_table(
+    name: str,
+    conn: sqlite3.Connection,
+    table_dir: Path,
+    watermark: Any,
+    batch_size: int,
+) -> tuple[int, Any]:
+    """Schreibt alle Zeilen hinter `watermark` nach `table_dir`; liefert (Zeilenzahl, neues Wasserzeichen)."""
+    spec = TABLE_SPECS[name]
+    wm_col = spec["watermark"]
+    ts_col = "updated_at" if wm_col == "id+updated_at" else wm_col
+    params, value, seen_ids, last_id = query_params(name, watermark)
+    seen = set(seen_ids)
+
+    cur = conn.execute(build_sql(name, conn), params)
+    ts = time.strftime("%Y%m%d_%H%M%S")
+    total = 0
+    part = 0
+    # Wasserzeichen aus dem rohen (untypisierten) Wert, damit es wie der SQL-Filter vergleicht
+    new_id = last_id
+    new_value = value
+    new_ids = list(seen_ids)
+
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        if wm_col == "id":
+            new_id = max(new_id, max(r["id"] for r in rows))
+        else:
+            for r in rows:
+                if wm_col == "id+updated_at":
+                    new_id = max(new_id, r["id"])
+                stamp = r[ts_col]
+                if stamp is None or stamp < new_value:
+                    continue
+                if stamp != new_value:
+                    new_value, new_ids = stamp, []
+                if r["id"] not in new_ids:
+                    new_ids.append(r["id"])
+            # Zeilen mit dem alten Wasserzeichen, die der letzte Lauf schon geschrieben hat
+            # (neue taric_live-Zeilen über id > last_id gehören immer dazu)
+            rows = [
+                r
+                for r in rows
+                if r[ts_col] != value or r["id"] not in seen or (wm_col == "id+updated_at" and r["id"] > last_id)
+            ]
+        if not rows:
+            continue
+        df = to_typed_frame(rows, spec)
+
+        for chapter, group in df.groupby("hs_chapter", sort=True):
+            target_dir = table_dir / f"hs_chapter={chapter}"
+            target_dir.mkdir(parents=True, exist_ok=True)
+            target = target_dir / f"part-{ts}-{part:04d}.parquet"
+            group.drop(columns=["hs_chapter"]).to_parquet(target, engine="pyarrow", index=False)
+        part += 1
+        total += len(rows)
+
+    if wm_col == "id":
+        return total, new_id
+    stamp = {"value": new_value, "ids": new_ids}
+    if wm_col == "id+updated_at":
+        return total, {"id": new_id, "updated_at": stamp}
+    return total, stamp
+
+
+def swap_in(tmp_dir: Path, table_dir: Path) -> None:
+    """Ersetzt table_dir durch den frisch geschriebenen Vollexport in tmp_dir."""
+    old_dir = table_dir.with_name(table_dir.name + ".old")
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if table_dir.exists():
+        table_dir.rename(old_dir)
+    if tmp_dir.exists():
+        tmp_dir.rename(table_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Inkrementeller Parquet-Export für Auswertungen.")
+    parser.add_argument(
+        "--tables",
+        nargs="+",
+        choices=sorted(TABLE_SPECS),
+        default=sorted(TABLE_SPECS),
+        help="Zu exportierende Tabellen (Standard: alle).",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Wasserzeichen ignorieren und die gewählten Tabellen komplett neu schreiben.",
+    )
+    parser.add_argument("--batch-size", type=int, default=50_000, help="Zeilen pro Parquet-Datei.")
+    args = parser.parse_args()
+
+    db_paths = {
+        "dataset": Path(os.getenv("DB_PATH", DEFAULT_DB_PATH)),
+        "live": Path(os.getenv("TARIC_LIVE_DB_PATH", DEFAULT_LIVE_DB_PATH)),
+    }
+    out_dir = Path(os.getenv("RESULTS_DIR", DEFAULT_RESULTS_DIR)) / "parquet"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    watermark_path = out_dir / "_watermarks.json"
+    # Immer laden: --full für einzelne Tabellen darf die Wasserzeichen der übrigen nicht verwerfen
+    watermarks = load_watermarks(watermark_path)
+
+    summary: dict[str, Any] = {}
+    for name in args.tables:
+        db_path = db_paths[TABLE_SPECS[name]["db"]]
+        if not db_path.exists():
+            summary[name] = {"skipped": f"DB nicht gefunden: {db_path}"}
+            continue
+
+        table_dir = out_dir / name
+        # Vollexport zuerst daneben schreiben, bestehende Partitionen erst danach ersetzen
+        target_dir = out_dir / f".{name}.full-tmp" if args.full else table_dir
+        if args.full:
+            shutil.rmtree(target_dir, ignore_errors=True)
+
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            count, new_wm = export_table(
+                name, conn, target_dir, None if args.full else watermarks.get(name), args.batch_size
+            )
+        except sqlite3.OperationalError as exc:
+            summary[name] = {"skipped": str(exc)}
+            if args.full:
+                shutil.rmtree(target_dir, ignore_errors=True)
+            continue
+        finally:
+            conn.close()
+
+        if args.full:
+            swap_in(target_dir, table_dir)
+        watermarks[name] = new_wm
+        # Nach jeder Tabelle speichern, damit ein späterer Fehler fertige Tabellen nicht erneut exportiert
+        save_watermarks(watermark_path, watermarks)
+        summary[name] = {"rows": count, "watermark": new_wm}
+
+    print(json.dumps({"out_dir": str(out_dir), "tables": summary}, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,8 +2,14 @@
 from __future__ import annotations
 import os
 import sqlite3
+import sys
 from pathlib import Path
 
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from taric_blob_store import KIND_RAW_RESPONSE, ensure_blob_schema, put_blob  # noqa: E402
+
 DEFAULT_DB_PATH = "/project/workspace/db/taric_dataset.db"
 DEFAULT_LIVE_DB_PATH = "/project/workspace/taric_live.db"
 
@@ -22,6 +28,7 @@ def ensure_live_schema(conn: sqlite3.Connection) -> None:
             raw_response_json TEXT
         );
     """)
+    ensure_blob_schema(conn)
     conn.commit()
 
 def main() -> int:
@@ -54,23 +61,25 @@ def main() -> int:
               FROM taric_live
              WHERE filename = ?
                AND taric_code IS ?
-               AND raw_response_json IS ?
+               AND created_at IS ?
              LIMIT 1
-        """, (r["filename"], r["taric_code"], r["raw_response_json"])).fetchone()
+        """, (r["filename"], r["taric_code"], r["created_at"])).fetchone()
 
         if exists:
             skipped += 1
             continue
 
-        dst.execute("""
+        # Rohantwort komprimiert in taric_blob, Spalte bleibt NULL (wie store_classification)
+        cur = dst.execute("""
             INSERT INTO taric_live (
                 created_at, filename, taric_code, cn_code, hs_chapter,
                 confidence, short_reason, alternatives_json, raw_response_json
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (
             r["created_at"], r["filename"], r["taric_code"], r["cn_code"], r["hs_chapter"],
-            r["confidence"], r["short_reason"], r["alternatives_json"], r["raw_response_json"]
+            r["confidence"], r["short_reason"], r["alternatives_json"], None
         ))
+        put_blob(dst, "taric_live", cur.lastrowid, KIND_RAW_RESPONSE, r["raw_response_json"])
         inserted += 1
 
     dst.commit()
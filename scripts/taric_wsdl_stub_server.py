@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Local stand-in for the TARIC goods SOAP service (goodsDescrForWs).
+
+Answers every POST with a goodsDescrForWsResponse so taric_wsdl_client can be
+tested and benchmarked without the EU service:
+
+    python3 scripts/taric_wsdl_stub_server.py --port 8089 --latency-ms 150
+    TARIC_WSDL_ENDPOINT=http://127.0.0.1:8089/taric/services/goods \\
+        python3 taric_wsdl_client.py --file codes.txt
+
+Behaviour:
+- description: taken from taric_reference (--db) if the code exists there,
+  otherwise a synthetic "Stub description <code>"
+- codes starting with --not-found-prefix (default 99) answer with a "not found" fault
+- --error-rate returns a technical SOAP fault (HTTP 500) for that share of requests
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import sqlite3
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+NAMESPACE = "http://goodsNomenclatureForWS.ws.taric.dds.s/"
+
+RESPONSE = """<?xml version="1.0" encoding="UTF-8"?>
+<S:Envelope xmlns:S="http://schemas.xmlsoap.org/soap/envelope/">
+  <S:Body>
+    <ns0:goodsDescrForWsResponse xmlns:ns0="{ns}">
+      <return>
+        <result>
+          <data>
+            <goodsCode>{code}</goodsCode>
+            <language>{lang}</language>
+            <dateOfReference>{date}</dateOfReference>
+            <description>{description}</description>
+          </data>
+        </result>
+      </return>
+    </ns0:goodsDescrForWsResponse>
+  </S:Body>
+</S:Envelope>
+"""
+
+FAULT = """<?xml version="1.0" encoding="UTF-8"?>
+<S:Envelope xmlns:S="http://schemas.xmlsoap.org/soap/envelope/">
+  <S:Body>
+    <S:Fault>
+      <faultcode>S:Server</faultcode>
+      <faultstring>{message}</faultstring>
+    </S:Fault>
+  </S:Body>
+</S:Envelope>
+"""
+
+
+def _field(body: str, name: str) -> str:
+    match = re.search(rf"<(?:\w+:)?{name}>\s*([^<]*?)\s*</(?:\w+:)?{name}>", body)
+    return match.group(1) if match else ""
+
+
+def make_handler(args: argparse.Namespace, descriptions: dict[tuple[str, str], str]):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real service
+
+        def do_POST(self) -> None:  # noqa: N802
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length).decode("utf-8", errors="replace")
+            code = _field(body, "goodsCode")
+            lang = (_field(body, "languageCode") or "DE").upper()
+            ref_date = _field(body, "referenceDate")
+
+            if args.latency_ms:
+                time.sleep(args.latency_ms / 1000.0)
+
+            if args.error_rate and random.random() < args.error_rate:
+                self._send(500, FAULT.format(message="Internal service error (stub)"))
+            elif not code or code.startswith(args.not_found_prefix):
+                self._send(500, FAULT.format(message=f"Goods code {escape(code)} not found"))
+            else:
+                description = descriptions.get((code, lang)) or f"Stub description {code}"
+                self._send(
+                    200,
+                    RESPONSE.format(
+                        ns=NAMESPACE,
+                        code=escape(code),
+                        lang=escape(lang),
+                        date=escape(ref_date),
+                        description=escape(description),
+                    ),
+                )
+
+        def _send(self, status: int, payload: str) -> None:
+            data = payload.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/xml; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, fmt: str, *fmt_args) -> None:
+            if not args.quiet:
+                super().log_message(fmt, *fmt_args)
+
+    return Handler
+
+
+def load_descriptions(db_path: str) -> dict[tuple[str, str], str]:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT taric_code, description_de, description_en FROM taric_reference"
+        ).fetchall()
+    finally:
+        conn.close()
+    descriptions: dict[tuple[str, str], str] = {}
+    for code, de, en in rows:
+        if de:
+            descriptions[(code, "DE")] = de
+        if en:
+            descriptions[(code, "EN")] = en
+    return descriptions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Local TARIC SOAP stub server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Artificial latency per request.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of technical faults (0..1).")
+    parser.add_argument("--not-found-prefix", default="99")
+    parser.add_argument("--db", help="taric_live.db with taric_reference for real descriptions.")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    descriptions = load_descriptions(args.db) if args.db else {}
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args, descriptions))
+    print(f"TARIC SOAP stub on http://{args.host}:{args.port}/taric/services/goods ({len(descriptions)} descriptions)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+taric_archive.py
+
+Verantwortung:
+- Zeitbasierte Partitionierung von taric_live: Zeilen älter als N Monate
+  (inkl. taric_evaluation und taric_blob) wandern in Monatsdateien
+  data/archive/taric_live_YYYY_MM.db
+- Die Live-DB behält nur den aktuellen Arbeitsbestand
+- Query-Layer: open_with_archive() hängt Monatsdateien bei Bedarf per ATTACH an
+  und stellt die TEMP-Views taric_live_all / taric_evaluation_all bereit; mehr
+  Partitionen als SQLite gleichzeitig anhängen kann (meist 10): nur die jüngsten,
+  die übrigen werden mit Warnung ausgelassen
+- Re-Hydrierung: Monatspartition zurück in die Live-DB verschieben
+
+CLI:
+    python3 taric_archive.py list
+    python3 taric_archive.py archive --older-than-months 6 [--dry-run]
+    python3 taric_archive.py attach 2025-11 2025-12 --sql "SELECT COUNT(*) FROM taric_live_all"
+    python3 taric_archive.py rehydrate 2025-11
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+import argparse
+import datetime
+import logging
+import os
+import re
+import sqlite3
+from pathlib import Path
+
+from taric_blob_store import ensure_blob_schema
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent
+DB_PATH = Path(os.getenv("TARIC_DB_PATH", str(BASE_DIR / "taric_live.db")))
+ARCHIVE_DIR = Path(os.getenv("TARIC_ARCHIVE_DIR", str(BASE_DIR / "data" / "archive")))
+
+# SQLite erlaubt standardmäßig max. 10 angehängte Datenbanken
+MAX_ATTACHED = 10
+
+MONTH_RE = re.compile(r"^\d{4}-\d{2}$")
+
+# Tabellen, die mit taric_live mitwandern
+ARCHIVED_TABLES = ("taric_live", "taric_evaluation", "taric_blob")
+
+
+# ---------------------------------------------------------------------------
+# Hilfsfunktionen
+# ---------------------------------------------------------------------------
+
+
+def partition_path(month: str) -> Path:
+    """'2025-11' -> data/archive/taric_live_2025_11.db"""
+    if not MONTH_RE.match(month):
+        raise ValueError(f"Ungültiger Monat '{month}', erwartet YYYY-MM")
+    return ARCHIVE_DIR / f"taric_live_{month.replace('-', '_')}.db"
+
+
+def list_partitions() -> List[str]:
+    """Liefert alle vorhandenen Monatspartitionen (YYYY-MM), aufsteigend sortiert."""
+    if not ARCHIVE_DIR.exists():
+        return []
+    months = []
+    for p in ARCHIVE_DIR.glob("taric_live_*_*.db"):
+        m = re.match(r"^taric_live_(\d{4})_(\d{2})\.db$", p.name)
+        if m:
+            months.append(f"{m.group(1)}-{m.group(2)}")
+    return sorted(months)
+
+
+def cutoff_month(older_than_months: int, today: Optional[datetime.date] = None) -> str:
+    """Erster Monat, der in der Live-DB bleibt (YYYY-MM)."""
+    today = today or datetime.date.today()
+    idx = today.year * 12 + (today.month - 1) - older_than_months
+    return f"{idx // 12:04d}-{idx % 12 + 1:02d}"
+
+
+def _columns(conn: sqlite3.Connection, schema: str, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def _ensure_table_like(conn: sqlite3.Connection, src_schema: str, dst_schema: str, table: str) -> None:
+    """Legt `table` in dst_schema mit der CREATE-Anweisung aus src_schema an (falls fehlend)."""
+    if _columns(conn, dst_schema, table):
+        return
+    row = conn.execute(
+        f"SELECT sql FROM {src_schema}.sqlite_master WHERE type = 'table' AND name = ?",
+        (table,),
+    ).fetchone()
+    if not row or not row[0]:
+        return
+    create_sql = re.sub(
+        r"^CREATE TABLE\s+(IF NOT EXISTS\s+)?[\"']?" + re.escape(table) + r"[\"']?",
+        f"CREATE TABLE {dst_schema}.{table}",
+        row[0].strip(),
+        flags=re.IGNORECASE,
+    )
+    conn.execute(create_sql)
+
+
+def _copy_rows(
+    conn: sqlite3.Connection,
+    table: str,
+    src_schema: str,
+    dst_schema: str,
+    where_sql: str,
+    params: Iterable,
+) -> int:
+    """Kopiert Zeilen zwischen zwei Schemas über die gemeinsamen Spalten."""
+    src_cols = _columns(conn, src_schema, table)
+    dst_cols = set(_columns(conn, dst_schema, table))
+    cols = ", ".join(c for c in src_cols if c in dst_cols)
+    if not cols:
+        return 0
+    cur = conn.execute(
+        f"INSERT OR REPLACE INTO {dst_schema}.{table} ({cols}) "
+        f"SELECT {cols} FROM {src_schema}.{table} WHERE {where_sql}",
+        tuple(params),
+    )
+    return cur.rowcount
+
+
+def _move_month(conn: sqlite3.Connection, month: str, src: str, dst: str) -> Dict[str, int]:
+    """
+    Verschiebt alle taric_live-Zeilen eines Monats (plus Bewertungen und Blobs)
+    von Schema `src` nach Schema `dst`. Läuft in der Transaktion des Aufrufers.
+    """
+    for table in ARCHIVED_TABLES:
+        _ensure_table_like(conn, src, dst, table)
+
+    conn.execute("DROP TABLE IF EXISTS temp.archive_ids")
+    conn.execute("CREATE TEMP TABLE archive_ids (id INTEGER PRIMARY KEY)")
+    conn.execute(
+        f"INSERT INTO temp.archive_ids SELECT id FROM {src}.taric_live WHERE substr(created_at, 1, 7) = ?",
+        (month,),
+    )
+
+    counts = {
+        "taric_live": _copy_rows(
+            conn, "taric_live", src, dst, "id IN (SELECT id FROM temp.archive_ids)", ()
+        ),
+        "taric_evaluation": 0,
+        "taric_blob": 0,
+    }
+    if _columns(conn, src, "taric_evaluation"):
+        counts["taric_evaluation"] = _copy_rows(
+            conn,
+            "taric_evaluation",
+            src,
+            dst,
+            "taric_live_id IN (SELECT id FROM temp.archive_ids)",
+            (),
+        )
+        conn.execute(
+            f"DELETE FROM {src}.taric_evaluation WHERE taric_live_id IN (SELECT id FROM temp.archive_ids)"
+        )
+    if _columns(conn, src, "taric_blob"):
+        counts["taric_blob"] = _copy_rows(
+            conn,
+            "taric_blob",
+            src,
+            dst,
+            "owner_table = 'taric_live' AND owner_id IN (SELECT id FROM temp.archive_ids)",
+            (),
+        )
+        conn.execute(
+            f"DELETE FROM {src}.taric_blob "
+            "WHERE owner_table = 'taric_live' AND owner_id IN (SELECT id FROM temp.archive_ids)"
+        )
+    conn.execute(f"DELETE FROM {src}.taric_live WHERE id IN (SELECT id FROM temp.archive_ids)")
+    conn.execute("DROP TABLE temp.archive_ids")
+    return counts
+
+
+def _connect_live() -> sqlite3.Connection:
+    if not DB_PATH.exists():
+        raise SystemExit(f"DB '{DB_PATH}' nicht gefunden – bitte Pfad prüfen.")
+    conn = sqlite3.connect(str(DB_PATH))
+    conn.row_factory = sqlite3.Row
+    # Explizite Transaktionen (BEGIN/COMMIT) über alle angehängten Dateien
+    conn.isolation_level = None
+    return conn
+
+
+# ---------------------------------------------------------------------------
+# Archivieren / Re-Hydrieren
+# ---------------------------------------------------------------------------
+
+
+def archive_older_than(older_than_months: int, dry_run: bool = False) -> Dict[str, Dict[str, int]]:
+    """
+    Verschiebt alle Monate vor cutoff_month(older_than_months) in Monatsdateien.
+    Jeder Monat wird atomar (eine Transaktion über Live-DB + Partition) verschoben.
+    """
+    keep_from = cutoff_month(older_than_months)
+    conn = _connect_live()
+    ensure_blob_schema(conn)
+    result: Dict[str, Dict[str, int]] = {}
+
+    try:
+        months = [
+            r[0]
+            for r in conn.execute(
+                """
+                SELECT DISTINCT substr(created_at, 1, 7) AS month
+                  FROM taric_live
+                 WHERE created_at IS NOT NULL AND substr(created_at, 1, 7) < ?
+                 ORDER BY month
+                """,
+                (keep_from,),
+            )
+            if r[0] and MONTH_RE.match(r[0])
+        ]
+
+        for month in months:
+            if dry_run:
+                n = conn.execute(
+                    "SELECT COUNT(*) FROM taric_live WHERE substr(created_at, 1, 7) = ?", (month,)
+                ).fetchone()[0]
+                result[month] = {"taric_live": n}
+                continue
+
+            ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+            conn.execute("ATTACH DATABASE ? AS part", (str(partition_path(month)),))
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    result[month] = _move_month(conn, month, "main", "part")
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            finally:
+                conn.execute("DETACH DATABASE part")
+    finally:
+        conn.close()
+
+    return result
+
+
+def rehydrate(month: str) -> Dict[str, int]:
+    """Verschiebt eine Monatspartition zurück in die Live-DB und löscht die Datei."""
+    path = partition_path(month)
+    if not path.exists():
+        raise SystemExit(f"Partition {month} nicht gefunden: {path}")
+
+    conn = _connect_live()
+    ensure_blob_schema(conn)
+    try:
+        conn.execute("ATTACH DATABASE ? AS part", (str(path),))
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                counts = _move_month(conn, month, "part", "main")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.execute("DETACH DATABASE part")
+    finally:
+        conn.close()
+
+    path.unlink()
+    return counts
+
+
+# ---------------------------------------------------------------------------
+# Query-Layer
+# ---------------------------------------------------------------------------
+
+
+def _attach_limit(conn: sqlite3.Connection) -> int:
+    """Anzahl gleichzeitig anhängbarer DBs dieser SQLite-Version (Fallback MAX_ATTACHED)."""
+    try:
+        return conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    except AttributeError:  # Python < 3.11
+        return MAX_ATTACHED
+
+
+def select_partitions(months: Optional[Iterable[str]], limit: int) -> Tuple[List[str], List[str]]:
+    """
+    (anzuhängende, ausgelassene) Monate: die gewünschten (None = alle vorhandenen),
+    bei mehr als `limit` nur die jüngsten.
+    """
+    available = set(list_partitions())
+    wanted = sorted(available if months is None else set(months))
+    missing = [m for m in wanted if m not in available]
+    if missing:
+        raise ValueError(f"Partition(en) nicht vorhanden: {', '.join(missing)}")
+    if len(wanted) <= limit:
+        return wanted, []
+    return wanted[len(wanted) - limit :], wanted[: len(wanted) - limit]
+
+
+def open_with_archive(months: Optional[Iterable[str]] = None) -> sqlite3.Connection:
+    """
+    Öffnet die Live-DB und hängt die gewünschten Monatspartitionen an
+    (None = alle vorhandenen). Passen nicht alle gleichzeitig (SQLite-Limit für
+    ATTACH, meist 10), werden nur die jüngsten angehängt und die übrigen mit
+    Warnung ausgelassen – ältere Monate dann gezielt abfragen.
+
+    Bereitgestellte TEMP-Views (über gemeinsame Spalten):
+    - taric_live_all       = main.taric_live       UNION ALL Partitionen
+    - taric_evaluation_all = main.taric_evaluation UNION ALL Partitionen
+    """
+    conn = sqlite3.connect(str(DB_PATH))
+    conn.row_factory = sqlite3.Row
+
+    try:
+        wanted, skipped = select_partitions(months, _attach_limit(conn))
+    except ValueError:
+        conn.close()
+        raise
+    if skipped:
+        logger.warning(
+            "Nur %d Partitionen gleichzeitig anhängbar – ausgelassen: %s",
+            len(wanted), ", ".join(skipped),
+        )
+
+    schemas = ["main"]
+    for month in wanted:
+        alias = "p_" + month.replace("-", "_")
+        conn.execute("ATTACH DATABASE ? AS " + alias, (str(partition_path(month)),))
+        schemas.append(alias)
+
+    for table in ("taric_live", "taric_evaluation"):
+        present = [s for s in schemas if _columns(conn, s, table)]
+        if not present:
+            continue
+        common = [c for c in _columns(conn, "main", table) if all(c in _columns(conn, s, table) for s in present)]
+        cols = ", ".join(common)
+        union = " UNION ALL ".join(f"SELECT {cols} FROM {s}.{table}" for s in present)
+        conn.execute(f"CREATE TEMP VIEW {table}_all AS {union}")
+
+    return conn
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+
+def _cmd_list(_args: argparse.Namespace) -> None:
+    months = list_partitions()
+    if not months:
+        print(f"Keine Partitionen in {ARCHIVE_DIR}")
+        return
+    print(f"{'Monat':<8} {'taric_live':>10} {'evaluation':>10} {'Größe (KB)':>11}")
+    for month in months:
+        path = partition_path(month)
+        with sqlite3.connect(str(path)) as conn:
+            live = conn.execute("SELECT COUNT(*) FROM taric_live").fetchone()[0]
+            try:
+                evals = conn.execute("SELECT COUNT(*) FROM taric_evaluation").fetchone()[0]
+            except sqlite3.OperationalError:
+                evals = 0
+        print(f"{month:<8} {live:>10} {evals:>10} {path.stat().st_size // 1024:>11}")
+
+
+def _cmd_archive(args: argparse.Namespace) -> None:
+    result = archive_older_than(args.older_than_months, dry_run=args.dry_run)
+    if not result:
+        print(f"Nichts zu archivieren (behalte ab {cutoff_month(args.older_than_months)}).")
+        return
+    for month, counts in result.items():
+        prefix = "[DRY-RUN] " if args.dry_run else ""
+        print(f"{prefix}{month}: " + ", ".join(f"{k}={v}" for k, v in counts.items()))
+
+
+def _cmd_attach(args: argparse.Namespace) -> None:
+    logging.basicConfig(level=logging.WARNING, format="[%(levelname)s] %(message)s")
+    conn = open_with_archive(args.months or None)
+    try:
+        cur = conn.execute(args.sql)
+        if cur.description:
+            print("\t".join(d[0] for d in cur.description))
+            for row in cur:
+                print("\t".join("" if v is None else str(v) for v in row))
+    finally:
+        conn.close()
+
+
+def _cmd_rehydrate(args: argparse.Namespace) -> None:
+    for month in args.months:
+        counts = rehydrate(month)
+        print(f"{month}: " + ", ".join(f"{k}={v}" for k, v in counts.items()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Monatsarchiv für taric_live verwalten.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_list = sub.add_parser("list", help="Vorhandene Monatspartitionen anzeigen")
+    p_list.set_defaults(func=_cmd_list)
+
+    p_archive = sub.add_parser("archive", help="Alte Monate aus der Live-DB auslagern")
+    p_archive.add_argument("--older-than-months", type=int, default=6)
+    p_archive.add_argument("--dry-run", action="store_true")
+    p_archive.set_defaults(func=_cmd_archive)
+
+    p_attach = sub.add_parser("attach", help="Partitionen anhängen und SQL auf *_all-Views ausführen")
+    p_attach.add_argument("months", nargs="*", help="YYYY-MM (leer = alle)")
+    p_attach.add_argument(
+        "--sql",
+        default="SELECT substr(created_at, 1, 7) AS month, COUNT(*) AS n FROM taric_live_all GROUP BY month",
+    )
+    p_attach.set_defaults(func=_cmd_attach)
+
+    p_rehydrate = sub.add_parser("rehydrate", help="Partition(en) zurück in die Live-DB holen")
+    p_rehydrate.add_argument("months", nargs="+", help="YYYY-MM")
+    p_rehydrate.set_defaults(func=_cmd_rehydrate)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
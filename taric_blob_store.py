@@ -0,0 +1,170 @@
+"""
+taric_blob_store.py
+
+Verantwortung:
+- Komprimierte Ablage großer Text-Blobs außerhalb der "heißen" Tabellen
+  (Modell-Rohantworten aus taric_live, EU-HTML aus taric_official_cache)
+- Seitentabelle taric_blob in taric_live.db, Schlüssel (owner_table, owner_id, kind)
+- Standard-Codec zlib (stdlib), damit jede Kopie der DB ohne Zusatzpaket lesbar bleibt;
+  zstd nur per TARIC_BLOB_CODEC=zstd (Paket `zstandard` dann auf allen lesenden Hosts nötig)
+- Dekomprimierung erst beim Detailzugriff (get_blob / get_blobs)
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+import os
+import sqlite3
+import time
+import zlib
+
+try:
+    import zstandard  # optional, bessere Kompression/Geschwindigkeit
+except ImportError:  # Fallback: nur zlib
+    zstandard = None
+
+CODEC_ZLIB = "zlib"
+CODEC_ZSTD = "zstd"
+
+# Default-Codec: zlib; zstd ist opt-in (und greift nur, wenn `zstandard` installiert ist)
+_WANT_ZSTD = os.getenv("TARIC_BLOB_CODEC", CODEC_ZLIB).strip().lower() == CODEC_ZSTD
+DEFAULT_CODEC = CODEC_ZSTD if _WANT_ZSTD and zstandard is not None else CODEC_ZLIB
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 10
+
+# Bekannte Blob-Arten
+KIND_RAW_RESPONSE = "raw_response"
+KIND_OFFICIAL_HTML = "official_html"
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS taric_blob (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    owner_table TEXT NOT NULL,
+    owner_id    INTEGER NOT NULL,
+    kind        TEXT NOT NULL,
+    codec       TEXT NOT NULL,
+    raw_size    INTEGER NOT NULL,
+    data        BLOB NOT NULL,
+    created_at  TEXT NOT NULL,
+    UNIQUE (owner_table, owner_id, kind)
+);
+"""
+
+
+def ensure_blob_schema(conn: sqlite3.Connection) -> None:
+    """Legt die Tabelle taric_blob an (falls nicht vorhanden)."""
+    conn.executescript(SCHEMA_SQL)
+
+
+def compress_text(text: str, codec: str = DEFAULT_CODEC) -> Tuple[str, bytes]:
+    """Komprimiert einen Text und gibt (codec, daten) zurück."""
+    raw = text.encode("utf-8")
+    if codec == CODEC_ZSTD and zstandard is not None:
+        return CODEC_ZSTD, zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return CODEC_ZLIB, zlib.compress(raw, ZLIB_LEVEL)
+
+
+def decompress_text(codec: str, data: bytes) -> str:
+    """Gegenstück zu compress_text()."""
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Blob ist zstd-komprimiert, aber 'zstandard' ist nicht installiert")
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    elif codec == CODEC_ZLIB:
+        raw = zlib.decompress(data)
+    else:
+        raise ValueError(f"Unbekannter Blob-Codec: {codec}")
+    return raw.decode("utf-8")
+
+
+def put_blob(
+    conn: sqlite3.Connection,
+    owner_table: str,
+    owner_id: int,
+    kind: str,
+    text: Optional[str],
+) -> None:
+    """
+    Schreibt (oder ersetzt) einen Blob. Kein Commit – läuft in der
+    Transaktion des Aufrufers mit. Leere Texte werden nicht gespeichert.
+    """
+    if not text:
+        return
+    codec, data = compress_text(text)
+    conn.execute(
+        """
+        INSERT INTO taric_blob (owner_table, owner_id, kind, codec, raw_size, data, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(owner_table, owner_id, kind) DO UPDATE SET
+            codec      = excluded.codec,
+            raw_size   = excluded.raw_size,
+            data       = excluded.data,
+            created_at = excluded.created_at
+        """,
+        (
+            owner_table,
+            owner_id,
+            kind,
+            codec,
+            len(text.encode("utf-8")),
+            sqlite3.Binary(data),
+            time.strftime("%Y-%m-%d %H:%M:%S"),
+        ),
+    )
+
+
+def get_blob(
+    conn: sqlite3.Connection,
+    owner_table: str,
+    owner_id: int,
+    kind: str,
+) -> Optional[str]:
+    """Liest und dekomprimiert einen einzelnen Blob (None, wenn nicht vorhanden)."""
+    row = conn.execute(
+        """
+        SELECT codec, data
+          FROM taric_blob
+         WHERE owner_table = ? AND owner_id = ? AND kind = ?
+        """,
+        (owner_table, owner_id, kind),
+    ).fetchone()
+    if not row:
+        return None
+    return decompress_text(row[0], row[1])
+
+
+def get_blobs(
+    conn: sqlite3.Connection,
+    owner_table: str,
+    owner_ids: Iterable[int],
+    kind: str,
+) -> Dict[int, str]:
+    """Liest mehrere Blobs einer Art auf einmal: {owner_id: text}."""
+    ids: List[int] = list(owner_ids)
+    result: Dict[int, str] = {}
+    # SQLite-Parameterlimit respektieren
+    for start in range(0, len(ids), 500):
+        chunk = ids[start : start + 500]
+        placeholders = ", ".join("?" for _ in chunk)
+        rows = conn.execute(
+            f"""
+            SELECT owner_id, codec, data
+              FROM taric_blob
+             WHERE owner_table = ? AND kind = ? AND owner_id IN ({placeholders})
+            """,
+            (owner_table, kind, *chunk),
+        ).fetchall()
+        for owner_id, codec, data in rows:
+            result[owner_id] = decompress_text(codec, data)
+    return result
+
+
+def delete_blobs(conn: sqlite3.Connection, owner_table: str, owner_ids: Iterable[int]) -> None:
+    """Löscht alle Blobs der angegebenen Besitzer-Zeilen (ohne Commit)."""
+    ids = list(owner_ids)
+    for start in range(0, len(ids), 500):
+        chunk = ids[start : start + 500]
+        placeholders = ", ".join("?" for _ in chunk)
+        conn.execute(
+            f"DELETE FROM taric_blob WHERE owner_table = ? AND owner_id IN ({placeholders})",
+            (owner_table, *chunk),
+        )
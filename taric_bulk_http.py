@@ -0,0 +1,170 @@
+"""
+taric_bulk_http.py
+
+Verantwortung:
+- Gemeinsamer, gepoolter HTTP-Zugang der Bulk-Clients (bulk-evaluation.py,
+  bulk_evaluation_watcher.py) zum Backend (TARIC_BACKEND_URL)
+- Keep-Alive statt neuem TCP-/TLS-Handshake pro Bild (wichtig hinter Cloudflare-Tunneln)
+- Transport wählbar:
+    requests  – requests.Session mit HTTPAdapter (Standard)
+    httpx     – httpx.Client, HTTP/2 wenn das Paket `h2` installiert ist
+                (pip install "httpx[http2]"), sonst HTTP/1.1
+- Kennzahlen zur Verbindungswiederverwendung (Requests vs. neu aufgebaute Verbindungen)
+
+Öffentliche Funktionen: get_transport(), close_transport()
+"""
+
+from typing import Any, Dict, Optional
+import logging
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# "requests" oder "httpx"
+HTTP_TRANSPORT = os.getenv("TARIC_BULK_HTTP_TRANSPORT", "requests").lower()
+# Anzahl Host-Pools bzw. Verbindungen je Host
+POOL_CONNECTIONS = int(os.getenv("TARIC_BULK_POOL_CONNECTIONS", "4"))
+POOL_MAXSIZE = int(os.getenv("TARIC_BULK_POOL_MAXSIZE", "16"))
+# Leerlaufzeit, nach der httpx Keep-Alive-Verbindungen schließt
+KEEPALIVE_EXPIRY_S = float(os.getenv("TARIC_BULK_KEEPALIVE_EXPIRY_S", "60"))
+HTTP2_ENABLED = os.getenv("TARIC_BULK_HTTP2", "1") not in ("0", "false", "no")
+
+
+class RequestsTransport:
+    """requests.Session mit gemeinsamem Verbindungspool (thread-sicher für einfache Requests)."""
+
+    name = "requests"
+
+    def __init__(self) -> None:
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+    def get(self, url: str, **kwargs: Any):
+        return self.session.get(url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any):
+        return self.session.post(url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        pools = self.adapter.poolmanager.pools
+        requests_total = 0
+        connections = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            requests_total += getattr(pool, "num_requests", 0)
+            connections += getattr(pool, "num_connections", 0)
+        return _stats(self.name, "HTTP/1.1", requests_total, connections)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class HttpxTransport:
+    """httpx.Client (HTTP/2, falls verfügbar); zählt Verbindungen über die trace-Extension."""
+
+    name = "httpx"
+
+    def __init__(self) -> None:
+        import httpx
+
+        http2 = HTTP2_ENABLED
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("Paket 'h2' fehlt – httpx läuft mit HTTP/1.1")
+                http2 = False
+        self.http2 = http2
+        self.client = httpx.Client(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=POOL_MAXSIZE,
+                max_keepalive_connections=POOL_MAXSIZE,
+                keepalive_expiry=KEEPALIVE_EXPIRY_S,
+            ),
+        )
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._connections = 0
+        self._http_versions: Dict[str, int] = {}
+
+    def _trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self._connections += 1
+
+    def _request(self, method: str, url: str, **kwargs: Any):
+        files = kwargs.pop("files", None)
+        resp = self.client.request(
+            method, url, files=files, extensions={"trace": self._trace}, **kwargs
+        )
+        with self._lock:
+            self._requests += 1
+            self._http_versions[resp.http_version] = self._http_versions.get(resp.http_version, 0) + 1
+        return resp
+
+    def get(self, url: str, **kwargs: Any):
+        return self._request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any):
+        return self._request("POST", url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            versions = ", ".join(f"{v}: {n}" for v, n in sorted(self._http_versions.items()))
+            return _stats(self.name, versions or ("HTTP/2" if self.http2 else "HTTP/1.1"),
+                          self._requests, self._connections)
+
+    def close(self) -> None:
+        self.client.close()
+
+
+def _stats(transport: str, protocol: str, requests_total: int, connections: int) -> Dict[str, Any]:
+    reused = max(requests_total - connections, 0)
+    return {
+        "transport": transport,
+        "protocol": protocol,
+        "requests": requests_total,
+        "connections_opened": connections,
+        "reused_requests": reused,
+        "reuse_rate": round(reused / requests_total, 3) if requests_total else None,
+    }
+
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    rate = stats["reuse_rate"]
+    return (
+        f"HTTP ({stats['transport']}, {stats['protocol']}): {stats['requests']} Requests über "
+        f"{stats['connections_opened']} Verbindungen"
+        + (f", Wiederverwendung {rate:.0%}" if rate is not None else "")
+    )
+
+
+_transport: Optional[Any] = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """Prozessweiter Transport (gemäß TARIC_BULK_HTTP_TRANSPORT)."""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = HttpxTransport() if HTTP_TRANSPORT == "httpx" else RequestsTransport()
+    return _transport
+
+
+def close_transport() -> None:
+    global _transport
+    with _transport_lock:
+        if _transport is not None:
+            _transport.close()
+            _transport = None
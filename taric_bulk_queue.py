@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+taric_bulk_queue.py
+
+Verantwortung:
+- Dauerhafte Arbeitswarteschlange für Bulk-Inputs (SQLite, data/taric_bulk_queue.db)
+  statt Verzeichnis-Verschiebungen als einzigem Zustand
+- Scanner: nimmt neue Dateien aus data/taric_bulk_input mit SHA-256-Inhaltshash auf
+  (gleicher Inhalt = gleicher Eintrag, auch unter anderem Dateinamen)
+- Worker leasen Einträge atomar (UPDATE … RETURNING in einer IMMEDIATE-Transaktion);
+  abgelaufene Leases (Absturz) werden beim nächsten Lauf wieder vergeben
+- Zustände: pending -> leased -> done | error | dead
+    error: dauerhafter Fehler (z.B. ungültiges Bild)
+    dead:  vorübergehender Fehler, aber maximale Versuche erreicht (Dead Letter);
+           bis dahin geht der Eintrag mit exponentiellem Backoff zurück nach pending
+           (available_at)
+
+Der Inhaltshash wird beim Klassifizieren als Idempotenz-Schlüssel an das Backend
+geschickt; wird ein Eintrag nach einem Absturz erneut geleast, liefert /classify
+das bereits gespeicherte Ergebnis statt einer zweiten Klassifikation.
+
+CLI:
+    python3 taric_bulk_queue.py status
+    python3 taric_bulk_queue.py scan
+    python3 taric_bulk_queue.py release-leases   # Leases sofort freigeben (nach Absturz)
+    python3 taric_bulk_queue.py dead             # Dead Letters auflisten
+
+Dead Letters samt Dateien zurück in den INPUT: python3 bulk-evaluation.py retry-errors
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+import hashlib
+import os
+import socket
+import sqlite3
+import time
+from pathlib import Path
+
+from taric_file_readiness import STABLE_SECONDS, is_temporary_name
+
+BASE_DIR = Path(__file__).resolve().parent
+QUEUE_DB_PATH = Path(
+    os.getenv("TARIC_BULK_QUEUE_DB", str(BASE_DIR / "data" / "taric_bulk_queue.db"))
+)
+INPUT_DIR = BASE_DIR / "data" / "taric_bulk_input"
+
+# Lease-Dauer in Sekunden; wird während eines Laufs regelmäßig verlängert
+LEASE_SECONDS = float(os.getenv("TARIC_BULK_LEASE_S", "900"))
+
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+# Beim Verzeichnis-Scan werden Dateien übersprungen, deren mtime jünger ist
+# (evtl. noch im Schreibvorgang) – gleiche Frist wie die Bereitschaftsprüfung des
+# Watchers; temporäre Namen (Punkt-Dateien, .part, .tmp, ...) nie
+MIN_FILE_AGE_SECONDS = float(os.getenv("TARIC_BULK_MIN_FILE_AGE_S", str(STABLE_SECONDS)))
+
+STATE_PENDING = "pending"
+STATE_LEASED = "leased"
+STATE_DONE = "done"
+STATE_ERROR = "error"
+STATE_DEAD = "dead"
+
+
+@dataclass(frozen=True)
+class QueueItem:
+    id: int
+    file_path: Path
+    content_hash: str
+    attempts: int
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BulkQueue:
+    def __init__(self, db_path: Path = QUEUE_DB_PATH) -> None:
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit; Transaktionen werden explizit mit BEGIN IMMEDIATE geöffnet
+        self.conn = sqlite3.connect(str(db_path), timeout=30.0, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.ensure_schema()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def ensure_schema(self) -> None:
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS bulk_queue (
+                id            INTEGER PRIMARY KEY AUTOINCREMENT,
+                file_path     TEXT NOT NULL,
+                file_size     INTEGER,
+                file_mtime    REAL,
+                content_hash  TEXT NOT NULL UNIQUE,
+                state         TEXT NOT NULL DEFAULT 'pending',
+                attempts      INTEGER NOT NULL DEFAULT 0,
+                lease_owner   TEXT,
+                lease_until   REAL,
+                last_error    TEXT,
+                result_id     INTEGER,
+                created_at    TEXT NOT NULL DEFAULT (datetime('now')),
+                updated_at    TEXT NOT NULL DEFAULT (datetime('now'))
+            );
+            CREATE INDEX IF NOT EXISTS idx_bulk_queue_state ON bulk_queue(state, lease_until, id);
+            CREATE INDEX IF NOT EXISTS idx_bulk_queue_path ON bulk_queue(file_path);
+            """
+        )
+        cols = {row["name"] for row in self.conn.execute("PRAGMA table_info(bulk_queue)")}
+        if "available_at" not in cols:
+            # Frühester Zeitpunkt für den nächsten Versuch (Backoff); NULL = sofort
+            self.conn.execute("ALTER TABLE bulk_queue ADD COLUMN available_at REAL")
+
+    # --- Scanner --------------------------------------------------------------
+
+    def scan(self, input_dir: Path = INPUT_DIR, paths: Optional[List[Path]] = None) -> Dict[str, List[Any]]:
+        """
+        Nimmt neue Dateien auf: ohne `paths` alle Dateien in input_dir außer temporären
+        Namen und Dateien, deren mtime jünger als MIN_FILE_AGE_SECONDS ist; mit `paths`
+        nur diese (vom Watcher als fertig geschrieben erkannten) Dateien. Rückgabe:
+        - "added": neu eingereihte Pfade
+        - "finished": (Pfad, Zustand) für Inhalte, die bereits fertig sind (done/error),
+          deren Datei aber noch im INPUT liegt (Absturz zwischen Abschluss und
+          Verschieben oder erneuter Upload)
+        """
+        result: Dict[str, List[Any]] = {"added": [], "finished": []}
+        if not input_dir.exists():
+            return result
+
+        known = {
+            r["file_path"]: r
+            for r in self.conn.execute(
+                "SELECT file_path, file_size, file_mtime, content_hash, state FROM bulk_queue "
+                "WHERE file_path LIKE ?",
+                (f"{input_dir}%",),
+            )
+        }
+
+        candidates = sorted(input_dir.iterdir()) if paths is None else sorted(
+            p for p in paths if p.parent == input_dir
+        )
+        for path in candidates:
+            if not path.is_file() or path.suffix.lower() not in ALLOWED_EXTENSIONS:
+                continue
+            if is_temporary_name(path):
+                continue
+            st = path.stat()
+            if paths is None and time.time() - st.st_mtime < MIN_FILE_AGE_SECONDS:
+                continue
+            row = known.get(str(path))
+            if row is not None and row["file_size"] == st.st_size and row["file_mtime"] == st.st_mtime:
+                content_hash = row["content_hash"]
+                state = row["state"]
+            else:
+                content_hash = file_sha256(path)
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    existing = self.conn.execute(
+                        "SELECT state FROM bulk_queue WHERE content_hash = ?", (content_hash,)
+                    ).fetchone()
+                    if existing is None:
+                        self.conn.execute(
+                            "INSERT INTO bulk_queue (file_path, file_size, file_mtime, content_hash) "
+                            "VALUES (?, ?, ?, ?)",
+                            (str(path), st.st_size, st.st_mtime, content_hash),
+                        )
+                        state = STATE_PENDING
+                        result["added"].append(path)
+                    else:
+                        state = existing["state"]
+                        # Offene Einträge folgen der Datei (z.B. nach Umbenennung)
+                        if state in (STATE_PENDING, STATE_LEASED):
+                            self.conn.execute(
+                                "UPDATE bulk_queue SET file_path = ?, file_size = ?, file_mtime = ?, "
+                                "updated_at = datetime('now') WHERE content_hash = ?",
+                                (str(path), st.st_size, st.st_mtime, content_hash),
+                            )
+                    self.conn.execute("COMMIT")
+                except Exception:
+                    self.conn.execute("ROLLBACK")
+                    raise
+            if state in (STATE_DONE, STATE_ERROR, STATE_DEAD):
+                result["finished"].append((path, state))
+        return result
+
+    # --- Leases ---------------------------------------------------------------
+
+    def lease(self, owner: str, limit: int = 1, lease_s: float = LEASE_SECONDS) -> List[QueueItem]:
+        """
+        Least bis zu `limit` Einträge (pending und fällig oder mit abgelaufener Lease),
+        älteste zuerst.
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.conn.execute(
+                """
+                UPDATE bulk_queue
+                   SET state = 'leased', lease_owner = ?, lease_until = ?,
+                       attempts = attempts + 1, updated_at = datetime('now')
+                 WHERE id IN (
+                        SELECT id FROM bulk_queue
+                         WHERE (state = 'pending' AND (available_at IS NULL OR available_at <= ?))
+                            OR (state = 'leased' AND lease_until < ?)
+                         ORDER BY id
+                         LIMIT ?
+                 )
+                RETURNING id, file_path, content_hash, attempts
+                """,
+                (owner, now + lease_s, now, now, limit),
+            ).fetchall()
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        items = [QueueItem(r["id"], Path(r["file_path"]), r["content_hash"], r["attempts"]) for r in rows]
+        return sorted(items, key=lambda item: item.id)
+
+    def renew(self, owner: str, lease_s: float = LEASE_SECONDS) -> None:
+        """Verlängert alle Leases eines Workers (z.B. nach jedem verarbeiteten Bild)."""
+        self.conn.execute(
+            "UPDATE bulk_queue SET lease_until = ? WHERE state = 'leased' AND lease_owner = ?",
+            (time.time() + lease_s, owner),
+        )
+
+    def _finish(self, item_id: int, owner: str, state: str, error: Optional[str], result_id: Optional[int]) -> bool:
+        cur = self.conn.execute(
+            """
+            UPDATE bulk_queue
+               SET state = ?, last_error = ?, result_id = COALESCE(?, result_id),
+                   lease_owner = NULL, lease_until = NULL, updated_at = datetime('now')
+             WHERE id = ? AND state = 'leased' AND lease_owner = ?
+            """,
+            (state, error, result_id, item_id, owner),
+        )
+        return cur.rowcount == 1
+
+    def complete(self, item_id: int, owner: str, result_id: Optional[int] = None) -> bool:
+        return self._finish(item_id, owner, STATE_DONE, None, result_id)
+
+    def fail(self, item_id: int, owner: str, error: Optional[str]) -> bool:
+        return self._finish(item_id, owner, STATE_ERROR, error, None)
+
+    def dead(self, item_id: int, owner: str, error: Optional[str]) -> bool:
+        return self._finish(item_id, owner, STATE_DEAD, error, None)
+
+    def retry_later(self, item_id: int, owner: str, error: Optional[str], delay_s: float) -> bool:
+        """Vorübergehender Fehler: zurück nach pending, frühestens in `delay_s` Sekunden."""
+        cur = self.conn.execute(
+            """
+            UPDATE bulk_queue
+               SET state = 'pending', last_error = ?, available_at = ?,
+                   lease_owner = NULL, lease_until = NULL, updated_at = datetime('now')
+             WHERE id = ? AND state = 'leased' AND lease_owner = ?
+            """,
+            (error, time.time() + delay_s, item_id, owner),
+        )
+        return cur.rowcount == 1
+
+    def release(
+        self, item_id: int, owner: str, error: Optional[str] = None, delay_s: float = 0.0
+    ) -> bool:
+        """
+        Zurück nach pending, ohne dass der Versuch zählt (z.B. Rate-Limit als
+        Gegendruck des Backends, Abbruch vor dem Senden); optional erst nach
+        `delay_s` Sekunden wieder leasbar (Retry-After).
+        """
+        cur = self.conn.execute(
+            """
+            UPDATE bulk_queue
+               SET state = 'pending', last_error = COALESCE(?, last_error),
+                   attempts = MAX(attempts - 1, 0), available_at = ?,
+                   lease_owner = NULL, lease_until = NULL, updated_at = datetime('now')
+             WHERE id = ? AND state = 'leased' AND lease_owner = ?
+            """,
+            (error, time.time() + delay_s if delay_s > 0 else None, item_id, owner),
+        )
+        return cur.rowcount == 1
+
+    def release_owner(self, owner: str) -> int:
+        """Gibt alle noch gehaltenen Leases eines Workers frei (Lauf-Ende, nicht gestartet)."""
+        cur = self.conn.execute(
+            """
+            UPDATE bulk_queue SET state = 'pending', attempts = MAX(attempts - 1, 0),
+                   lease_owner = NULL, lease_until = NULL, updated_at = datetime('now')
+             WHERE state = 'leased' AND lease_owner = ?
+            """,
+            (owner,),
+        )
+        return cur.rowcount
+
+    def release_all_leases(self) -> int:
+        cur = self.conn.execute(
+            "UPDATE bulk_queue SET state = 'pending', lease_owner = NULL, lease_until = NULL "
+            "WHERE state = 'leased'"
+        )
+        return cur.rowcount
+
+    def dead_letters(self, include_errors: bool = False, limit: int = -1) -> List[sqlite3.Row]:
+        """Dead Letters (optional inkl. dauerhafter Fehler), älteste zuerst."""
+        states = (STATE_DEAD, STATE_ERROR) if include_errors else (STATE_DEAD,)
+        return self.conn.execute(
+            f"""
+            SELECT id, file_path, state, attempts, last_error, updated_at
+              FROM bulk_queue
+             WHERE state IN ({", ".join("?" for _ in states)})
+             ORDER BY id
+             LIMIT ?
+            """,
+            (*states, limit),
+        ).fetchall()
+
+    def requeue(self, item_id: int) -> bool:
+        """Dead Letter / Fehler zurück nach pending mit frischem Versuchszähler."""
+        cur = self.conn.execute(
+            """
+            UPDATE bulk_queue
+               SET state = 'pending', attempts = 0, available_at = NULL,
+                   updated_at = datetime('now')
+             WHERE id = ? AND state IN ('dead', 'error')
+            """,
+            (item_id,),
+        )
+        return cur.rowcount == 1
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            r["state"]: r["n"]
+            for r in self.conn.execute("SELECT state, COUNT(*) AS n FROM bulk_queue GROUP BY state")
+        }
+
+
+def main() -> None:
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Bulk-Queue verwalten.")
+    parser.add_argument("command", choices=["status", "scan", "release-leases", "dead"])
+    args = parser.parse_args()
+
+    queue = BulkQueue()
+    try:
+        if args.command == "scan":
+            found = queue.scan()
+            print(f"{len(found['added'])} neu, {len(found['finished'])} bereits erledigt (noch im INPUT)")
+        elif args.command == "release-leases":
+            print(f"{queue.release_all_leases()} Leases freigegeben")
+        elif args.command == "dead":
+            for row in queue.dead_letters(include_errors=True):
+                print(
+                    f"{row['id']:>6}  {row['state']:<5}  {row['attempts']}x  "
+                    f"{Path(row['file_path']).name}  {row['last_error'] or ''}"
+                )
+        print(json.dumps(queue.counts(), indent=2))
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+taric_code_index.py
+
+Verantwortung:
+- Prozessweiter In-Memory-Index über taric_reference (sortiertes Code-Array + Dicts)
+- Antworten ohne DB-Roundtrip: Existiert ein Code? Vorfahren inkl. Beschreibung?
+  Gültige Kinder? Alle Codes/Blätter unter einem Präfix (bisect auf dem Array)?
+- Aufbau beim Start aus taric_live.db oder aus einer vorkompilierten Datei
+  (TARIC_CODE_INDEX_PATH, erzeugt mit `python3 taric_code_index.py build`)
+- load_taric_nomenclature.py schreibt bei jedem Lauf eine neue Version nach
+  taric_reference_meta; reload_code_index_if_changed() baut den Index dann neu
+  (eine vorkompilierte Datei mit anderer Version wird ignoriert)
+- Schlüssel ist (aufgefüllter Code, Stellenebene): '851712' und '85171200' ergeben
+  beide '8517120000', bleiben aber getrennte Einträge; Abfragen lösen die Ebene
+  über die Länge des angefragten Codes auf
+
+Öffentliche Funktionen: get_code_index(), reload_code_index(), reload_code_index_if_changed(),
+reference_version()
+"""
+
+from bisect import bisect_left
+from dataclasses import astuple, dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+import datetime
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent
+DB_PATH = Path(os.getenv("TARIC_DB_PATH", str(BASE_DIR / "taric_live.db")))
+INDEX_PATH = Path(os.getenv("TARIC_CODE_INDEX_PATH", str(BASE_DIR / "data" / "taric_code_index.pickle")))
+
+# Wird erhöht, wenn sich das Format der vorkompilierten Datei ändert
+INDEX_FORMAT_VERSION = 2
+
+PREFIX_LEVELS = (2, 4, 6, 8, 10)
+
+
+@dataclass(frozen=True)
+class TaricCodeEntry:
+    code: str
+    description_de: Optional[str] = None
+    description_en: Optional[str] = None
+    indent: Optional[int] = None
+    code_level: Optional[int] = None
+    parent_code: Optional[str] = None
+    is_leaf: Optional[bool] = None
+    valid_from: Optional[str] = None
+    valid_to: Optional[str] = None
+
+    @property
+    def level(self) -> int:
+        """Stellenebene (2/4/6/8/10); ohne code_level aus den signifikanten Stellen."""
+        return self.code_level or code_level(self.code)
+
+    def description(self, lang: str = "de") -> Optional[str]:
+        if (lang or "de").lower() == "en":
+            return self.description_en or self.description_de
+        return self.description_de or self.description_en
+
+    def is_valid_on(self, on_date: Optional[str]) -> bool:
+        """on_date als YYYY-MM-DD oder YYYYMMDD; None = immer gültig."""
+        if not on_date:
+            return True
+        if len(on_date) == 8 and on_date.isdigit():
+            on_date = f"{on_date[:4]}-{on_date[4:6]}-{on_date[6:]}"
+        if self.valid_from and self.valid_from > on_date:
+            return False
+        if self.valid_to and self.valid_to < on_date:
+            return False
+        return True
+
+    def to_dict(self) -> Dict:
+        return {
+            "taric_code": self.code,
+            "description_de": self.description_de,
+            "description_en": self.description_en,
+            "indent": self.indent,
+            "code_level": self.code_level,
+            "parent_code": self.parent_code,
+            "is_leaf": self.is_leaf,
+            "valid_from": self.valid_from,
+            "valid_to": self.valid_to,
+        }
+
+
+def normalize_code(code: str) -> Optional[str]:
+    """Präfix/Code auf 10 Stellen auffüllen ('8517' -> '8517000000'); None bei Ungültigem."""
+    code = (code or "").strip().replace(" ", "")
+    if not code.isdigit() or len(code) > 10 or len(code) < 2:
+        return None
+    return code.ljust(10, "0")
+
+
+def code_level(code: str) -> int:
+    """Anzahl signifikanter Stellen eines aufgefüllten Codes (2, 4, 6, 8 oder 10)."""
+    stripped = code.rstrip("0")
+    for level in PREFIX_LEVELS:
+        if len(stripped) <= level:
+            return level
+    return 10
+
+
+def _query(code: str) -> Tuple[Optional[str], int]:
+    """(aufgefüllter Code, angefragte Ebene = Anzahl übergebener Stellen)."""
+    norm = normalize_code(code)
+    if not norm:
+        return None, 0
+    return norm, len((code or "").strip().replace(" ", ""))
+
+
+def reference_version(db_path: Path) -> Optional[str]:
+    """Version der geladenen Nomenklatur (taric_reference_meta), None wenn unbekannt."""
+    if not db_path.exists():
+        return None
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            row = conn.execute(
+                "SELECT value FROM taric_reference_meta WHERE key = 'version'"
+            ).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return row[0] if row else None
+
+
+class TaricCodeIndex:
+    """Unveränderlicher Index über alle Codes aus taric_reference."""
+
+    def __init__(self, entries: Iterable[TaricCodeEntry], version: Optional[str] = None) -> None:
+        self.version = version
+        # aufgefüllter Code -> Einträge je Ebene (aufsteigend); eine Zeile pro (Code, Ebene)
+        by_key: Dict[Tuple[str, int], TaricCodeEntry] = {(e.code, e.level): e for e in entries}
+        self._entries: Dict[str, List[TaricCodeEntry]] = {}
+        for key in sorted(by_key):
+            self._entries.setdefault(key[0], []).append(by_key[key])
+        self._codes: List[str] = sorted(self._entries)
+        self._children: Dict[Tuple[str, int], List[TaricCodeEntry]] = {}
+        for code in self._codes:
+            for entry in self._entries[code]:
+                parent = self._parent(entry)
+                if parent is not None:
+                    self._children.setdefault((parent.code, parent.level), []).append(entry)
+        self._size = len(by_key)
+        self._inferred_leaves = self._infer_leaves()
+        self.built_at = time.time()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _resolve(self, norm: str, max_level: int) -> Optional[TaricCodeEntry]:
+        """Eintrag zum aufgefüllten Code mit der höchsten Ebene <= max_level."""
+        found = None
+        for entry in self._entries.get(norm, ()):
+            if entry.level > max_level:
+                break
+            found = entry
+        return found
+
+    def _parent(self, entry: TaricCodeEntry) -> Optional[TaricCodeEntry]:
+        if not entry.parent_code:
+            return None
+        parent = self._resolve(entry.parent_code, entry.level - 1)
+        if parent is None and entry.parent_code != entry.code:
+            parent = self._resolve(entry.parent_code, 10)
+        return parent
+
+    # --- Einzelabfragen -----------------------------------------------------
+
+    def get(self, code: str) -> Optional[TaricCodeEntry]:
+        """
+        Eintrag zum Code; die Ebene ergibt sich aus der Länge ('851712' -> Ebene 6,
+        '85171200' -> Ebene 8, 10 Stellen -> tiefster Eintrag des Codes).
+        """
+        norm, level = _query(code)
+        return self._resolve(norm, level) if norm else None
+
+    def exists(self, code: str, on_date: Optional[str] = None) -> bool:
+        entry = self.get(code)
+        return entry is not None and entry.is_valid_on(on_date)
+
+    def describe(self, prefix: str, lang: str = "de", on_date: Optional[str] = None) -> Optional[str]:
+        """Beschreibung der Zeile zum Präfix (z.B. '8517' -> Zeile 8517000000, Ebene 4)."""
+        entry = self.get(prefix)
+        if entry is None or not entry.is_valid_on(on_date):
+            return None
+        return entry.description(lang)
+
+    # --- Hierarchie ---------------------------------------------------------
+
+    def ancestors(self, code: str) -> List[TaricCodeEntry]:
+        """
+        Vorfahren (Wurzel zuerst) über parent_code; falls die Referenz keine
+        Hierarchie enthält (z.B. nur Testdaten), über die Präfixe 2/4/6/8.
+        """
+        norm, level = _query(code)
+        if not norm:
+            return []
+        entry = self._resolve(norm, level)
+        chain: List[TaricCodeEntry] = []
+        if entry is not None and entry.parent_code:
+            seen = {(entry.code, entry.level)}
+            parent = self._parent(entry)
+            while parent is not None and (parent.code, parent.level) not in seen:
+                seen.add((parent.code, parent.level))
+                chain.append(parent)
+                parent = self._parent(parent)
+            return list(reversed(chain))
+
+        own_level = entry.level if entry is not None else level
+        for prefix_level in PREFIX_LEVELS[:-1]:
+            if prefix_level >= own_level:
+                break
+            candidate = self._resolve(norm[:prefix_level].ljust(10, "0"), prefix_level)
+            if candidate is not None and candidate is not entry and (not chain or chain[-1] is not candidate):
+                chain.append(candidate)
+        return chain
+
+    def children(self, code: str, on_date: Optional[str] = None) -> List[TaricCodeEntry]:
+        entry = self.get(code)
+        if entry is None:
+            return []
+        return [c for c in self._children.get((entry.code, entry.level), []) if c.is_valid_on(on_date)]
+
+    def codes_with_prefix(self, prefix: str) -> List[str]:
+        """Alle Codes, die mit `prefix` beginnen (sortiert, per bisect)."""
+        prefix = (prefix or "").strip()
+        if not prefix.isdigit():
+            return []
+        start = bisect_left(self._codes, prefix)
+        result: List[str] = []
+        for code in self._codes[start:]:
+            if not code.startswith(prefix):
+                break
+            result.append(code)
+        return result
+
+    def leaves_under(self, prefix: str, on_date: Optional[str] = None) -> List[TaricCodeEntry]:
+        """Gültige Blatt-Codes (deklarierbare Zeilen) unter einem Präfix."""
+        result = []
+        for code in self.codes_with_prefix(prefix):
+            for entry in self._entries[code]:
+                if entry.is_valid_on(on_date) and self._is_leaf(entry):
+                    result.append(entry)
+        return result
+
+    def _infer_leaves(self) -> set:
+        """
+        Blätter für Zeilen ohne is_leaf (Referenz vor load_taric_nomenclature.py),
+        einmal beim Aufbau: Codes ohne Nachkommen gelten als Blatt. Ein Code ist der
+        kleinste mit seinem signifikanten Präfix – Nachkommen gibt es genau dann,
+        wenn der nächste Code im sortierten Array mit diesem Präfix beginnt.
+        Von mehreren Ebenen eines Codes kann nur die tiefste ein Blatt sein.
+        """
+        leaves = set()
+        for pos, code in enumerate(self._codes):
+            entry = self._entries[code][-1]
+            if entry.is_leaf is not None:
+                continue
+            significant = code[: max(2, entry.level)]
+            following = self._codes[pos + 1] if pos + 1 < len(self._codes) else ""
+            if not following.startswith(significant):
+                leaves.add((code, entry.level))
+        return leaves
+
+    def _is_leaf(self, entry: TaricCodeEntry) -> bool:
+        if entry.is_leaf is not None:
+            return entry.is_leaf
+        return (entry.code, entry.level) in self._inferred_leaves
+
+    # --- Persistenz -----------------------------------------------------------
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with tmp.open("wb") as fh:
+            pickle.dump(
+                # Tupel statt Dataclass-Instanzen: unabhängig vom Modulnamen (__main__) ladbar
+                {
+                    "version": INDEX_FORMAT_VERSION,
+                    "reference_version": self.version,
+                    "entries": [astuple(e) for entries in self._entries.values() for e in entries],
+                },
+                fh,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "TaricCodeIndex":
+        with path.open("rb") as fh:
+            payload = pickle.load(fh)
+        if payload.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Index-Datei {path} hat veraltetes Format")
+        return cls(
+            (TaricCodeEntry(*values) for values in payload["entries"]),
+            version=payload.get("reference_version"),
+        )
+
+    @classmethod
+    def from_db(cls, db_path: Path) -> "TaricCodeIndex":
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            cols = {row[1] for row in conn.execute("PRAGMA table_info(taric_reference)")}
+            if not cols:
+                return cls([])
+            wanted = [
+                "taric_code", "description_de", "description_en", "indent", "code_level",
+                "parent_code", "is_leaf", "valid_from", "valid_to",
+            ]
+            select = ", ".join(c if c in cols else f"NULL AS {c}" for c in wanted)
+            rows = conn.execute(f"SELECT {select} FROM taric_reference").fetchall()
+        finally:
+            conn.close()
+        version = reference_version(db_path)
+
+        entries = []
+        for row in rows:
+            raw = (row[0] or "").strip().replace(" ", "")
+            code = normalize_code(raw)
+            if not code:
+                continue
+            # Ebene: explizit kurze Codes ('851712') zählen mit ihrer Länge, sonst code_level
+            level = len(raw) if len(raw) < 10 else row[4]
+            entries.append(
+                TaricCodeEntry(
+                    code=code,
+                    description_de=row[1],
+                    description_en=row[2],
+                    indent=row[3],
+                    code_level=level,
+                    parent_code=row[5],
+                    is_leaf=None if row[6] is None else bool(row[6]),
+                    valid_from=row[7],
+                    valid_to=row[8],
+                )
+            )
+        return cls(entries, version=version)
+
+
+# ---------------------------------------------------------------------------
+# Prozessweiter Singleton
+# ---------------------------------------------------------------------------
+
+_index: Optional[TaricCodeIndex] = None
+_index_lock = threading.Lock()
+
+
+def _build_index() -> TaricCodeIndex:
+    db_version = reference_version(DB_PATH)
+    if INDEX_PATH.exists():
+        try:
+            index = TaricCodeIndex.load(INDEX_PATH)
+            if db_version is None or index.version == db_version:
+                logger.info("TARIC-Code-Index geladen: %s (%d Codes)", INDEX_PATH, len(index))
+                return index
+            logger.warning(
+                "Index-Datei %s ist veraltet (Nomenklatur %s, DB %s) – baue aus DB",
+                INDEX_PATH, index.version, db_version,
+            )
+        except Exception as exc:
+            logger.warning("Index-Datei %s nicht nutzbar (%s) – baue aus DB", INDEX_PATH, exc)
+    if not DB_PATH.exists():
+        return TaricCodeIndex([])
+    try:
+        index = TaricCodeIndex.from_db(DB_PATH)
+    except sqlite3.Error as exc:
+        logger.warning("TARIC-Code-Index konnte nicht aus DB gebaut werden: %s", exc)
+        return TaricCodeIndex([])
+    logger.info("TARIC-Code-Index aus DB gebaut: %d Codes", len(index))
+    return index
+
+
+def get_code_index() -> TaricCodeIndex:
+    """Liefert den prozessweiten Index (wird beim ersten Aufruf gebaut/geladen)."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = _build_index()
+    return _index
+
+
+def reload_code_index() -> TaricCodeIndex:
+    """Baut den Index neu (z.B. nach load_taric_nomenclature.py)."""
+    global _index
+    index = _build_index()
+    with _index_lock:
+        _index = index
+    return index
+
+
+def reload_code_index_if_changed() -> bool:
+    """
+    Baut den Index neu, wenn sich die Nomenklatur-Version in der DB geändert hat
+    (billige PK-Abfrage, für periodischen Aufruf). True, wenn neu geladen wurde.
+    """
+    current = _index
+    if current is None:
+        return False
+    version = reference_version(DB_PATH)
+    if version is None or version == current.version:
+        return False
+    index = reload_code_index()
+    logger.info("TARIC-Code-Index neu geladen: Version %s (%d Codes)", index.version, len(index))
+    return True
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="TARIC-Code-Index vorkompilieren / abfragen.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help=f"Index aus taric_reference bauen und nach {INDEX_PATH} schreiben")
+    p_show = sub.add_parser("show", help="Code inkl. Vorfahren und Kindern anzeigen")
+    p_show.add_argument("code")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        started = time.perf_counter()
+        index = TaricCodeIndex.from_db(DB_PATH)
+        index.save(INDEX_PATH)
+        print(f"{len(index)} Codes in {time.perf_counter() - started:.2f}s -> {INDEX_PATH}")
+        return
+
+    index = get_code_index()
+    today = datetime.date.today().isoformat()
+    entry = index.get(args.code)
+    if entry is None:
+        print(f"{args.code}: nicht in taric_reference")
+    for anc in index.ancestors(args.code):
+        print(f"  {anc.code}  {anc.description() or ''}")
+    if entry is not None:
+        print(f"* {entry.code}  {entry.description() or ''}  (gültig heute: {entry.is_valid_on(today)})")
+        for child in index.children(args.code, on_date=today):
+            print(f"    {child.code}  {child.description() or ''}")
+
+
+if __name__ == "__main__":
+    main()
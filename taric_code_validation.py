@@ -0,0 +1,127 @@
+"""
+taric_code_validation.py
+
+Verantwortung:
+- Prüft eine Modellantwort (classify_with_gemini) gegen die lokale Nomenklatur
+  (TaricCodeIndex): taric_code, cn_code, hs_chapter und jede possible_alternatives-Zeile
+- Ungültige Codes werden auf das nächstgelegene gültige Blatt unter dem
+  tiefsten gültigen Präfix "gesnappt" (Originalwert bleibt erhalten)
+- Öffentliche Funktion: validate_classification(result, index, on_date)
+"""
+
+from typing import Dict, List, Optional
+
+from taric_code_index import TaricCodeIndex
+
+# Präfix-Stufen, von der tiefsten zur gröbsten
+SNAP_LEVELS = (10, 8, 6, 4, 2)
+
+
+def _clean(code) -> str:
+    return "".join(ch for ch in str(code or "") if ch.isdigit())
+
+
+def snap_code(code, index: TaricCodeIndex, on_date: Optional[str] = None) -> Dict:
+    """
+    Prüft einen (10-stelligen) Code und liefert:
+    {"value", "valid", "snapped", "valid_prefix"}
+
+    - valid: Code ist ein gültiges Blatt (deklarierbare Zeile) zum Stichtag
+    - snapped: bei ungültigem Code das numerisch nächste gültige Blatt unter
+      dem tiefsten Präfix, zu dem es gültige Blätter gibt (sonst None)
+    """
+    digits = _clean(code)
+    result = {"value": code, "valid": False, "snapped": None, "valid_prefix": None}
+    if len(digits) < 2:
+        return result
+
+    full = digits[:10].ljust(10, "0")
+    for level in SNAP_LEVELS:
+        if level > len(digits):
+            continue
+        prefix = digits[:level]
+        leaves = index.leaves_under(prefix, on_date=on_date)
+        if not leaves:
+            continue
+        result["valid_prefix"] = prefix
+        codes = [leaf.code for leaf in leaves]
+        if len(digits) == 10 and full in codes:
+            result["valid"] = True
+            result["snapped"] = full
+        else:
+            target = int(full)
+            result["snapped"] = min(codes, key=lambda c: (abs(int(c) - target), c))
+        break
+
+    return result
+
+
+def validate_classification(
+    result: dict,
+    index: TaricCodeIndex,
+    on_date: Optional[str] = None,
+) -> Optional[Dict]:
+    """
+    Validiert taric_code, cn_code, hs_chapter und possible_alternatives.
+
+    Ergänzt `result` um:
+    - taric_code_snapped: gültiger (ggf. gesnappter) Code
+    - code_valid: True, wenn taric_code ein gültiges Blatt ist und cn_code/hs_chapter dazu passen
+    - code_validation: Details je Feld
+    und jede Alternative um "valid" / "snapped_code".
+
+    Gibt den Validierungsblock zurück oder None, wenn keine Referenz geladen ist.
+    """
+    if not len(index):
+        return None
+
+    taric = snap_code(result.get("taric_code"), index, on_date)
+    taric_digits = _clean(result.get("taric_code"))
+    effective = taric["snapped"] or taric_digits
+
+    cn_digits = _clean(result.get("cn_code"))
+    cn_check = {
+        "value": result.get("cn_code"),
+        "exists": len(cn_digits) == 8 and bool(index.leaves_under(cn_digits, on_date=on_date)),
+        "consistent": bool(cn_digits) and cn_digits == taric_digits[:8],
+    }
+
+    hs_digits = _clean(result.get("hs_chapter"))
+    hs_check = {
+        "value": result.get("hs_chapter"),
+        "exists": len(hs_digits) == 2 and bool(index.codes_with_prefix(hs_digits)),
+        "consistent": bool(hs_digits) and hs_digits == taric_digits[:2],
+    }
+
+    alternatives: List[Dict] = []
+    for alt in result.get("possible_alternatives") or []:
+        if not isinstance(alt, dict):
+            continue
+        alt_check = snap_code(alt.get("taric_code"), index, on_date)
+        alt["valid"] = alt_check["valid"]
+        alt["snapped_code"] = alt_check["snapped"]
+        alternatives.append(alt_check)
+
+    code_valid = bool(
+        taric["valid"]
+        and cn_check["exists"]
+        and cn_check["consistent"]
+        and hs_check["exists"]
+        and hs_check["consistent"]
+    )
+
+    validation = {
+        "taric_code": taric,
+        "cn_code": cn_check,
+        "hs_chapter": hs_check,
+        "alternatives": alternatives,
+        "code_valid": code_valid,
+        "effective_code": effective or None,
+        "reference_size": len(index),
+        "on_date": on_date,
+    }
+
+    result["taric_code_snapped"] = taric["snapped"]
+    result["code_valid"] = code_valid
+    result["code_validation"] = validation
+    return validation
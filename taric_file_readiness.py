@@ -0,0 +1,215 @@
+"""
+taric_file_readiness.py
+
+Verantwortung:
+- Erkennen, wann eine Datei in einem beobachteten Ordner fertig geschrieben ist,
+  bevor sie in eine Pipeline geht (bulk_evaluation_watcher, highend_bildconverter_watcher)
+- Primär über Ereignisse (Linux/inotify):
+    IN_CLOSE_WRITE (watchdog: on_closed)  -> Schreiber hat die Datei geschlossen
+    IN_MOVED_TO    (watchdog: on_moved)   -> atomar umbenannt, z.B. "bild.jpg.part" -> "bild.jpg"
+- Fallback ohne Close-Ereignisse (macOS, Windows, Polling-Observer, Netzlaufwerke):
+  Größe und mtime müssen TARIC_READY_STABLE_S Sekunden unverändert sein
+  (mit inotify gilt die längere Frist TARIC_READY_STABLE_S_CLOSE_EVENTS nur als Sicherheitsnetz)
+- Namenskonvention für Dateien im Schreibvorgang: Punkt-Dateien und Endungen wie
+  .part/.tmp/.partial/.crdownload werden nie weitergegeben – Uploader schreiben
+  unter solchem Namen und benennen am Ende um
+- Fertige Dateien werden gebündelt übergeben (Ruhezeit TARIC_READY_BATCH_S, höchstens
+  TARIC_READY_MAX_BATCH_WAIT_S nach der ersten Datei), damit ein Kopiervorgang mit
+  vielen Dateien als ein Batch ankommt
+
+Öffentlich: is_temporary_name(), file_age_seconds(), ReadinessWatcher
+(is_temporary_name/file_age_seconds und STABLE_SECONDS auch ohne watchdog nutzbar,
+z.B. für den Queue-Scanner von bulk-evaluation.py)
+"""
+
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+try:
+    from watchdog.events import (
+        FileClosedEvent,
+        FileCreatedEvent,
+        FileModifiedEvent,
+        FileMovedEvent,
+        FileSystemEventHandler,
+    )
+except ImportError:  # ohne watchdog nur die Namens-/Altersprüfung nutzbar
+    FileClosedEvent = FileCreatedEvent = FileModifiedEvent = FileMovedEvent = object
+    FileSystemEventHandler = object
+
+logger = logging.getLogger(__name__)
+
+# Endungen von Dateien, die gerade geschrieben werden (Browser, rsync, Uploader)
+TEMP_SUFFIXES = {".part", ".partial", ".tmp", ".temp", ".crdownload", ".download", ".filepart", ".swp"}
+
+STABLE_SECONDS = float(os.getenv("TARIC_READY_STABLE_S", "2.0"))
+STABLE_SECONDS_CLOSE_EVENTS = float(os.getenv("TARIC_READY_STABLE_S_CLOSE_EVENTS", "30.0"))
+POLL_INTERVAL_SECONDS = float(os.getenv("TARIC_READY_POLL_S", "0.5"))
+BATCH_SECONDS = float(os.getenv("TARIC_READY_BATCH_S", "2.0"))
+MAX_BATCH_WAIT_SECONDS = float(os.getenv("TARIC_READY_MAX_BATCH_WAIT_S", "30.0"))
+
+
+def is_temporary_name(path: Path) -> bool:
+    """Punkt-Datei, Office-Sperrdatei oder Endung eines laufenden Schreibvorgangs?"""
+    name = path.name
+    if name.startswith(".") or name.startswith("~$"):
+        return True
+    return any(suffix.lower() in TEMP_SUFFIXES for suffix in path.suffixes)
+
+
+def file_age_seconds(path: Path) -> float:
+    """Sekunden seit der letzten Änderung (0, falls die Datei nicht mehr existiert)."""
+    try:
+        return max(time.time() - path.stat().st_mtime, 0.0)
+    except OSError:
+        return 0.0
+
+
+def observer_emits_close_events(observer: object) -> bool:
+    """True für den inotify-Observer (liefert IN_CLOSE_WRITE als on_closed)."""
+    return type(observer).__name__ == "InotifyObserver"
+
+
+class ReadinessWatcher(FileSystemEventHandler):
+    """
+    Watchdog-Handler: verfolgt Kandidaten bis sie fertig sind und ruft on_batch
+    mit gebündelten, fertigen Pfaden auf (aus einem eigenen Thread).
+
+    Die Ereignis-Callbacks blockieren nicht; Polling und Übergabe laufen im
+    Hintergrund-Thread.
+    """
+
+    def __init__(
+        self,
+        on_batch: Callable[[List[Path]], None],
+        accept: Callable[[Path], bool],
+        close_events: bool = False,
+    ) -> None:
+        super().__init__()
+        self.on_batch = on_batch
+        self.accept = accept
+        self.stable_seconds = STABLE_SECONDS_CLOSE_EVENTS if close_events else STABLE_SECONDS
+        self._lock = threading.Lock()
+        # Pfad -> (Größe, mtime, seit wann unverändert)
+        self._candidates: Dict[Path, Tuple[int, float, float]] = {}
+        self._ready: Set[Path] = set()
+        self._first_ready = 0.0
+        self._last_ready = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="file-readiness", daemon=True)
+
+    # --- Lebenszyklus -------------------------------------------------------------
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(2.0)
+
+    # --- Ereignisse (Observer-Thread, nicht blockierend) -----------------------------
+
+    def _wanted(self, path: Path) -> bool:
+        if is_temporary_name(path):
+            logger.debug("Ignoriere %s (temporärer Name)", path.name)
+            return False
+        if not self.accept(path):
+            logger.debug("Ignoriere %s (nicht unterstützte Endung)", path.name)
+            return False
+        return True
+
+    def _track(self, path: Path) -> None:
+        if not self._wanted(path):
+            return
+        with self._lock:
+            if path not in self._ready:
+                self._candidates[path] = (-1, 0.0, time.monotonic())
+
+    def _mark_ready(self, path: Path) -> None:
+        if not self._wanted(path):
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._candidates.pop(path, None)
+            if not self._ready:
+                self._first_ready = now
+            self._ready.add(path)
+            self._last_ready = now
+
+    def on_created(self, event: FileCreatedEvent) -> None:
+        if not event.is_directory:
+            self._track(Path(event.src_path))
+
+    def on_modified(self, event: FileModifiedEvent) -> None:
+        if not event.is_directory:
+            path = Path(event.src_path)
+            with self._lock:
+                tracked = path in self._candidates or path in self._ready
+                # Wieder beschrieben, bevor der Batch raus ist -> erneut abwarten
+                self._ready.discard(path)
+            if tracked:
+                self._track(path)
+
+    def on_closed(self, event: FileClosedEvent) -> None:
+        if not event.is_directory:
+            self._mark_ready(Path(event.src_path))
+
+    def on_moved(self, event: FileMovedEvent) -> None:
+        if event.is_directory:
+            return
+        with self._lock:
+            self._candidates.pop(Path(event.src_path), None)
+            self._ready.discard(Path(event.src_path))
+        # Umbenennen ist atomar: die Datei unter dem neuen Namen ist vollständig
+        self._mark_ready(Path(event.dest_path))
+
+    def add_existing(self, paths: List[Path]) -> None:
+        """Beim Start bereits vorhandene Dateien über die Stabilitätsprüfung einreihen."""
+        for path in paths:
+            self._track(path)
+
+    # --- Hintergrund-Thread -----------------------------------------------------------
+
+    def _poll_candidates(self, now: float) -> None:
+        with self._lock:
+            candidates = list(self._candidates.items())
+        for path, (size, mtime, since) in candidates:
+            try:
+                st = path.stat()
+            except OSError:
+                with self._lock:
+                    self._candidates.pop(path, None)  # gelöscht oder weggeschoben
+                continue
+            if st.st_size != size or st.st_mtime != mtime:
+                with self._lock:
+                    if path in self._candidates:
+                        self._candidates[path] = (st.st_size, st.st_mtime, now)
+                continue
+            if st.st_size > 0 and now - since >= self.stable_seconds:
+                self._mark_ready(path)
+
+    def _take_batch(self, now: float) -> Optional[List[Path]]:
+        with self._lock:
+            if not self._ready:
+                return None
+            due = min(self._last_ready + BATCH_SECONDS, self._first_ready + MAX_BATCH_WAIT_SECONDS)
+            if now < due:
+                return None
+            batch = sorted(p for p in self._ready if p.exists())
+            self._ready.clear()
+        return batch
+
+    def _loop(self) -> None:
+        while not self._stop.wait(POLL_INTERVAL_SECONDS):
+            now = time.monotonic()
+            try:
+                self._poll_candidates(now)
+                batch = self._take_batch(now)
+                if batch:
+                    self.on_batch(batch)
+            except Exception:
+                logger.exception("Fehler in der Bereitschaftsprüfung")
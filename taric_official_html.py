@@ -0,0 +1,120 @@
+"""
+taric_official_html.py
+
+Verantwortung:
+- Extrahiert aus einer TARIC-Consultation-Seite (EU) den Beschreibungstext
+  für einen Präfix (z.B. '8517' bei digits=4)
+- extract_official_description(): lxml (C-Parser), Anker-Zeile per XPath,
+  Fallback: Textknoten-Scan mit frühem Abbruch
+- extract_official_description_bs4(): bisherige BeautifulSoup-Variante,
+  bleibt als Referenz für scripts/bench_official_html_extract.py erhalten
+
+Die Funktionen sind CPU-lastig und werden im Backend per asyncio.to_thread aufgerufen.
+"""
+
+from typing import List, Optional
+
+import lxml.html
+from lxml import etree
+
+# Obergrenze für den Fallback-Text (wie bisher)
+MAX_FALLBACK_CHARS = 4000
+
+# Textknoten ohne Script/Style-Inhalte
+_TEXT_XPATH = ".//text()[not(parent::script) and not(parent::style)]"
+
+
+def _element_text(element) -> str:
+    parts = (t.strip() for t in element.xpath(_TEXT_XPATH))
+    return " ".join(p for p in parts if p).replace("\xa0", " ").strip()
+
+
+def extract_official_description(html: str, taric_prefix: str, digits: int) -> Optional[str]:
+    """
+    Strategie:
+    - Anker-ID = Präfix auf 10 Stellen mit Nullen aufgefüllt (z.B. '8517000000')
+    - Anker per XPath (id oder <a name>), Text der umgebenden Tabellenzeile / des Containers
+    - Fallback: Textknoten, die den Präfix enthalten; Abbruch, sobald genug Text gesammelt ist
+    """
+    if not html:
+        return None
+
+    try:
+        doc = lxml.html.fromstring(html)
+    except (etree.ParserError, ValueError):
+        return None
+
+    anchor_id = taric_prefix.ljust(10, "0")
+    anchors = doc.xpath("(//*[@id=$id] | //a[@name=$id])[1]", id=anchor_id)
+    if anchors:
+        anchor = anchors[0]
+        container = next(
+            iter(anchor.xpath("ancestor::tr[1]") or anchor.xpath("ancestor::div[1]")),
+            None,
+        )
+        if container is None:
+            container = anchor.getparent()
+        if container is not None:
+            text = _element_text(container)
+            if text:
+                return text
+
+    collected: List[str] = []
+    seen = set()
+    size = 0
+    for node in doc.xpath("//text()[contains(., $p)]", p=taric_prefix):
+        parent = node.getparent()
+        # Tail-Text gehört (wie bei BeautifulSoup) zum umgebenden Element
+        if parent is not None and node.is_tail:
+            parent = parent.getparent()
+        if parent is None or parent.tag in ("script", "style"):
+            continue
+        snippet = _element_text(parent)
+        if snippet in seen:
+            continue
+        seen.add(snippet)
+        collected.append(snippet)
+        size += len(snippet) + 3
+        if size >= MAX_FALLBACK_CHARS:
+            break
+
+    if collected:
+        return " | ".join(collected)[:MAX_FALLBACK_CHARS]
+
+    return None
+
+
+def extract_official_description_bs4(html: str, taric_prefix: str, digits: int) -> Optional[str]:
+    """Bisherige Implementierung (BeautifulSoup + html.parser), nur noch für Vergleiche."""
+    from bs4 import BeautifulSoup
+
+    if not html:
+        return None
+
+    soup = BeautifulSoup(html, "html.parser")
+
+    anchor_id = taric_prefix.ljust(10, "0")
+    anchor = soup.find(id=anchor_id) or soup.find("a", attrs={"name": anchor_id})
+
+    if anchor:
+        container = anchor.find_parent("tr") or anchor.find_parent("div") or anchor.parent
+        if container:
+            text = " ".join(container.stripped_strings)
+            text = text.replace("\xa0", " ").strip()
+            if text:
+                return text
+
+    texts = soup.find_all(string=lambda s: s and taric_prefix in s)
+    collected = []
+    for t in texts:
+        parent = t.parent
+        if parent:
+            snippet = " ".join(parent.stripped_strings)
+            collected.append(snippet)
+
+    if collected:
+        unique = list(dict.fromkeys(collected))
+        combined = " | ".join(unique)
+        return combined[:MAX_FALLBACK_CHARS]
+
+    return None
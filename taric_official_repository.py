@@ -3,15 +3,19 @@ taric_official_repository.py
 
 Verantwortung:
 - Zugriff auf taric_official_cache in taric_live.db
-- Caching-Strategie für offizielle TARIC-Beschreibungen
+- Caching-Strategie für offizielle TARIC-Beschreibungen (stale-while-revalidate:
+  veraltete Einträge werden sofort geliefert, die Aktualisierung läuft im Hintergrund)
 - Öffentliche Funktion: get_official_description(taric_code, lang, max_age_hours)
 """
 
-from typing import Optional, Dict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Dict, Iterable, Tuple
 import os
 import sqlite3
 import datetime
 import logging
+import threading
+import time
 
 from taric_wsdl_client import fetch_from_wsdl, TaricWsdlError
 
@@ -19,6 +23,16 @@ logger = logging.getLogger(__name__)
 
 DB_PATH = os.getenv("TARIC_DB_PATH", "taric_live.db")
 
+# Hintergrund-Aktualisierung veralteter Einträge
+REFRESH_WORKERS = int(os.getenv("TARIC_REFRESH_WORKERS", "2"))
+# Eigener Pool für Cache-Misses (Aufrufer wartet), damit ein Stau von Refreshes sie nicht aufhält
+MISS_WORKERS = int(os.getenv("TARIC_MISS_WORKERS", "4"))
+# Refresh-Budget (Token-Bucket): max. Refreshes pro Minute + erlaubter Burst
+REFRESH_RATE_PER_MIN = float(os.getenv("TARIC_REFRESH_RATE_PER_MIN", "30"))
+REFRESH_BURST = int(os.getenv("TARIC_REFRESH_BURST", "10"))
+# Max. Wartezeit eines Aufrufers bei Cache-Miss auf einen laufenden WSDL-Abruf
+MISS_WAIT_TIMEOUT_S = float(os.getenv("TARIC_MISS_WAIT_TIMEOUT_S", "30"))
+
 
 def _get_db_connection() -> sqlite3.Connection:
     # Wenn du bereits ein `db.py` mit get_db_connection hast, kannst du das hier ersetzen:
@@ -66,31 +80,150 @@ def _is_fresh(entry: Dict, max_age_hours: Optional[int]) -> bool:
     return age <= datetime.timedelta(hours=max_age_hours)
 
 
+_UPSERT_SQL = """
+    INSERT INTO taric_official_cache (taric_code, language, description, source, fetched_at, raw_payload)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(taric_code, language)
+    DO UPDATE SET
+      description = excluded.description,
+      source      = excluded.source,
+      fetched_at  = excluded.fetched_at,
+      raw_payload = excluded.raw_payload;
+"""
+
+
+def _upsert_params(data: Dict) -> tuple:
+    return (
+        data["taric_code"],
+        data["language"],
+        data["description"],
+        data["source"],
+        data["fetched_at"],
+        data.get("raw"),
+    )
+
+
 def _save_to_cache(data: Dict) -> None:
     with _get_db_connection() as conn:
-        conn.execute(
-            """
-            INSERT INTO taric_official_cache (taric_code, language, description, source, fetched_at, raw_payload)
-            VALUES (?, ?, ?, ?, ?, ?)
-            ON CONFLICT(taric_code, language)
-            DO UPDATE SET
-              description = excluded.description,
-              source      = excluded.source,
-              fetched_at  = excluded.fetched_at,
-              raw_payload = excluded.raw_payload;
-            """,
-            (
-                data["taric_code"],
-                data["language"],
-                data["description"],
-                data["source"],
-                data["fetched_at"],
-                data.get("raw"),
-            ),
-        )
+        conn.execute(_UPSERT_SQL, _upsert_params(data))
         conn.commit()
 
 
+def store_official_descriptions(results: Iterable[Dict]) -> int:
+    """Schreibt viele WSDL-Ergebnisse (z.B. aus fetch_many) in einer Transaktion."""
+    rows = [_upsert_params(r) for r in results if r]
+    if rows:
+        with _get_db_connection() as conn:
+            conn.executemany(_UPSERT_SQL, rows)
+            conn.commit()
+    return len(rows)
+
+
+class _RefreshBudget:
+    """Einfacher Token-Bucket, damit Hintergrund-Refreshes den EU-Dienst nicht fluten."""
+
+    def __init__(self, rate_per_min: float, burst: int) -> None:
+        self.rate_per_s = max(rate_per_min, 0.0) / 60.0
+        self.capacity = float(max(burst, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_per_s)
+            self.updated = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return True
+            return False
+
+
+_refresh_budget = _RefreshBudget(REFRESH_RATE_PER_MIN, REFRESH_BURST)
+# Refresh-Pool nur für stale-while-revalidate; Misses laufen im eigenen Pool
+_executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix="taric-refresh")
+_miss_executor = ThreadPoolExecutor(max_workers=MISS_WORKERS, thread_name_prefix="taric-miss")
+
+# Laufende Abrufe je (taric_code, language) – gleichzeitige Anfragen teilen sich einen Future
+_inflight: Dict[Tuple[str, str], Future] = {}
+_inflight_lock = threading.Lock()
+
+refresh_stats: Dict[str, int] = {
+    "fresh_hits": 0,
+    "stale_hits": 0,
+    "misses": 0,
+    "refresh_scheduled": 0,
+    "refresh_deduplicated": 0,
+    "refresh_skipped_budget": 0,
+    "refresh_errors": 0,
+}
+
+
+def _fetch_and_store(taric_code: str, lang: str) -> Optional[Dict]:
+    """WSDL-Abruf + Cache-Update; Fehler werden geloggt, Rückgabe None."""
+    try:
+        wsdl_result = fetch_from_wsdl(taric_code, lang)
+    except TaricWsdlError as exc:
+        refresh_stats["refresh_errors"] += 1
+        logger.error("Fehler beim TARIC-WSDL-Aufruf: %s", exc)
+        return None
+    except Exception:
+        refresh_stats["refresh_errors"] += 1
+        logger.exception("Unerwarteter Fehler beim TARIC-Refresh: code=%s lang=%s", taric_code, lang)
+        return None
+
+    if wsdl_result is None:
+        logger.info("Keine offizielle TARIC-Beschreibung gefunden: code=%s lang=%s", taric_code, lang)
+        return None
+
+    _save_to_cache(wsdl_result)
+    return _load_from_cache(taric_code, lang)
+
+
+def _submit_fetch(taric_code: str, lang: str, executor: ThreadPoolExecutor) -> Tuple[Future, bool]:
+    """
+    Startet einen Abruf im angegebenen Pool oder hängt sich an einen laufenden an.
+    Rückgabe: (Future, neu_gestartet)
+    """
+    key = (taric_code, lang)
+    with _inflight_lock:
+        future = _inflight.get(key)
+        # Ein Miss wartet nicht auf einen Refresh, der noch in der Warteschlange steht
+        queued_refresh = (
+            executor is _miss_executor and future is not None and not (future.running() or future.done())
+        )
+        if future is not None and not queued_refresh:
+            return future, False
+        future = executor.submit(_fetch_and_store, taric_code, lang)
+        _inflight[key] = future
+
+    def _done(_f: Future) -> None:
+        with _inflight_lock:
+            if _inflight.get(key) is _f:
+                del _inflight[key]
+
+    future.add_done_callback(_done)
+    return future, True
+
+
+def _schedule_refresh(taric_code: str, lang: str) -> None:
+    """Hintergrund-Refresh eines veralteten Eintrags (dedupliziert, budgetiert)."""
+    with _inflight_lock:
+        if (taric_code, lang) in _inflight:
+            refresh_stats["refresh_deduplicated"] += 1
+            return
+    if not _refresh_budget.try_acquire():
+        refresh_stats["refresh_skipped_budget"] += 1
+        logger.debug("Refresh-Budget erschöpft, Eintrag bleibt vorerst veraltet: code=%s", taric_code)
+        return
+    _, started = _submit_fetch(taric_code, lang, _executor)
+    if started:
+        refresh_stats["refresh_scheduled"] += 1
+    else:
+        refresh_stats["refresh_deduplicated"] += 1
+
+
 def get_official_description(taric_code: str,
                              lang: str = "DE",
                              max_age_hours: Optional[int] = 24) -> Optional[Dict]:
@@ -100,7 +233,10 @@ def get_official_description(taric_code: str,
     Ablauf:
     1. Cache prüfen (taric_official_cache)
     2. Wenn Eintrag existiert und (optional) nicht zu alt -> zurückgeben.
-    3. Sonst via WSDL holen, in Cache schreiben, zurückgeben.
+    3. Wenn Eintrag existiert, aber zu alt -> sofort zurückgeben ("stale": True) und
+       im Hintergrund aktualisieren (dedupliziert je Code/Sprache, Refresh-Budget).
+    4. Kein Eintrag -> via WSDL holen (laufende Abrufe werden geteilt), in Cache
+       schreiben, zurückgeben.
 
     :param taric_code: TARIC / Goods Code (10-stellig bevorzugt).
     :param lang: Sprachcode ('DE', 'EN', ...)
@@ -118,23 +254,22 @@ def get_official_description(taric_code: str,
     # 1. Cache prüfen
     cached = _load_from_cache(taric_code, lang)
     if cached and _is_fresh(cached, max_age_hours):
+        refresh_stats["fresh_hits"] += 1
         logger.info("TARIC official aus Cache: code=%s lang=%s", taric_code, lang)
         return cached
 
-    # 2. WSDL-Aufruf
-    try:
-        wsdl_result = fetch_from_wsdl(taric_code, lang)
-    except TaricWsdlError as exc:
-        logger.error("Fehler beim TARIC-WSDL-Aufruf: %s", exc)
-        # Falls es einen veralteten Cache gibt, kannst du den optional trotzdem zurückgeben:
+    # 2. Veraltet: sofort liefern, Aktualisierung im Hintergrund
+    if cached:
+        refresh_stats["stale_hits"] += 1
+        _schedule_refresh(taric_code, lang)
+        cached["stale"] = True
         return cached
 
-    if wsdl_result is None:
-        # Nichts gefunden
-        logger.info("Keine offizielle TARIC-Beschreibung gefunden: code=%s lang=%s", taric_code, lang)
+    # 3. Cache-Miss: WSDL-Aufruf (ggf. an laufenden Abruf anhängen)
+    refresh_stats["misses"] += 1
+    future, _ = _submit_fetch(taric_code, lang, _miss_executor)
+    try:
+        return future.result(timeout=MISS_WAIT_TIMEOUT_S)
+    except Exception as exc:
+        logger.error("TARIC-WSDL-Abruf nicht rechtzeitig abgeschlossen: code=%s (%s)", taric_code, exc)
         return None
-
-    # 3. Im Cache speichern
-    _save_to_cache(wsdl_result)
-
-    return _load_from_cache(taric_code, lang)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+taric_token_budget.py
+
+Verantwortung:
+- Dauerhaftes Token-Ledger (SQLite, data/taric_token_ledger.db) über alle Bulk-Läufe
+  hinweg, gespeist aus dem usage-Block der /classify-Antworten: bulk-evaluation.py
+  bucht als "bulk", das Backend bucht alle übrigen /classify-Aufrufe als "interactive"
+  (Bulk-Requests kennzeichnet der Client mit dem Header X-Taric-Source: bulk)
+- Scheduler für Bulk-Arbeit gegen ein Tages- und ein Minutenbudget:
+    * Reserve für interaktiven /classify-Traffic (TARIC_TOKEN_INTERACTIVE_RESERVE):
+      Bulk darf nur den Rest des jeweiligen Budgets verbrauchen; verbraucht der
+      interaktive Traffic mehr als die Reserve, schrumpft der Bulk-Anteil entsprechend
+      (setzt voraus, dass Backend und Bulk-Läufe dasselbe TARIC_TOKEN_LEDGER_DB nutzen –
+      sonst bleibt die Reserve ein fester Anteil)
+    * Auch der erste Request des Tages muss ins Budget passen; übersteigt schon die
+      Schätzung je Bild den Bulk-Anteil, pausiert Bulk (eigener Grund im Status)
+    * Tagesbudget wird über den Tag verteilt (lineare Freigabe + Vorlauf
+      TARIC_TOKEN_SPREAD_WINDOW_S), statt morgens alles zu verbrauchen
+    * Budget erschöpft -> pausieren; Fortsetzung automatisch, sobald das
+      Minutenfenster weiterrückt bzw. der Tag wechselt
+- Der Tag beginnt um Mitternacht in TARIC_TOKEN_DAY_TZ (Gemini setzt Tageskontingente
+  um Mitternacht Pacific Time zurück)
+
+Budgets von 0 sind deaktiviert.
+
+CLI:
+    python3 taric_token_budget.py            # Verbrauch heute / letzte Minute, nächste Freigabe
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+BASE_DIR = Path(__file__).resolve().parent
+LEDGER_DB_PATH = Path(
+    os.getenv("TARIC_TOKEN_LEDGER_DB", str(BASE_DIR / "data" / "taric_token_ledger.db"))
+)
+
+TOKENS_PER_DAY = int(os.getenv("TARIC_TOKEN_BUDGET_PER_DAY", "0"))
+TOKENS_PER_MINUTE = int(os.getenv("TARIC_TOKEN_BUDGET_PER_MINUTE", "0"))
+# Anteil beider Budgets, der für interaktive Klassifikationen frei bleibt
+INTERACTIVE_RESERVE = float(os.getenv("TARIC_TOKEN_INTERACTIVE_RESERVE", "0.2"))
+# Vorlauf der linearen Tagesfreigabe (0 = keine Verteilung, nur Tagesgrenze)
+SPREAD_WINDOW_S = float(os.getenv("TARIC_TOKEN_SPREAD_WINDOW_S", "3600"))
+DAY_TIMEZONE = os.getenv("TARIC_TOKEN_DAY_TZ", "America/Los_Angeles")
+# Schätzung je Bild, solange das Ledger noch keine Werte hat
+DEFAULT_TOKENS_PER_ITEM = int(os.getenv("TARIC_TOKEN_ESTIMATE_PER_ITEM", "1500"))
+# Ledger-Einträge älter als das werden beim Öffnen gelöscht
+RETENTION_DAYS = int(os.getenv("TARIC_TOKEN_LEDGER_RETENTION_DAYS", "35"))
+
+MINUTE_S = 60.0
+
+
+class TokenBudget:
+    """Token-Ledger + Budgetprüfung. Thread-sicher (eine Verbindung, ein Lock)."""
+
+    def __init__(
+        self,
+        db_path: Path = LEDGER_DB_PATH,
+        per_day: int = TOKENS_PER_DAY,
+        per_minute: int = TOKENS_PER_MINUTE,
+        reserve: float = INTERACTIVE_RESERVE,
+    ) -> None:
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(db_path), timeout=30.0, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS token_ledger (
+                id                INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts                REAL NOT NULL,
+                source            TEXT NOT NULL,
+                ref               TEXT,
+                prompt_tokens     INTEGER,
+                completion_tokens INTEGER,
+                total_tokens      INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_token_ledger_ts ON token_ledger(ts);
+            """
+        )
+        self.conn.execute(
+            "DELETE FROM token_ledger WHERE ts < ?", (time.time() - RETENTION_DAYS * 86400,)
+        )
+        self.conn.commit()
+        self.per_day = per_day
+        self.per_minute = per_minute
+        self.reserve = min(max(reserve, 0.0), 1.0)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.per_day > 0 or self.per_minute > 0
+
+    def close(self) -> None:
+        self.conn.close()
+
+    # --- Ledger -----------------------------------------------------------------
+
+    def record(self, usage: Optional[Dict[str, Any]], source: str = "bulk", ref: Optional[str] = None) -> int:
+        """Bucht den usage-Block einer /classify-Antwort; liefert total_tokens (0 ohne usage)."""
+        if not usage:
+            return 0
+        total = int(usage.get("total_tokens") or 0)
+        if total <= 0:
+            return 0
+        with self._lock:
+            self.conn.execute(
+                """
+                INSERT INTO token_ledger (ts, source, ref, prompt_tokens, completion_tokens, total_tokens)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (time.time(), source, ref, usage.get("prompt_tokens"), usage.get("completion_tokens"), total),
+            )
+            self.conn.commit()
+        return total
+
+    def _used_since(self, since: float) -> int:
+        row = self.conn.execute(
+            "SELECT COALESCE(SUM(total_tokens), 0) FROM token_ledger WHERE ts >= ?", (since,)
+        ).fetchone()
+        return int(row[0])
+
+    def _usage_since(self, since: float) -> Tuple[int, int]:
+        """(Bulk-Verbrauch, übriger = interaktiver Verbrauch) seit `since`."""
+        row = self.conn.execute(
+            """
+            SELECT COALESCE(SUM(CASE WHEN source = 'bulk' THEN total_tokens END), 0),
+                   COALESCE(SUM(CASE WHEN source != 'bulk' THEN total_tokens END), 0)
+              FROM token_ledger WHERE ts >= ?
+            """,
+            (since,),
+        ).fetchone()
+        return int(row[0]), int(row[1])
+
+    def _bulk_share(self, budget: int, interactive_used: int) -> float:
+        """Bulk-Anteil eines Budgets: die Reserve bleibt frei, interaktiver Mehrverbrauch geht ab."""
+        return budget - max(float(interactive_used), budget * self.reserve)
+
+    def estimate_per_item(self) -> int:
+        """Mittlerer Verbrauch der letzten 50 Bulk-Bilder (Fallback: Konfiguration)."""
+        with self._lock:
+            row = self.conn.execute(
+                """
+                SELECT AVG(total_tokens) FROM (
+                    SELECT total_tokens FROM token_ledger WHERE source = 'bulk'
+                     ORDER BY id DESC LIMIT 50
+                )
+                """
+            ).fetchone()
+        return int(row[0]) if row and row[0] else DEFAULT_TOKENS_PER_ITEM
+
+    # --- Scheduler --------------------------------------------------------------
+
+    @staticmethod
+    def day_bounds(now: float) -> Tuple[float, float]:
+        tz = ZoneInfo(DAY_TIMEZONE)
+        start = datetime.fromtimestamp(now, tz).replace(hour=0, minute=0, second=0, microsecond=0)
+        return start.timestamp(), (start + timedelta(days=1)).timestamp()
+
+    def wait_time(self, in_flight: int = 0, estimate: Optional[int] = None) -> Tuple[float, Optional[str]]:
+        """
+        Sekunden bis zum nächsten erlaubten Bulk-Request (0 = sofort) und Grund.
+        `in_flight` laufende Requests werden mit der Schätzung vorab angerechnet.
+        """
+        if not self.enabled:
+            return 0.0, None
+        estimate = estimate or self.estimate_per_item()
+        needed = estimate * (in_flight + 1)
+        now = time.time()
+        wait, reason = 0.0, None
+
+        def exceeds(budget: int, bulk_used: int, interactive_used: int) -> bool:
+            return bulk_used + needed > self._bulk_share(budget, interactive_used)
+
+        with self._lock:
+            if self.per_day > 0:
+                day_start, day_end = self.day_bounds(now)
+                used_day, interactive_day = self._usage_since(day_start)
+                bulk_day = self._bulk_share(self.per_day, interactive_day)
+                if exceeds(self.per_day, used_day, interactive_day):
+                    wait = day_end - now
+                    if estimate > self.per_day * (1.0 - self.reserve):
+                        reason = "Schätzung je Bild übersteigt das Tagesbudget"
+                    else:
+                        reason = "Tagesbudget erschöpft"
+                elif SPREAD_WINDOW_S > 0:
+                    day_len = day_end - day_start
+                    allowance = bulk_day * min(1.0, (now - day_start + SPREAD_WINDOW_S) / day_len)
+                    if used_day + needed > allowance:
+                        wait = (used_day + needed - allowance) * day_len / bulk_day
+                        reason = "Tagesbudget verteilt"
+
+            if self.per_minute > 0 and wait <= 0:
+                rows = self.conn.execute(
+                    "SELECT ts, total_tokens, source FROM token_ledger WHERE ts >= ? ORDER BY ts",
+                    (now - MINUTE_S,),
+                ).fetchall()
+                used_minute = sum(tokens for _, tokens, source in rows if source == "bulk")
+                interactive_minute = sum(tokens for _, tokens, source in rows if source != "bulk")
+                if exceeds(self.per_minute, used_minute, interactive_minute):
+                    # Warten, bis genug alte Einträge aus dem Fenster fallen
+                    wait = MINUTE_S
+                    for ts, tokens, source in rows:
+                        if source == "bulk":
+                            used_minute -= tokens
+                        else:
+                            interactive_minute -= tokens
+                        wait = ts + MINUTE_S - now
+                        if not exceeds(self.per_minute, used_minute, interactive_minute):
+                            break
+                    if estimate > self.per_minute * (1.0 - self.reserve):
+                        reason = "Schätzung je Bild übersteigt das Minutenbudget"
+                    else:
+                        reason = "Minutenbudget erschöpft"
+
+        return max(wait, 0.0), reason
+
+    def acquire(
+        self,
+        in_flight: int = 0,
+        sleep: Callable[[float], None] = time.sleep,
+        on_wait: Optional[Callable[[float, str], None]] = None,
+        max_chunk_s: float = 60.0,
+    ) -> float:
+        """
+        Blockiert, bis das Budget den nächsten Bulk-Request zulässt; schläft in
+        Stücken von höchstens `max_chunk_s` (on_wait z.B. für Lease-Verlängerung
+        und Statusausgabe). Liefert die gesamte Wartezeit.
+        """
+        waited = 0.0
+        while True:
+            wait, reason = self.wait_time(in_flight=in_flight)
+            if wait <= 0:
+                return waited
+            if on_wait is not None:
+                on_wait(wait, reason or "")
+            chunk = min(wait, max_chunk_s)
+            sleep(chunk)
+            waited += chunk
+
+    def status(self) -> Dict[str, Any]:
+        now = time.time()
+        day_start, day_end = self.day_bounds(now)
+        with self._lock:
+            used_day = self._used_since(day_start)
+            _, interactive_day = self._usage_since(day_start)
+            used_minute = self._used_since(now - MINUTE_S)
+        wait, reason = self.wait_time()
+        return {
+            "per_day": self.per_day,
+            "per_minute": self.per_minute,
+            "interactive_reserve": self.reserve,
+            "used_today": used_day,
+            "used_today_interactive": interactive_day,
+            "used_last_minute": used_minute,
+            "estimate_per_item": self.estimate_per_item(),
+            "day_resets_in_s": round(day_end - now),
+            "next_bulk_request_in_s": round(wait, 1),
+            "reason": reason,
+        }
+
+
+def format_wait(seconds: float) -> str:
+    if seconds >= 3600:
+        return f"{seconds / 3600:.1f} h"
+    if seconds >= 60:
+        return f"{seconds / 60:.1f} min"
+    return f"{seconds:.0f} s"
+
+
+def main() -> None:
+    import json
+
+    budget = TokenBudget()
+    try:
+        print(json.dumps(budget.status(), indent=2, ensure_ascii=False))
+    finally:
+        budget.close()
+
+
+if __name__ == "__main__":
+    main()
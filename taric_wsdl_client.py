@@ -2,101 +2,338 @@
 taric_wsdl_client.py
 
 Verantwortung:
-- Kommunikation mit der TARIC WSDL-API der EU-Kommission
-- SOAP-Request bauen
-- SOAP/XML-Response parsen
+- Kommunikation mit dem TARIC-Webservice (SOAP) der EU-Kommission,
+  Operation goodsDescrForWs (Warenbeschreibung zu einem Code)
+- SOAP-Request bauen, SOAP/XML-Response parsen (inkl. SOAP-Faults)
 - Ergebnis als neutrales Python-Dict zurückgeben
 
-WICHTIG:
-- Die echte Endpoint-URL und die SOAP-Action müssen aus der offiziellen
-  Dokumentation / WSDL gezogen und hier eingetragen werden.
+Zugriffe:
+- fetch_from_wsdl(code, lang): synchron, gemeinsame requests.Session
+- AsyncTaricWsdlClient / fetch_many(codes, lang): asynchron über einen
+  gepoolten httpx.AsyncClient, parallele Abrufe mit Obergrenze
+
+Für Tests/Backfills ohne EU-Dienst: scripts/taric_wsdl_stub_server.py starten und
+TARIC_WSDL_ENDPOINT=http://127.0.0.1:8089/taric/services/goods setzen.
 """
 
-from typing import Optional, Dict
-import os
-import logging
+from typing import Dict, Iterable, Optional, Union
+import asyncio
 import datetime
+import logging
+import os
+import threading
+from xml.sax.saxutils import escape
 
-import requests  # ggf. in requirements aufnehmen
+import httpx
+import requests
+from lxml import etree
 
 logger = logging.getLogger(__name__)
 
-# Platzhalter – hier später die echte WSDL/SOAP-Endpoint-URL hinterlegen
 TARIC_WSDL_ENDPOINT = os.getenv(
     "TARIC_WSDL_ENDPOINT",
-    "https://ec.europa.eu/taxation_customs/dds2/taric/services/goods"  # Beispiel / TODO
+    "https://ec.europa.eu/taxation_customs/dds2/taric/services/goods",
 )
+TARIC_WSDL_NAMESPACE = "http://goodsNomenclatureForWS.ws.taric.dds.s/"
+
+# Timeout je Abruf und parallele Abrufe in fetch_many
+TARIC_WSDL_TIMEOUT_S = float(os.getenv("TARIC_WSDL_TIMEOUT_S", "15"))
+TARIC_WSDL_CONCURRENCY = int(os.getenv("TARIC_WSDL_CONCURRENCY", "8"))
+
+SOAP_HEADERS = {
+    "Content-Type": "text/xml; charset=utf-8",
+    "SOAPAction": '""',
+}
+
+# Fault-Texte, die "Code existiert nicht" bedeuten (kein technischer Fehler)
+_NOT_FOUND_MARKERS = ("not found", "no data", "does not exist", "unknown goods code", "nicht gefunden")
 
 
 class TaricWsdlError(Exception):
     """Allgemeiner Fehler beim TARIC-WSDL-Aufruf."""
 
 
-def fetch_from_wsdl(taric_code: str, lang: str = "DE") -> Optional[Dict]:
+# ---------------------------------------------------------------------------
+# Request / Response
+# ---------------------------------------------------------------------------
+
+
+def build_envelope(taric_code: str, lang: str, reference_date: Optional[str] = None) -> bytes:
+    """SOAP-Envelope für goodsDescrForWs (reference_date als YYYY-MM-DD, Standard: heute)."""
+    reference_date = reference_date or datetime.date.today().isoformat()
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"
+                  xmlns:ws="{TARIC_WSDL_NAMESPACE}">
+  <soapenv:Header/>
+  <soapenv:Body>
+    <ws:goodsDescrForWs>
+      <goodsCode>{escape(taric_code)}</goodsCode>
+      <languageCode>{escape(lang)}</languageCode>
+      <referenceDate>{escape(reference_date)}</referenceDate>
+    </ws:goodsDescrForWs>
+  </soapenv:Body>
+</soapenv:Envelope>
+""".encode("utf-8")
+
+
+def _local(tag) -> str:
+    return etree.QName(tag).localname if isinstance(tag, str) else ""
+
+
+def _find_first(root, *names: str):
+    """Erstes Element mit einem der lokalen Namen (namespace-unabhängig)."""
+    wanted = set(names)
+    for el in root.iter():
+        if _local(el.tag) in wanted:
+            return el
+    return None
+
+
+def parse_goods_description(
+    raw_xml: Union[str, bytes], taric_code: str, lang: str, status_code: int = 200
+) -> Optional[Dict]:
+    """
+    Parst die goodsDescrForWs-Antwort.
+
+    :param status_code: HTTP-Status der Antwort; bei 500 ist nur ein „nicht gefunden“-Fault
+        ein reguläres Ergebnis, alles andere ist ein Serverfehler.
+    :return: Ergebnis-Dict oder None, wenn der Code nicht gefunden wurde.
+    :raises TaricWsdlError: bei SOAP-Faults, HTTP 500 ohne Fault oder unlesbarem XML.
+    """
+    if isinstance(raw_xml, str):
+        raw_xml = raw_xml.encode("utf-8")
+    try:
+        root = etree.fromstring(raw_xml, parser=etree.XMLParser(resolve_entities=False, no_network=True))
+    except etree.XMLSyntaxError as exc:
+        raise TaricWsdlError(f"Antwort ist kein gültiges XML: {exc}") from exc
+
+    fault = _find_first(root, "Fault")
+    if fault is not None:
+        fault_el = _find_first(fault, "faultstring", "Text")
+        message = (fault_el.text or "").strip() if fault_el is not None else "SOAP-Fault"
+        if any(marker in message.lower() for marker in _NOT_FOUND_MARKERS):
+            return None
+        raise TaricWsdlError(f"SOAP-Fault von TARIC-WSDL: {message}")
+    if status_code >= 500:
+        # Serverfehler ohne Fault – nicht als „Code nicht gefunden“ cachen
+        raise TaricWsdlError(f"HTTP-Status {status_code} von TARIC-WSDL ohne SOAP-Fault")
+
+    data = _find_first(root, "data")
+    if data is None:
+        data = root
+    desc_el = _find_first(data, "description", "goodsDescription")
+    description = " ".join((desc_el.text or "").split()) if desc_el is not None else ""
+    if not description:
+        return None
+
+    lang_el = _find_first(data, "language", "languageCode")
+    return {
+        "taric_code": taric_code,
+        "language": (lang_el.text or lang).strip().upper() if lang_el is not None else lang,
+        "description": description,
+        "source": "EU_TARIC_WSDL",
+        "fetched_at": datetime.datetime.now(datetime.timezone.utc).isoformat().replace("+00:00", "Z"),
+        "raw": raw_xml.decode("utf-8", errors="replace"),
+    }
+
+
+def _normalize(taric_code: str, lang: str) -> tuple:
+    return (taric_code or "").strip().replace(" ", ""), (lang or "DE").upper()
+
+
+# ---------------------------------------------------------------------------
+# Synchron (requests.Session)
+# ---------------------------------------------------------------------------
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=1, pool_maxsize=TARIC_WSDL_CONCURRENCY
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def fetch_from_wsdl(taric_code: str, lang: str = "DE", reference_date: Optional[str] = None) -> Optional[Dict]:
     """
     Ruft die offizielle TARIC-Beschreibung für einen TARIC-Code via WSDL/SOAP ab.
 
     :param taric_code: TARIC / Goods Code, vorzugsweise 10-stellig (z.B. '8517120000').
     :param lang: Sprachcode, z.B. 'DE', 'EN'.
+    :param reference_date: Stichtag YYYY-MM-DD (Standard: heute).
     :return: Dict mit Beschreibung oder None bei „nicht gefunden“.
     :raises TaricWsdlError: bei technischen Fehlern / Parserfehlern.
     """
-
-    taric_code = (taric_code or "").strip()
+    taric_code, lang = _normalize(taric_code, lang)
     if not taric_code:
         logger.warning("fetch_from_wsdl: leerer TARIC-Code")
         return None
 
-    lang = (lang or "DE").upper()
-
-    # TODO: Hier konkretes SOAP-Envelope laut WSDL einbauen.
-    # Aktuell nur ein Dummy-Request-Body als Platzhalter.
-    soap_body = f"""<?xml version="1.0" encoding="UTF-8"?>
-<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"
-                  xmlns:tar="http://example.org/taric">
-  <soapenv:Header/>
-  <soapenv:Body>
-    <tar:getGoodsDescription>
-      <tar:code>{taric_code}</tar:code>
-      <tar:language>{lang}</tar:language>
-    </tar:getGoodsDescription>
-  </soapenv:Body>
-</soapenv:Envelope>
-"""
-
-    headers = {
-        "Content-Type": "text/xml; charset=utf-8",
-        # "SOAPAction": "..."  # TODO: SOAPAction aus WSDL eintragen, falls erforderlich
-    }
-
     logger.info("TARIC WSDL Request: code=%s, lang=%s", taric_code, lang)
 
     try:
-        resp = requests.post(TARIC_WSDL_ENDPOINT, data=soap_body.encode("utf-8"), headers=headers, timeout=15)
+        resp = _get_session().post(
+            TARIC_WSDL_ENDPOINT,
+            data=build_envelope(taric_code, lang, reference_date),
+            headers=SOAP_HEADERS,
+            timeout=TARIC_WSDL_TIMEOUT_S,
+        )
     except Exception as exc:
         logger.exception("Fehler beim HTTP-Request an TARIC-WSDL")
         raise TaricWsdlError(f"HTTP-Fehler beim TARIC-WSDL-Aufruf: {exc}") from exc
 
-    if resp.status_code != 200:
+    # SOAP-Faults kommen als HTTP 500 mit Fault-Body
+    if resp.status_code not in (200, 500):
         logger.error("TARIC-WSDL HTTP-Status != 200: %s", resp.status_code)
         raise TaricWsdlError(f"Unerwarteter HTTP-Status {resp.status_code} von TARIC-WSDL")
 
-    raw_xml = resp.text
+    return parse_goods_description(resp.content, taric_code, lang, resp.status_code)
 
-    # TODO: Hier XML mit z.B. `xml.etree.ElementTree` oder `lxml` parsen
-    # und die tatsächliche Description extrahieren.
-    #
-    # Aktuell nur Dummy-Wert als Platzhalter:
 
-    description = f"[OFFIZIELLE TARIC-Beschreibung für {taric_code} – TODO: XML-Parsing implementieren]"
+# ---------------------------------------------------------------------------
+# Asynchron (httpx, gepoolt)
+# ---------------------------------------------------------------------------
+
+
+class AsyncTaricWsdlClient:
+    """
+    Asynchroner Client mit gemeinsamem Verbindungspool.
+
+        async with AsyncTaricWsdlClient() as client:
+            results = await client.fetch_many(codes, "DE")
+    """
+
+    def __init__(
+        self,
+        endpoint: str = TARIC_WSDL_ENDPOINT,
+        concurrency: int = TARIC_WSDL_CONCURRENCY,
+        timeout_s: float = TARIC_WSDL_TIMEOUT_S,
+    ) -> None:
+        self.endpoint = endpoint
+        self.concurrency = max(1, concurrency)
+        self._client = httpx.AsyncClient(
+            timeout=timeout_s,
+            headers=SOAP_HEADERS,
+            limits=httpx.Limits(
+                max_connections=self.concurrency,
+                max_keepalive_connections=self.concurrency,
+            ),
+        )
+
+    async def __aenter__(self) -> "AsyncTaricWsdlClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def fetch(self, taric_code: str, lang: str = "DE", reference_date: Optional[str] = None) -> Optional[Dict]:
+        """Wie fetch_from_wsdl, aber asynchron."""
+        taric_code, lang = _normalize(taric_code, lang)
+        if not taric_code:
+            return None
+        try:
+            resp = await self._client.post(
+                self.endpoint, content=build_envelope(taric_code, lang, reference_date)
+            )
+        except httpx.HTTPError as exc:
+            raise TaricWsdlError(f"HTTP-Fehler beim TARIC-WSDL-Aufruf: {exc}") from exc
+        if resp.status_code not in (200, 500):
+            raise TaricWsdlError(f"Unerwarteter HTTP-Status {resp.status_code} von TARIC-WSDL")
+        # XML-Parsing im Worker-Thread, damit große Antworten den Event-Loop nicht blockieren
+        return await asyncio.to_thread(
+            parse_goods_description, resp.content, taric_code, lang, resp.status_code
+        )
+
+    async def fetch_many(
+        self,
+        codes: Iterable[str],
+        lang: str = "DE",
+        reference_date: Optional[str] = None,
+        return_exceptions: bool = False,
+    ) -> Dict[str, Union[Optional[Dict], Exception]]:
+        """
+        Ruft mehrere Codes parallel ab (max. `concurrency` gleichzeitig).
+
+        :return: {code: Ergebnis | None (nicht gefunden)}; bei Fehlern None bzw. die
+                 Exception, wenn return_exceptions=True.
+        """
+        unique = list(dict.fromkeys(_normalize(c, lang)[0] for c in codes if c))
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def _one(code: str):
+            async with semaphore:
+                try:
+                    return code, await self.fetch(code, lang, reference_date)
+                except TaricWsdlError as exc:
+                    logger.error("TARIC-WSDL-Abruf fehlgeschlagen: code=%s (%s)", code, exc)
+                    return code, exc if return_exceptions else None
+
+        return dict(await asyncio.gather(*(_one(c) for c in unique)))
+
+
+async def fetch_many(
+    codes: Iterable[str],
+    lang: str = "DE",
+    concurrency: int = TARIC_WSDL_CONCURRENCY,
+    reference_date: Optional[str] = None,
+) -> Dict[str, Optional[Dict]]:
+    """Bequemer Einstieg: eigener Client für einen Batch von Codes."""
+    async with AsyncTaricWsdlClient(concurrency=concurrency) as client:
+        return await client.fetch_many(codes, lang, reference_date)
+
+
+def main() -> None:
+    import argparse
+    import json
+    import time
+
+    parser = argparse.ArgumentParser(description="Offizielle TARIC-Beschreibungen per SOAP abrufen.")
+    parser.add_argument("codes", nargs="*", help="TARIC-Codes")
+    parser.add_argument("--file", help="Datei mit einem Code pro Zeile")
+    parser.add_argument("--lang", default="DE")
+    parser.add_argument("--concurrency", type=int, default=TARIC_WSDL_CONCURRENCY)
+    parser.add_argument(
+        "--store", action="store_true", help="Ergebnisse in taric_official_cache schreiben"
+    )
+    args = parser.parse_args()
+
+    codes = list(args.codes)
+    if args.file:
+        with open(args.file, encoding="utf-8") as fh:
+            codes.extend(line.strip() for line in fh if line.strip())
+    if not codes:
+        parser.error("keine Codes angegeben")
+
+    started = time.perf_counter()
+    results = asyncio.run(fetch_many(codes, args.lang, args.concurrency))
+    elapsed = time.perf_counter() - started
+
+    found = {code: r for code, r in results.items() if r}
+    if args.store:
+        from taric_official_repository import store_official_descriptions
+
+        store_official_descriptions(found.values())
+    else:
+        for code, result in results.items():
+            print(json.dumps({"taric_code": code, "description": result and result["description"]}, ensure_ascii=False))
+    print(
+        f"{len(results)} Codes in {elapsed:.1f}s ({len(found)} gefunden, "
+        f"{len(results) / elapsed if elapsed else 0:.1f} Codes/s)",
+    )
 
-    result = {
-        "taric_code": taric_code,
-        "language": lang,
-        "description": description,
-        "source": "EU_TARIC_WSDL",
-        "fetched_at": datetime.datetime.utcnow().isoformat() + "Z",
-        "raw": raw_xml,
-    }
 
-    return result
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Module liegen flach im Repo-Root (kein Paket)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("google.generativeai")
+
+import backend  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(backend, "DB_PATH", tmp_path / "taric_live.db")
+    backend.init_db()
+
+
+def test_writer_groups_concurrent_submits_into_one_commit(db, monkeypatch):
+    batches = []
+    write_batch = backend.ClassificationWriter._write_batch
+
+    def recording(conn, batch):
+        batches.append(len(batch))
+        return write_batch(conn, batch)
+
+    monkeypatch.setattr(backend.ClassificationWriter, "_write_batch", staticmethod(recording))
+
+    async def run():
+        writer = backend.ClassificationWriter(max_batch=32, max_delay_ms=50)
+        await writer.start()
+        ids = await asyncio.gather(
+            *(writer.submit(f"{i}.jpg", {"taric_code": "8517120000"}) for i in range(5))
+        )
+        await writer.stop()
+        return ids
+
+    ids = asyncio.run(run())
+    assert batches == [5]
+    assert len(set(ids)) == 5
+
+    conn = backend.get_conn()
+    try:
+        rows = conn.execute("SELECT id, filename FROM taric_live ORDER BY id").fetchall()
+    finally:
+        conn.close()
+    # jede ID gehört zum eigenen Aufrufer
+    assert {r["id"]: r["filename"] for r in rows} == {i: f"{n}.jpg" for n, i in enumerate(ids)}
+
+
+def test_writer_respects_max_batch(db, monkeypatch):
+    batches = []
+    write_batch = backend.ClassificationWriter._write_batch
+
+    def recording(conn, batch):
+        batches.append(len(batch))
+        return write_batch(conn, batch)
+
+    monkeypatch.setattr(backend.ClassificationWriter, "_write_batch", staticmethod(recording))
+
+    async def run():
+        writer = backend.ClassificationWriter(max_batch=2, max_delay_ms=50)
+        await writer.start()
+        await asyncio.gather(*(writer.submit(f"{i}.jpg", {}) for i in range(5)))
+        await writer.stop()
+
+    asyncio.run(run())
+    assert batches == [2, 2, 1]
+
+
+def test_submit_without_running_writer_writes_directly(db):
+    writer = backend.ClassificationWriter(max_batch=4, max_delay_ms=5)
+    new_id = asyncio.run(writer.submit("direkt.jpg", {}))
+    conn = backend.get_conn()
+    try:
+        row = conn.execute("SELECT filename FROM taric_live WHERE id = ?", (new_id,)).fetchone()
+    finally:
+        conn.close()
+    assert row["filename"] == "direkt.jpg"
@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("google.generativeai")
+
+import backend  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(backend, "DB_PATH", tmp_path / "taric_live.db")
+    backend.init_db()
+    conn = backend.get_conn()
+    conn.executemany(
+        "INSERT INTO taric_live (created_at, filename) VALUES (datetime('now'), ?)",
+        [("a.jpg",), ("b.jpg",)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def save(items):
+    payload = [backend.EvaluationIn(**item) for item in items]
+    return json.loads(asyncio.run(backend.save_evaluation_batch(payload)).body)
+
+
+def evaluations():
+    conn = backend.get_conn()
+    try:
+        return {
+            r["taric_live_id"]: (r["id"], r["correct_digits"], r["reviewer"])
+            for r in conn.execute("SELECT id, taric_live_id, correct_digits, reviewer FROM taric_evaluation")
+        }
+    finally:
+        conn.close()
+
+
+def test_save_batch_inserts_and_returns_ids_in_request_order(db):
+    result = save([{"taric_live_id": 2, "correct_digits": 6}, {"taric_live_id": 1, "correct_digits": 10}])
+    assert result["status"] == "ok"
+    assert result["saved"] == 2
+    stored = evaluations()
+    assert [r["evaluation_id"] for r in result["results"]] == [stored[2][0], stored[1][0]]
+
+
+def test_save_batch_upserts_existing_evaluation(db):
+    first = save([{"taric_live_id": 1, "correct_digits": 4, "reviewer": "alt"}])
+    second = save([{"taric_live_id": 1, "correct_digits": 8, "reviewer": "neu"}])
+    # RETURNING liefert auch beim Update die bestehende ID
+    assert second["results"][0]["evaluation_id"] == first["results"][0]["evaluation_id"]
+    assert evaluations() == {1: (first["results"][0]["evaluation_id"], 8, "neu")}
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+google_exceptions = pytest.importorskip("google.api_core.exceptions")
+pytest.importorskip("google.generativeai")
+
+import backend  # noqa: E402
+
+
+def body(response):
+    return json.loads(response.body)
+
+
+def test_quota_maps_to_429_with_upstream_delay():
+    response = backend._upstream_error_response(
+        google_exceptions.ResourceExhausted("Quota exceeded. Please retry in 23.4s.")
+    )
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "24"
+    assert body(response)["error_code"] == "UPSTREAM_QUOTA"
+    assert body(response)["retry_after"] == 24
+
+
+@pytest.mark.parametrize(
+    "exc_type", [google_exceptions.DeadlineExceeded, google_exceptions.ServiceUnavailable]
+)
+def test_overload_maps_to_503_with_default_delay(exc_type):
+    response = backend._upstream_error_response(exc_type("überlastet"))
+    assert response.status_code == 503
+    assert body(response)["error_code"] == "UPSTREAM_UNAVAILABLE"
+    expected = int(backend.UPSTREAM_UNAVAILABLE_RETRY_AFTER_S)
+    assert response.headers["Retry-After"] == str(expected)
+
+
+def test_retry_after_is_clamped():
+    too_long = backend._upstream_error_response(
+        google_exceptions.ResourceExhausted("retry in 99999s")
+    )
+    assert too_long.headers["Retry-After"] == str(int(backend.UPSTREAM_MAX_RETRY_AFTER_S))
+    too_short = backend._upstream_error_response(
+        google_exceptions.ResourceExhausted("retry in 0.2s")
+    )
+    assert too_short.headers["Retry-After"] == "1"
+
+
+def test_other_errors_are_not_mapped():
+    assert backend._upstream_error_response(ValueError("kaputt")) is None
+    assert backend._upstream_error_response(google_exceptions.InvalidArgument("bild")) is None
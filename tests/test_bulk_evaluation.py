@@ -0,0 +1,77 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+# bulk-evaluation.py ist ein Skript mit Bindestrich im Namen -> per Pfad laden
+_PATH = Path(__file__).resolve().parent.parent / "bulk-evaluation.py"
+
+
+@pytest.fixture(scope="module")
+def bulk():
+    spec = importlib.util.spec_from_file_location("bulk_evaluation", _PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_aimd_grows_by_one_per_full_window(bulk):
+    controller = bulk.AimdController(max_limit=8)
+    for _ in range(3):
+        controller.on_success(1.0)
+    # 1 -> 2 -> 2.5 -> 2.9
+    assert controller.window == 2
+    assert controller.limit == pytest.approx(2.9)
+
+
+def test_aimd_respects_max_limit(bulk):
+    controller = bulk.AimdController(max_limit=2)
+    for _ in range(20):
+        controller.on_success(1.0)
+    assert controller.limit == 2.0
+
+
+def test_aimd_halves_once_per_window(bulk):
+    controller = bulk.AimdController(max_limit=16)
+    controller.limit = 8.0
+    controller.on_overload()
+    controller.on_overload()  # gleichzeitig laufende Requests halbieren nicht erneut
+    assert controller.limit == 4.0
+    assert controller.decreases == 1
+
+
+def test_aimd_latency_spike_counts_as_overload(bulk):
+    controller = bulk.AimdController(max_limit=16)
+    controller.limit = 2.0
+    for _ in range(3):
+        controller.on_success(1.0)
+    before = controller.limit
+    controller.on_success(1.0 * (bulk.LATENCY_SPIKE_FACTOR + 1))
+    assert controller.limit == pytest.approx(max(1.0, before / 2.0))
+    assert controller.decreases == 1
+
+
+def test_aimd_window_limits_inflight(bulk):
+    controller = bulk.AimdController(max_limit=4)
+    controller.limit = 2.0
+    assert controller.may_start(1)
+    assert not controller.may_start(2)
+
+
+def test_parse_retry_after_seconds_and_http_date(bulk):
+    import email.utils
+    import time
+
+    assert bulk.parse_retry_after("24") == 24.0
+    assert bulk.parse_retry_after(" -5 ") == 0.0
+    when = email.utils.formatdate(time.time() + 120, usegmt=True)
+    assert 110 <= bulk.parse_retry_after(when) <= 120
+    assert bulk.parse_retry_after("bald") is None
+    assert bulk.parse_retry_after(None) is None
+
+
+def test_retry_after_of_reads_backend_body(bulk):
+    assert bulk.retry_after_of({"retry_after": 24}) == 24.0
+    assert bulk.retry_after_of({"retry_after": "x"}) is None
+    assert bulk.retry_after_of({"error": "kaputt"}) is None
+    assert bulk.retry_after_of(None) is None
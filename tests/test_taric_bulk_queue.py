@@ -0,0 +1,139 @@
+import os
+import time
+
+import pytest
+
+import taric_bulk_queue
+from taric_bulk_queue import BulkQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = BulkQueue(tmp_path / "queue.db")
+    yield q
+    q.close()
+
+
+@pytest.fixture
+def input_dir(tmp_path):
+    path = tmp_path / "input"
+    path.mkdir()
+    return path
+
+
+def write_old(path, data: bytes):
+    path.write_bytes(data)
+    old = time.time() - 3600
+    os.utime(path, (old, old))
+    return path
+
+
+def state_of(queue, item_id):
+    return queue.conn.execute("SELECT state, attempts FROM bulk_queue WHERE id = ?", (item_id,)).fetchone()
+
+
+def test_scan_deduplicates_by_content(queue, input_dir):
+    a = write_old(input_dir / "a.jpg", b"bild-1")
+    write_old(input_dir / "kopie.jpg", b"bild-1")
+    write_old(input_dir / "notiz.txt", b"text")
+    assert queue.scan(input_dir)["added"] == [a]
+    assert queue.scan(input_dir)["added"] == []
+    assert queue.counts() == {"pending": 1}
+
+
+def test_scan_skips_temporary_and_young_files(queue, input_dir, monkeypatch):
+    monkeypatch.setattr(taric_bulk_queue, "MIN_FILE_AGE_SECONDS", 60.0)
+    write_old(input_dir / "a.jpg.part", b"halb")
+    (input_dir / "neu.jpg").write_bytes(b"gerade geschrieben")
+    assert queue.scan(input_dir)["added"] == []
+
+
+def test_scan_with_paths_only_adds_given_files(queue, input_dir, monkeypatch):
+    monkeypatch.setattr(taric_bulk_queue, "MIN_FILE_AGE_SECONDS", 60.0)
+    ready = input_dir / "fertig.jpg"
+    ready.write_bytes(b"vom Watcher gemeldet")  # jung, aber als fertig erkannt
+    write_old(input_dir / "andere.jpg", b"2")
+    assert queue.scan(input_dir, paths=[ready])["added"] == [ready]
+    assert queue.counts() == {"pending": 1}
+
+
+def test_lease_is_exclusive_and_counts_attempts(queue, input_dir):
+    write_old(input_dir / "a.jpg", b"1")
+    write_old(input_dir / "b.jpg", b"2")
+    queue.scan(input_dir)
+
+    first = queue.lease("w1", limit=1)
+    second = queue.lease("w2", limit=5)
+    assert len(first) == 1 and len(second) == 1
+    assert first[0].id != second[0].id
+    assert first[0].attempts == 1
+    assert queue.lease("w3", limit=5) == []
+
+
+def test_complete_requires_the_lease_owner(queue, input_dir):
+    write_old(input_dir / "a.jpg", b"1")
+    queue.scan(input_dir)
+    item = queue.lease("w1")[0]
+    assert not queue.complete(item.id, "w2")
+    assert queue.complete(item.id, "w1", result_id=42)
+    assert state_of(queue, item.id)["state"] == "done"
+    assert queue.scan(input_dir)["finished"] == [(input_dir / "a.jpg", "done")]
+
+
+def test_expired_lease_is_handed_out_again(queue, input_dir):
+    write_old(input_dir / "a.jpg", b"1")
+    queue.scan(input_dir)
+    item = queue.lease("w1", lease_s=-1)[0]
+    again = queue.lease("w2")
+    assert [i.id for i in again] == [item.id]
+    assert again[0].attempts == 2
+    # die alte Lease kann nicht mehr abschließen
+    assert not queue.complete(item.id, "w1")
+
+
+def test_release_owner_returns_unstarted_leases(queue, input_dir):
+    write_old(input_dir / "a.jpg", b"1")
+    queue.scan(input_dir)
+    item = queue.lease("w1")[0]
+    assert queue.release_owner("w1") == 1
+    row = state_of(queue, item.id)
+    assert (row["state"], row["attempts"]) == ("pending", 0)
+
+
+def test_retry_later_backs_off_before_next_lease(queue, input_dir):
+    write_old(input_dir / "a.jpg", b"1")
+    queue.scan(input_dir)
+    item = queue.lease("w1")[0]
+    assert queue.retry_later(item.id, "w1", "HTTP_502", delay_s=3600)
+    assert queue.lease("w1") == []
+    queue.conn.execute("UPDATE bulk_queue SET available_at = ?", (time.time() - 1,))
+    again = queue.lease("w1")
+    assert [i.attempts for i in again] == [2]
+
+
+def test_dead_letters_and_requeue(queue, input_dir):
+    write_old(input_dir / "a.jpg", b"1")
+    write_old(input_dir / "b.jpg", b"2")
+    queue.scan(input_dir)
+    dead, failed = queue.lease("w1", limit=2)
+    assert queue.dead(dead.id, "w1", "HTTP_503")
+    assert queue.fail(failed.id, "w1", "INVALID_IMAGE")
+
+    assert [r["id"] for r in queue.dead_letters()] == [dead.id]
+    assert [r["id"] for r in queue.dead_letters(include_errors=True)] == [dead.id, failed.id]
+
+    assert queue.requeue(dead.id)
+    assert not queue.requeue(dead.id)
+    row = state_of(queue, dead.id)
+    assert (row["state"], row["attempts"]) == ("pending", 0)
+
+
+def test_release_with_delay_does_not_count_an_attempt(queue, input_dir):
+    write_old(input_dir / "a.jpg", b"1")
+    queue.scan(input_dir)
+    item = queue.lease("w1")[0]
+    assert queue.release(item.id, "w1", "UPSTREAM_QUOTA", delay_s=3600)
+    assert queue.lease("w1") == []
+    queue.conn.execute("UPDATE bulk_queue SET available_at = ?", (time.time() - 1,))
+    again = queue.lease("w1")
+    assert [i.attempts for i in again] == [1]
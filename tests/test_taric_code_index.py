@@ -0,0 +1,65 @@
+import sqlite3
+
+from taric_code_index import TaricCodeEntry, TaricCodeIndex
+
+
+def make_index() -> TaricCodeIndex:
+    return TaricCodeIndex(
+        [
+            TaricCodeEntry("8500000000", "Kapitel", code_level=2),
+            TaricCodeEntry("8517000000", "Position", code_level=4, parent_code="8500000000"),
+            TaricCodeEntry("8517120000", "HS6", code_level=6, parent_code="8517000000"),
+            TaricCodeEntry("8517120000", "CN8", code_level=8, parent_code="8517120000"),
+            TaricCodeEntry("8517120010", "TARIC", code_level=10, parent_code="8517120000", is_leaf=True),
+        ]
+    )
+
+
+def test_same_padded_code_keeps_both_levels():
+    index = make_index()
+    assert len(index) == 5
+    assert index.describe("851712") == "HS6"
+    assert index.describe("85171200") == "CN8"
+    assert index.get("8517120000").description() == "CN8"
+
+
+def test_ancestors_and_children_resolve_levels():
+    index = make_index()
+    assert [a.description() for a in index.ancestors("8517120010")] == ["Kapitel", "Position", "HS6", "CN8"]
+    assert [c.description() for c in index.children("851712")] == ["CN8"]
+    assert [c.description() for c in index.children("85171200")] == ["TARIC"]
+
+
+def test_prefix_ancestors_without_hierarchy():
+    index = TaricCodeIndex(
+        [TaricCodeEntry("8500000000", "K"), TaricCodeEntry("8517000000", "P"), TaricCodeEntry("8517120090", "L")]
+    )
+    assert [a.code for a in index.ancestors("8517120090")] == ["8500000000", "8517000000"]
+
+
+def test_inferred_leaves_without_is_leaf():
+    index = TaricCodeIndex(
+        [TaricCodeEntry("8517000000"), TaricCodeEntry("8517120000"), TaricCodeEntry("8517120090"), TaricCodeEntry("8518000000")]
+    )
+    assert [e.code for e in index.leaves_under("85")] == ["8517120090", "8518000000"]
+
+
+def test_from_db_and_pickle_round_trip(tmp_path):
+    db = tmp_path / "ref.db"
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE taric_reference (taric_code TEXT PRIMARY KEY, description_de TEXT)")
+    conn.executemany(
+        "INSERT INTO taric_reference VALUES (?, ?)",
+        [("851712", "HS6"), ("85171200", "CN8"), ("8517120010", "TARIC")],
+    )
+    conn.commit()
+    conn.close()
+
+    index = TaricCodeIndex.from_db(db)
+    assert index.describe("851712") == "HS6"
+    assert index.describe("85171200") == "CN8"
+
+    index.save(tmp_path / "index.pickle")
+    loaded = TaricCodeIndex.load(tmp_path / "index.pickle")
+    assert len(loaded) == 3
+    assert loaded.describe("851712") == "HS6"
@@ -0,0 +1,81 @@
+from taric_code_index import TaricCodeEntry, TaricCodeIndex
+from taric_code_validation import snap_code, validate_classification
+
+
+def make_index() -> TaricCodeIndex:
+    return TaricCodeIndex(
+        [
+            TaricCodeEntry("8500000000", "Kapitel 85"),
+            TaricCodeEntry("8517000000", "Telefone"),
+            TaricCodeEntry("8517110000", "Schnurlos"),
+            TaricCodeEntry("8517130000", "Smartphones"),
+            TaricCodeEntry("8517130010", "Smartphones, neu", valid_to="2025-12-31"),
+            TaricCodeEntry("8517130090", "Smartphones, andere"),
+            TaricCodeEntry("8518000000", "Mikrofone"),
+        ]
+    )
+
+
+def test_snap_code_accepts_valid_leaf():
+    result = snap_code("8517110000", make_index())
+    assert result["valid"] is True
+    assert result["snapped"] == "8517110000"
+    assert result["valid_prefix"] == "8517110000"
+
+
+def test_snap_code_rejects_inner_node_and_snaps_to_nearest_leaf():
+    result = snap_code("8517130000", make_index())
+    assert result["valid"] is False
+    assert result["snapped"] == "8517130010"
+    assert result["valid_prefix"] == "85171300"
+
+
+def test_snap_code_falls_back_to_deepest_prefix_with_leaves():
+    result = snap_code("8517990000", make_index())
+    assert result["valid"] is False
+    assert result["valid_prefix"] == "8517"
+    assert result["snapped"] == "8517130090"
+
+
+def test_snap_code_respects_validity_date():
+    result = snap_code("8517130010", make_index(), on_date="2026-06-01")
+    assert result["valid"] is False
+    assert result["snapped"] == "8517130090"
+
+
+def test_snap_code_short_or_unknown_codes():
+    index = make_index()
+    assert snap_code("8", index)["snapped"] is None
+    assert snap_code(None, index)["valid_prefix"] is None
+    assert snap_code("0101210000", index)["snapped"] is None
+
+
+def test_snap_code_ignores_formatting():
+    assert snap_code("8517 11 00 00", make_index())["valid"] is True
+
+
+def test_validate_classification_marks_consistent_result_valid():
+    result = {"taric_code": "8517110000", "cn_code": "85171100", "hs_chapter": "85"}
+    validation = validate_classification(result, make_index())
+    assert validation["code_valid"] is True
+    assert result["code_valid"] is True
+    assert result["taric_code_snapped"] == "8517110000"
+
+
+def test_validate_classification_snaps_alternatives_and_flags_mismatch():
+    result = {
+        "taric_code": "8517130000",
+        "cn_code": "85171300",
+        "hs_chapter": "84",
+        "possible_alternatives": [{"taric_code": "8518000000"}, "kein dict"],
+    }
+    validation = validate_classification(result, make_index(), on_date="2026-06-01")
+    assert result["code_valid"] is False
+    assert result["taric_code_snapped"] == "8517130090"
+    assert validation["hs_chapter"]["consistent"] is False
+    assert result["possible_alternatives"][0]["valid"] is True
+    assert len(validation["alternatives"]) == 1
+
+
+def test_validate_classification_without_reference():
+    assert validate_classification({"taric_code": "8517110000"}, TaricCodeIndex([])) is None
@@ -0,0 +1,135 @@
+import os
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+import taric_file_readiness
+from taric_file_readiness import ReadinessWatcher, file_age_seconds, is_temporary_name
+
+
+def event(path: Path, dest: Path = None):
+    return SimpleNamespace(src_path=str(path), dest_path=str(dest) if dest else None, is_directory=False)
+
+
+@pytest.fixture
+def watcher(monkeypatch):
+    monkeypatch.setattr(taric_file_readiness, "BATCH_SECONDS", 2.0)
+    monkeypatch.setattr(taric_file_readiness, "MAX_BATCH_WAIT_SECONDS", 30.0)
+    batches = []
+    w = ReadinessWatcher(on_batch=batches.append, accept=lambda p: p.suffix == ".jpg")
+    w.stable_seconds = 2.0
+    w.batches = batches
+    return w
+
+
+def test_temporary_names():
+    assert is_temporary_name(Path("bild.jpg.part"))
+    assert is_temporary_name(Path("bild.JPG.crdownload"))
+    assert is_temporary_name(Path(".bild.jpg"))
+    assert is_temporary_name(Path("~$liste.xlsx"))
+    assert not is_temporary_name(Path("bild.jpg"))
+
+
+def test_file_age(tmp_path):
+    path = tmp_path / "a.jpg"
+    path.write_bytes(b"x")
+    os.utime(path, (path.stat().st_atime, path.stat().st_mtime - 100))
+    assert file_age_seconds(path) >= 99
+    assert file_age_seconds(tmp_path / "fehlt.jpg") == 0.0
+
+
+def test_file_becomes_ready_after_stable_window(watcher, tmp_path):
+    path = tmp_path / "a.jpg"
+    path.write_bytes(b"abc")
+    watcher.on_created(event(path))
+
+    # Kandidaten messen gegen `now`, die Batch-Zeitpunkte setzt _mark_ready selbst (monotonic)
+    watcher._poll_candidates(100.0)  # erste Messung
+    watcher._poll_candidates(101.0)
+    assert not watcher._ready
+    watcher._poll_candidates(102.5)
+    assert watcher._ready == {path}
+    ready_at = watcher._last_ready
+    assert watcher._take_batch(ready_at + 1.0) is None  # Batch-Ruhezeit läuft noch
+    assert watcher._take_batch(ready_at + 2.0) == [path]
+
+
+def test_growing_file_restarts_stable_window(watcher, tmp_path):
+    path = tmp_path / "a.jpg"
+    path.write_bytes(b"abc")
+    watcher.on_created(event(path))
+    watcher._poll_candidates(100.0)
+    path.write_bytes(b"abcdef")
+    watcher._poll_candidates(101.5)
+    watcher._poll_candidates(103.0)
+    assert path in watcher._candidates
+    watcher._poll_candidates(103.6)
+    assert path in watcher._ready
+
+
+def test_empty_file_is_never_ready(watcher, tmp_path):
+    path = tmp_path / "a.jpg"
+    path.touch()
+    watcher.on_created(event(path))
+    watcher._poll_candidates(100.0)
+    watcher._poll_candidates(200.0)
+    assert watcher._take_batch(300.0) is None
+
+
+def test_close_and_rename_events_mark_ready(watcher, tmp_path):
+    closed = tmp_path / "a.jpg"
+    closed.write_bytes(b"x")
+    partial = tmp_path / "b.jpg.part"
+    final = tmp_path / "b.jpg"
+    final.write_bytes(b"y")
+    watcher.on_closed(event(closed))
+    watcher.on_moved(event(partial, final))
+    watcher.on_closed(event(partial))  # temporärer Name wird ignoriert
+    batch_start = watcher._first_ready
+    assert watcher._take_batch(batch_start + 5.0) == [closed, final]
+
+
+def test_modification_after_ready_waits_again(watcher, tmp_path):
+    path = tmp_path / "a.jpg"
+    path.write_bytes(b"x")
+    watcher.on_closed(event(path))
+    watcher.on_modified(event(path))
+    assert path not in watcher._ready
+    assert path in watcher._candidates
+
+
+def test_unsupported_and_deleted_files(watcher, tmp_path):
+    text = tmp_path / "notiz.txt"
+    text.write_text("x")
+    watcher.on_created(event(text))
+    assert not watcher._candidates
+
+    gone = tmp_path / "weg.jpg"
+    gone.write_bytes(b"x")
+    watcher.on_created(event(gone))
+    gone.unlink()
+    watcher._poll_candidates(100.0)
+    assert not watcher._candidates
+
+
+def test_batch_is_flushed_after_max_wait(watcher, tmp_path, monkeypatch):
+    monkeypatch.setattr(taric_file_readiness, "MAX_BATCH_WAIT_SECONDS", 10.0)
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"{i}.jpg"
+        path.write_bytes(b"x")
+        paths.append(path)
+    watcher._mark_ready(paths[0])
+    first = watcher._first_ready
+    # ständig neue Dateien verschieben die Ruhezeit, aber nicht über die Höchstwartezeit hinaus
+    watcher._last_ready = first + 9.5
+    assert watcher._take_batch(first + 9.9) is None
+    assert watcher._take_batch(first + 10.0) == [paths[0]]
+
+
+def test_add_existing_tracks_files(watcher, tmp_path):
+    path = tmp_path / "alt.jpg"
+    path.write_bytes(b"x")
+    watcher.add_existing([path, tmp_path / ".versteckt.jpg"])
+    assert list(watcher._candidates) == [path]
@@ -0,0 +1,98 @@
+import time
+
+import pytest
+
+import taric_token_budget
+from taric_token_budget import TokenBudget
+
+
+@pytest.fixture
+def make_budget(tmp_path, monkeypatch):
+    monkeypatch.setattr(taric_token_budget, "SPREAD_WINDOW_S", 0.0)
+    created = []
+
+    def factory(per_day=0, per_minute=0, reserve=0.2):
+        budget = TokenBudget(tmp_path / f"ledger{len(created)}.db", per_day=per_day, per_minute=per_minute, reserve=reserve)
+        created.append(budget)
+        return budget
+
+    yield factory
+    for budget in created:
+        budget.close()
+
+
+def test_disabled_budget_never_waits(make_budget):
+    assert make_budget().wait_time(estimate=10**9) == (0.0, None)
+
+
+def test_first_request_must_fit_into_day_budget(make_budget):
+    budget = make_budget(per_day=1000)
+    wait, reason = budget.wait_time(estimate=5000)
+    assert wait > 0
+    assert reason == "Schätzung je Bild übersteigt das Tagesbudget"
+    assert budget.wait_time(estimate=800) == (0.0, None)
+
+
+def test_day_budget_exhausted_by_bulk_usage(make_budget):
+    budget = make_budget(per_day=1000)
+    budget.record({"total_tokens": 700})
+    assert budget.wait_time(estimate=100) == (0.0, None)
+    wait, reason = budget.wait_time(estimate=200)
+    assert reason == "Tagesbudget erschöpft"
+    _, day_end = budget.day_bounds(time.time())
+    assert wait == pytest.approx(day_end - time.time(), abs=5)
+
+
+def test_in_flight_requests_count_against_budget(make_budget):
+    budget = make_budget(per_day=1000)
+    assert budget.wait_time(in_flight=0, estimate=300)[0] == 0.0
+    assert budget.wait_time(in_flight=2, estimate=300)[1] == "Tagesbudget erschöpft"
+
+
+def test_interactive_usage_beyond_reserve_shrinks_bulk_share(make_budget):
+    budget = make_budget(per_day=1000)
+    budget.record({"total_tokens": 150}, source="interactive")
+    # innerhalb der Reserve (200): Bulk behält 800
+    assert budget.wait_time(estimate=800)[0] == 0.0
+    budget.record({"total_tokens": 250}, source="interactive")
+    # 400 interaktiv -> Bulk nur noch 600
+    assert budget.wait_time(estimate=600)[0] == 0.0
+    assert budget.wait_time(estimate=650)[1] == "Tagesbudget erschöpft"
+
+
+def test_usage_without_total_is_not_recorded(make_budget):
+    budget = make_budget(per_day=1000)
+    assert budget.record(None) == 0
+    assert budget.record({"total_tokens": 0}) == 0
+    assert budget.status()["used_today"] == 0
+
+
+def test_minute_budget_waits_until_entries_leave_window(make_budget):
+    budget = make_budget(per_minute=1000)
+    budget.record({"total_tokens": 700})
+    wait, reason = budget.wait_time(estimate=200)
+    assert reason == "Minutenbudget erschöpft"
+    assert 55 < wait <= 60
+    wait, reason = budget.wait_time(estimate=900)
+    assert reason == "Schätzung je Bild übersteigt das Minutenbudget"
+
+
+def test_day_budget_is_spread_over_the_day(make_budget, monkeypatch):
+    monkeypatch.setattr(taric_token_budget, "SPREAD_WINDOW_S", 1.0)
+    budget = make_budget(per_day=86400, reserve=0.0)
+    now = time.time()
+    monkeypatch.setattr(TokenBudget, "day_bounds", staticmethod(lambda _now: (now - 60, now - 60 + 86400)))
+    wait, reason = budget.wait_time(estimate=1000)
+    assert reason == "Tagesbudget verteilt"
+    # Freigabe 1 Token/s, nach 60 s plus 1 s Vorlauf sind 61 freigegeben
+    assert wait == pytest.approx(939, abs=5)
+    assert budget.wait_time(estimate=50) == (0.0, None)
+
+
+def test_estimate_uses_recent_bulk_usage(make_budget):
+    budget = make_budget(per_day=1000)
+    assert budget.estimate_per_item() == taric_token_budget.DEFAULT_TOKENS_PER_ITEM
+    budget.record({"total_tokens": 100})
+    budget.record({"total_tokens": 300})
+    budget.record({"total_tokens": 5000}, source="interactive")
+    assert budget.estimate_per_item() == 200